@@ -1,23 +1,25 @@
-import dashscope
-from dashscope import Generation
+from config import NARRATION_CONFIG
+from .narration_client import DashScopeClient, NarrationError, create_narration_client
+from .resilience import CircuitBreaker, ResilientNarrationClient, RetryPolicy
+
+# 提示词版本：修改讲解提示词时需要同步修改，已缓存的旧版本讲解会自动失效
+PROMPT_VERSION = 'v1'
+
 
 class ArtifactAIGenerator:
-    def __init__(self, api_key):
+    def __init__(self, api_key=None, client=None, model='qwen-turbo'):
         """
         初始化AI生成器
-        :param api_key: 阿里云API密钥 (格式: sk-xxxxxxxx)
+        :param api_key: 阿里云API密钥 (格式: sk-xxxxxxxx)，未传入 client 时用于创建新的 DashScope 客户端
+        :param client: 共用的讲解生成客户端（NarrationClient 子类，应用启动时创建，复用连接池）
+        :param model: 大模型名称
         """
-        dashscope.api_key = api_key
-        self.model = 'qwen-turbo'
+        self.client = client or DashScopeClient(api_key)
+        self.model = model
     
-    def generate_narration(self, name, dynasty):
-        """
-        生成文物讲解文案的主要函数
-        :param name: 文物名称 (如 "兵马俑")
-        :param dynasty: 文物朝代 (如 "秦朝") 
-        :return: 生成的第一人称讲解文案
-        """
-        prompt = f"""
+    def build_prompt(self, name, dynasty):
+        """构造讲解提示词"""
+        return f"""
 你是一个专业的博物馆讲解员。请为以下文物创作一段第一人称的讲解：
 
 文物：{name}
@@ -31,26 +33,90 @@ class ArtifactAIGenerator:
 
 请直接输出讲解内容。
 """
-        
+
+    def request_narration(self, name, dynasty):
+        """
+        调用大模型生成讲解文案，失败时抛出 NarrationError
+        与 generate_narration 的区别在于调用方可以区分成功与失败（例如只缓存成功的结果）
+        :return: 生成的第一人称讲解文案
+        """
+        story = self.client.generate(
+            self.model,
+            self.build_prompt(name, dynasty),
+            max_tokens=500,
+            temperature=0.7
+        )
+        return self.clean_narration(story)
+
+    def clean_narration(self, story):
+        """清理输出：去掉首尾空白和包裹全文的引号"""
+        story = story.strip()
+        if story.startswith('"') and story.endswith('"'):
+            story = story[1:-1]
+        return story
+
+    def stream_narration(self, name, dynasty):
+        """
+        流式生成讲解文案，逐段返回新增的文本，失败时抛出 NarrationError
+        :return: 生成器，每次产出一段增量文本
+        """
+        return self.client.stream(
+            self.model,
+            self.build_prompt(name, dynasty),
+            max_tokens=500,
+            temperature=0.7
+        )
+
+    def generate_narration(self, name, dynasty):
+        """
+        生成文物讲解文案的主要函数
+        :param name: 文物名称 (如 "兵马俑")
+        :param dynasty: 文物朝代 (如 "秦朝") 
+        :return: 生成的第一人称讲解文案；失败时返回错误提示文案
+        """
         try:
-            response = Generation.call(
-                model=self.model,
-                prompt=prompt,
-                max_tokens=500,
-                temperature=0.7
-            )
-            
-            if response.status_code == 200:
-                story = response.output.text.strip()
-                # 清理输出
-                if story.startswith('"') and story.endswith('"'):
-                    story = story[1:-1]
-                return story
-            else:
-                return f"生成失败，请稍后重试。错误码：{response.status_code}"
-                
-        except Exception as e:
-            return f"系统繁忙，请稍后重试。错误：{str(e)}"
+            return self.request_narration(name, dynasty)
+        except NarrationError as e:
+            return str(e)
+
+def create_narration_generator(api_key, model=None):
+    """
+    按 NARRATION_CONFIG 创建讲解生成器：所选后端的客户端（复用连接池），
+    外层加上截止时间、重试、熔断和（可选的）对冲请求
+    :param model: 大模型名称，默认使用配置中的模型
+    """
+    client_config = NARRATION_CONFIG['client']
+    resilience_config = NARRATION_CONFIG['resilience']
+    client = create_narration_client(
+        NARRATION_CONFIG['backend'],
+        api_key,
+        base_url=client_config['base_url'],
+        connect_timeout=client_config['connect_timeout'],
+        read_timeout=client_config['read_timeout'],
+        pool_size=client_config['pool_size'],
+        max_concurrency=client_config['max_concurrency'],
+        acquire_timeout=client_config['acquire_timeout']
+    )
+    return ArtifactAIGenerator(
+        client=ResilientNarrationClient(
+            client,
+            deadline=resilience_config['deadline'],
+            retry=RetryPolicy(
+                max_attempts=resilience_config['max_attempts'],
+                base_delay=resilience_config['retry_base_delay'],
+                max_delay=resilience_config['retry_max_delay']
+            ),
+            breaker=CircuitBreaker(
+                failure_threshold=resilience_config['breaker_failures'],
+                recovery_timeout=resilience_config['breaker_recovery'],
+                name='narration'
+            ),
+            hedging=resilience_config['hedging'],
+            hedge_delay=resilience_config['hedge_delay_ms'] / 1000,
+            hedge_workers=resilience_config['hedge_workers']
+        ),
+        model=model or NARRATION_CONFIG['model']
+    )
 
 # 给角色A使用的主要函数
 def generate_artifact_story(name, dynasty, api_key):
@@ -67,4 +133,7 @@ def generate_artifact_story(name, dynasty, api_key):
         str: 生成的讲解文案
     """
     generator = ArtifactAIGenerator(api_key)
-    return generator.generate_narration(name, dynasty)
+    try:
+        return generator.generate_narration(name, dynasty)
+    finally:
+        generator.client.close()
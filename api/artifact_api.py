@@ -1,10 +1,87 @@
-from flask import Blueprint, request, jsonify
-from config import API_CONFIG
-from .artifact_ai_generator import generate_artifact_story
+import sqlite3
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from config import NARRATION_CONFIG
+from .artifact_ai_generator import NarrationError, PROMPT_VERSION, create_narration_generator
+from .catalog import load_artifact_records
+from .narration_cache import NarrationCache, NarrationStore, narration_cache_key
+from .sse import SSE_HEADERS, sse_event
+from .metrics import RESILIENCE_EVENTS
 
 # 创建文物讲解API蓝图
 artifact_api = Blueprint('artifact_api', __name__)
 
+# 初始化讲解生成器：应用启动时创建一次，所有请求共用同一个客户端连接池
+narration_generator = None
+if NARRATION_CONFIG['api_key']:
+    narration_generator = create_narration_generator(NARRATION_CONFIG['api_key'])
+
+# 初始化讲解缓存（内存 LRU + 可选的 SQLite 持久化存储）
+cache_config = NARRATION_CONFIG['cache']
+narration_cache = None
+if cache_config['enabled']:
+    narration_cache = NarrationCache(
+        max_size=cache_config['max_size'],
+        ttl_seconds=cache_config['ttl_seconds'],
+        store=NarrationStore(cache_config['sqlite_path']) if cache_config['sqlite_path'] else None
+    )
+
+# 兜底讲解用的文物简介：(名称, 朝代) -> 简介
+fallback_config = NARRATION_CONFIG['fallback']
+fallback_intros = {}
+if fallback_config['enabled']:
+    try:
+        fallback_intros = {
+            (record['name'], record['dynasty']): record['intro']
+            for record in load_artifact_records(fallback_config['catalog_path'])
+            if record['intro']
+        }
+    except OSError as e:
+        print(f"兜底讲解数据加载失败：{str(e)}")
+
+def fallback_narration(name, dynasty):
+    """
+    上游讲解服务失败或熔断时的兜底讲解
+    优先使用该文物之前生成过的讲解（可能是旧的模型或提示词版本），否则用文物简介拼成一段第一人称讲解
+    :return: 兜底讲解；未开启或没有可用的内容时返回 None
+    """
+    if not fallback_config['enabled']:
+        return None
+    if narration_cache is not None and narration_cache.store is not None:
+        try:
+            narration = narration_cache.store.latest(name, dynasty)
+        except sqlite3.Error as e:
+            print(f"讲解缓存读取失败：{str(e)}")
+            narration = None
+        if narration:
+            return narration
+    intro = fallback_intros.get((name, dynasty))
+    if intro:
+        return f"我是{dynasty}的{name}。{intro.rstrip('。')}。"
+    return None
+
+def get_narration(name, dynasty):
+    """
+    获取文物讲解：优先读取缓存，相同文物的并发请求只调用一次大模型
+    生成失败时返回兜底讲解，没有兜底讲解时返回错误提示文案（都不缓存），与 generate_artifact_story 的行为一致
+    """
+    generator = narration_generator
+    try:
+        if narration_cache is None:
+            return generator.request_narration(name, dynasty)
+        
+        cache_key = narration_cache_key(name, dynasty, generator.model, PROMPT_VERSION)
+        return narration_cache.get_or_generate(
+            cache_key,
+            lambda: generator.request_narration(name, dynasty),
+            name=name, dynasty=dynasty, model=generator.model, prompt_version=PROMPT_VERSION
+        )
+    except NarrationError as e:
+        narration = fallback_narration(name, dynasty)
+        if narration is not None:
+            RESILIENCE_EVENTS.inc(component='narration', event='fallback')
+            return narration
+        return str(e)
+
 @artifact_api.route('/', methods=['POST'])
 def generate_narration():
     """
@@ -24,48 +101,12 @@ def generate_narration():
     }
     """
     try:
-        # 检查请求数据
-        if not request.is_json:
-            return jsonify({
-                'error': '请求必须是JSON格式',
-                'code': 400
-            }), 400
+        name, dynasty, error_response = parse_narration_request()
+        if error_response:
+            return error_response
         
-        data = request.get_json()
-        
-        # 验证必要字段
-        if not data:
-            return jsonify({
-                'error': '请求数据不能为空',
-                'code': 400
-            }), 400
-        
-        name = data.get('name', '')
-        dynasty = data.get('dynasty', '')
-        
-        # 检查必要参数
-        if not name:
-            return jsonify({
-                'error': '缺少必要字段: name',
-                'code': 400
-            }), 400
-        
-        if not dynasty:
-            return jsonify({
-                'error': '缺少必要字段: dynasty',
-                'code': 400
-            }), 400
-        
-        # 获取API密钥
-        api_key = API_CONFIG['artifact_narration'].get('api_key', '')
-        if not api_key:
-            return jsonify({
-                'error': 'API密钥未配置',
-                'code': 500
-            }), 500
-        
-        # 调用AI生成函数
-        narration = generate_artifact_story(name, dynasty, api_key)
+        # 调用AI生成函数（带缓存）
+        narration = get_narration(name, dynasty)
         
         # 返回结果
         result = {
@@ -85,3 +126,140 @@ def generate_narration():
             'error': f'生成文物讲解时发生错误: {str(e)}',
             'code': 500
         }), 500
+
+@artifact_api.route('/stream', methods=['POST'])
+def stream_narration():
+    """
+    流式文物讲解接口（Server-Sent Events）
+    输入: 与 /api/artifact-narration/ 相同的JSON格式文物信息
+    输出: text/event-stream，大模型每生成一段文字就立即推送给前端
+    
+    事件说明:
+    - delta: {"text": "新生成的一段文字"}
+    - done:  {"name": ..., "dynasty": ..., "narration": "完整讲解文案"}
+    - error: {"error": "错误信息"}
+    """
+    try:
+        name, dynasty, error_response = parse_narration_request()
+        if error_response:
+            return error_response
+        
+        return Response(
+            stream_with_context(narration_events(name, dynasty)),
+            mimetype='text/event-stream',
+            headers=SSE_HEADERS
+        )
+        
+    except Exception as e:
+        return jsonify({
+            'error': f'生成文物讲解时发生错误: {str(e)}',
+            'code': 500
+        }), 500
+
+def narration_events(name, dynasty):
+    """
+    生成讲解的 SSE 事件流
+    缓存命中时一次性推送完整讲解；否则边生成边推送，生成完成后写入缓存。
+    相同文物的并发请求（流式和非流式）只调用一次大模型，其余请求推送领头请求已生成的文字并等待后续文字
+    """
+    generator = narration_generator
+    if narration_cache is None:
+        events = stream_without_cache(generator, name, dynasty)
+    else:
+        cache_key = narration_cache_key(name, dynasty, generator.model, PROMPT_VERSION)
+        events = narration_cache.stream_or_generate(
+            cache_key,
+            lambda: generator.stream_narration(name, dynasty),
+            generator.clean_narration,
+            name=name, dynasty=dynasty, model=generator.model, prompt_version=PROMPT_VERSION
+        )
+    
+    sent = False
+    try:
+        for event, text in events:
+            if event == 'delta':
+                sent = True
+                yield sse_event('delta', {'text': text})
+            else:
+                narration = text
+    except NarrationError as e:
+        # 还没有推送任何文字时可以改为推送兜底讲解；已经推送了一部分时只能报告错误
+        narration = None if sent else fallback_narration(name, dynasty)
+        if narration is None:
+            yield sse_event('error', {'error': str(e)})
+            return
+        RESILIENCE_EVENTS.inc(component='narration', event='fallback')
+        yield sse_event('delta', {'text': narration})
+    finally:
+        # 客户端断开时立即结束讲解生成（或交给仍在等待的其他请求）
+        events.close()
+    
+    yield sse_event('done', {'name': name, 'dynasty': dynasty, 'narration': narration})
+
+def stream_without_cache(generator, name, dynasty):
+    """未开启讲解缓存时的流式生成，产出格式与 NarrationCache.stream_or_generate 相同"""
+    chunks = []
+    for text in generator.stream_narration(name, dynasty):
+        chunks.append(text)
+        yield 'delta', text
+    yield 'done', generator.clean_narration(''.join(chunks))
+
+def parse_narration_request():
+    """
+    校验讲解请求
+    :return: (name, dynasty, error_response)，校验失败时 error_response 为可直接返回的错误响应
+    """
+    # 检查请求数据
+    if not request.is_json:
+        return None, None, (jsonify({
+            'error': '请求必须是JSON格式',
+            'code': 400
+        }), 400)
+    
+    data = request.get_json()
+    
+    # 验证必要字段
+    if not data:
+        return None, None, (jsonify({
+            'error': '请求数据不能为空',
+            'code': 400
+        }), 400)
+    
+    name = data.get('name', '')
+    dynasty = data.get('dynasty', '')
+    
+    # 检查必要参数
+    if not name:
+        return None, None, (jsonify({
+            'error': '缺少必要字段: name',
+            'code': 400
+        }), 400)
+    
+    if not dynasty:
+        return None, None, (jsonify({
+            'error': '缺少必要字段: dynasty',
+            'code': 400
+        }), 400)
+    
+    # 检查API密钥是否已配置（未配置时启动阶段不会创建讲解生成器）
+    if narration_generator is None:
+        return None, None, (jsonify({
+            'error': 'API密钥未配置',
+            'code': 500
+        }), 500)
+    
+    return name, dynasty, None
+
+@artifact_api.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """讲解缓存统计接口：返回缓存条目数、命中次数、合并的并发请求数和命中率"""
+    if narration_cache is None:
+        return jsonify({
+            'success': False,
+            'error': '讲解缓存未开启',
+            'code': 404
+        }), 404
+    return jsonify({
+        'success': True,
+        'data': narration_cache.stats()
+    })
@@ -1,64 +1,156 @@
 import torch
 import clip
-from PIL import Image
 import io
-import pandas as pd
+import math
 import os
+from PIL import Image
+from config import RECOGNIZER_CONFIG, SERVING_CONFIG
+from .serving import freeze_model
+from .catalog import CatalogError, file_hash, load_catalog, model_embedding_dim
+from .vector_index import create_vector_index
+from .preprocess import ImagePreprocessor
+from .inference_backends import create_image_encoder
+from .metrics import STAGE_SECONDS, BATCH_SIZE, ERRORS
 
 class ArtifactRecognizer:
     def __init__(self):
         # 加载CLIP模型（自动适配GPU/CPU）
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model, self.preprocess = clip.load("ViT-B/32", device=self.device)
+        self.model_name = RECOGNIZER_CONFIG['model_name']
+        self.prompt_template = RECOGNIZER_CONFIG['prompt_template']
+        self.model, self.preprocess = clip.load(self.model_name, device=self.device)
+        freeze_model(self.model)
         print(f"CLIP模型加载完成，运行设备：{self.device}")
 
-        # 加载候选标签和文物数据
-        self.candidate_labels = self._load_labels()
-        
-        # 获取数据文件路径（相对于当前文件位置）
-        data_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
-        artifact_data_path = os.path.join(data_dir, 'artifact_data.csv')
-        self.artifact_df = pd.read_csv(artifact_data_path, encoding="utf-8")
-
-        # 编码标签文本（提前计算，提升识别速度）
-        self.encoded_labels = self._encode_labels()
-
-    def _load_labels(self):
-        """加载候选标签列表"""
-        data_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
-        labels_path = os.path.join(data_dir, 'candidate_labels.txt')
-        with open(labels_path, "r", encoding="utf-8") as f:
-            labels = [line.strip() for line in f if line.strip()]
-        return labels
-
-    def _encode_labels(self):
-        """将标签文本编码为CLIP向量"""
-        text = clip.tokenize(self.candidate_labels).to(self.device)
-        with torch.no_grad():
-            text_features = self.model.encode_text(text)
-        return text_features / text_features.norm(dim=-1, keepdim=True)  # 归一化
+        input_size = getattr(self.model.visual, 'input_resolution', 224)
+
+        # 图片编码后端（PyTorch fp32 / int8 动态量化 / ONNX Runtime，torch 后端可选 trace / compile）
+        self.image_encoder = create_image_encoder(self.model, self.device, RECOGNIZER_CONFIG['inference_backend'],
+                                                  jit=SERVING_CONFIG['jit'], input_size=input_size)
+        print(f"图片编码后端：{self.image_encoder.name}")
+
+        # 图片预处理阶段（缩小尺寸解码 + 线程池并行预处理）
+        preprocess_config = RECOGNIZER_CONFIG['preprocessing']
+        self.input_size = input_size
+        self.preprocessor = ImagePreprocessor(
+            self.preprocess,
+            target_size=input_size,
+            use_draft=preprocess_config['draft'],
+            workers=preprocess_config['workers'],
+            max_pixels=preprocess_config['max_image_pixels']
+        )
+
+        # 加载编译后的文物目录（候选标签、文物信息和标签向量在同一个文件中）
+        self.catalog = self._load_catalog()
+        self.candidate_labels = self.catalog.labels
+
+        # 标签下标 -> 文物信息，识别时直接按下标取用
+        self.label_index = self.catalog.records()
+
+        # 标签向量在编译目录时已经编码并归一化，这里直接使用内存映射的数据
+        self.encoded_labels = torch.from_numpy(self.catalog.embeddings).to(self.device, dtype=self.model.dtype)
+
+        # 标签数量很大时使用近似最近邻索引检索，避免每次请求都与全部标签做稠密矩阵乘法
+        self.vector_index = create_vector_index(
+            self.encoded_labels.float().cpu().numpy(), RECOGNIZER_CONFIG['vector_index'])
+        if self.vector_index is not None:
+            print(f"标签向量索引构建完成：{type(self.vector_index).__name__}，共{len(self.candidate_labels)}个标签")
+
+    def _load_catalog(self):
+        """
+        读取编译后的文物目录
+        目录文件不存在、损坏，或与数据文件、模型、提示词模板、模型输出维度不一致时，
+        按配置自动重新编译（只编码新增或修改的标签；维度不一致时全部重新编码）
+        """
+        catalog_config = RECOGNIZER_CONFIG['catalog']
+        path, source = catalog_config['path'], catalog_config['source']
+        # 部署时可以只带编译好的目录文件，此时不检查数据文件是否有变化
+        source_hash = file_hash(source) if os.path.exists(source) else None
+
+        dim = model_embedding_dim(self.model)
 
-    def process_image(self, image_input):
-        """图片预处理：支持文件路径或字节流输入"""
         try:
-            if isinstance(image_input, bytes):
-                img = Image.open(io.BytesIO(image_input)).convert("RGB")
-            elif isinstance(image_input, str):
-                img = Image.open(image_input).convert("RGB")
+            catalog = load_catalog(path)
+            if catalog.is_current(self.model_name, self.prompt_template, source_hash, dim):
+                print(f"已加载文物目录：{path}，共{len(catalog)}个标签（{catalog.content_hash}）")
+                return catalog
+            if dim is not None and catalog.dim != dim:
+                reason = f"的标签向量维度（{catalog.dim}）与模型输出维度（{dim}）不一致"
             else:
-                return None
+                reason = "与数据文件、模型或提示词模板不一致"
+        except FileNotFoundError:
+            reason = "不存在"
+        except (CatalogError, OSError, KeyError) as e:
+            reason = f"读取失败（{str(e)}）"
 
-            # CLIP标准预处理： resize + center crop + 归一化
-            processed = self.preprocess(img).unsqueeze(0).to(self.device)
-            return processed
-        except Exception as e:
-            print(f"图片预处理失败：{str(e)}")
+        if not catalog_config['auto_compile'] or source_hash is None:
+            raise RuntimeError(f"文物目录{reason}：{path}，请先运行 python scripts/compile_catalog.py")
+
+        # 只有需要重新编译时才导入编译工具（依赖 pandas），正常启动不导入
+        from .catalog_compiler import compile_catalog
+        print(f"文物目录{reason}，重新编译：{path}")
+        return compile_catalog(source, path, self.model_name, self.prompt_template,
+                               model=self.model, device=self.device)
+
+    def process_image(self, image_input):
+        """图片预处理：支持文件路径、字节流或文件对象输入，返回已放到运行设备上的张量"""
+        image_tensor = self.preprocessor.process(image_input)
+        if image_tensor is None:
             return None
+        return image_tensor.to(self.device)
+
+    def _encode_images(self, image_tensor):
+        """图片编码并归一化，支持一次编码多张图片（batch维度）"""
+        BATCH_SIZE.observe(image_tensor.shape[0])
+        with STAGE_SECONDS.time(stage='encode'):
+            image_features = self.image_encoder.encode(image_tensor).to(self.encoded_labels.dtype)
+            return image_features / image_features.norm(dim=-1, keepdim=True)
+
+    def _search(self, image_features, top_k):
+        """计算与标签的相似度（余弦相似度），返回每张图片的Top K置信度与标签下标"""
+        top_k = min(top_k, len(self.candidate_labels))
+        with STAGE_SECONDS.time(stage='search'):
+            if self.vector_index is not None:
+                values, indices = self.vector_index.search(image_features.float().cpu().numpy(), top_k)
+                return torch.from_numpy(values), torch.from_numpy(indices)
+
+            similarity = (100.0 * image_features @ self.encoded_labels.T).softmax(dim=-1)
+            return similarity.topk(top_k)
+
+    def _build_results(self, values, indices, conf_threshold):
+        """
+        将单张图片的Top K结果组装为识别结果字典
+        :param values: 该图片的Top K置信度（一维）
+        :param indices: 该图片的Top K标签下标（一维），近似检索的候选不足 K 个时空位为 -1
+        :param conf_threshold: 置信度阈值
+        """
+        with STAGE_SECONDS.time(stage='lookup'):
+            results = []
+            for val, idx in zip(values, indices):
+                # 跳过近似检索未填充的空位
+                if int(idx) < 0:
+                    continue
+                conf = round(val.item(), 3)
+                # 过滤nan或低于阈值的置信度
+                if math.isnan(conf) or conf < conf_threshold:
+                    continue
+
+                record = self.label_index[int(idx)]
+                results.append({
+                    "name": record["name"],
+                    "dynasty": record["dynasty"],
+                    "confidence": conf,
+                    "intro": record["intro"]
+                })
+
+        if not results:
+            return {"success": False, "error": "未识别到已知文物，请上传清晰的文物图片"}
+        return {"success": True, "result": results}
 
     def recognize(self, image_input, top_k=3, conf_threshold=0.2):
         """
         核心识别函数：返回Top K个文物匹配结果
-        :param image_input: 图片路径（str）或字节流（bytes）
+        :param image_input: 图片路径（str）、字节流（bytes）或文件对象
         :param top_k: 返回前K个结果
         :param conf_threshold: 置信度阈值（低于此值视为未识别）
         :return: 字典，包含识别结果或错误信息
@@ -69,47 +161,64 @@ class ArtifactRecognizer:
             if image_tensor is None:
                 return {"success": False, "error": "图片预处理失败"}
 
-            # 图片编码
-            with torch.no_grad():
-                image_features = self.model.encode_image(image_tensor)
-            image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-
-            # 计算相似度（余弦相似度）
-            similarity = (100.0 * image_features @ self.encoded_labels.T).softmax(dim=-1)
-            values, indices = similarity.topk(top_k)
+            # 图片编码 + 相似度检索
+            image_features = self._encode_images(image_tensor)
+            values, indices = self._search(image_features, top_k)
 
             # 解析结果
-            results = []
-            for val, idx in zip(values[0], indices[0]):
-                conf = round(val.item(), 3)
-                # 过滤nan或低于阈值的置信度
-                if pd.isna(conf) or conf < conf_threshold:
-                    continue
-
-                label = self.candidate_labels[idx]
-                name, dynasty = label.split("-", 1) if "-" in label else ("未知", "未知")
-
-                # 匹配文物介绍，处理空值
-                match = self.artifact_df[
-                    (self.artifact_df["name"].str.contains(name, na=False)) &
-                    (self.artifact_df["dynasty"] == dynasty)
-                    ]
-                intro = match["intro"].values[0] if not match.empty and not pd.isna(
-                    match["intro"].values[0]) else "暂无介绍"
-
-                results.append({
-                    "name": name,
-                    "dynasty": dynasty,
-                    "confidence": conf if not pd.isna(conf) else 0.0,  # 替换nan为0.0
-                    "intro": intro
-                })
-
-            if not results:
-                return {"success": False, "error": "未识别到已知文物，请上传清晰的文物图片"}
-            return {"success": True, "result": results}
+            return self._build_results(values[0], indices[0], conf_threshold)
         except Exception as e:
+            ERRORS.inc(component='recognition')
             return {"success": False, "error": f"识别异常：{str(e)}", "result": []}
 
+    def recognize_batch(self, image_inputs, top_k=3, conf_threshold=0.2, batch_size=32):
+        """
+        批量识别函数：一次性处理多张图片，按输入顺序返回每张图片的识别结果
+        :param image_inputs: 图片路径（str）、字节流（bytes）或文件对象组成的列表
+        :param top_k: 每张图片返回前K个结果
+        :param conf_threshold: 置信度阈值（低于此值视为未识别）
+        :param batch_size: 单次送入模型的最大图片数，避免超大批次占满内存
+        :return: 列表，每个元素与 recognize 的返回格式一致
+        """
+        results = [None] * len(image_inputs)
+
+        # 图片预处理（线程池并行），失败的图片单独标记，不影响其他图片
+        tensors, positions = [], []
+        for i, image_tensor in enumerate(self.preprocessor.process_many(image_inputs)):
+            if image_tensor is None:
+                results[i] = {"success": False, "error": "图片预处理失败"}
+            else:
+                tensors.append(image_tensor)
+                positions.append(i)
+
+        # 分批编码 + 相似度检索
+        for start in range(0, len(tensors), batch_size):
+            chunk_positions = positions[start:start + batch_size]
+            try:
+                image_tensor = torch.cat(tensors[start:start + batch_size], dim=0).to(self.device)
+                image_features = self._encode_images(image_tensor)
+                values, indices = self._search(image_features, top_k)
+                for row, i in enumerate(chunk_positions):
+                    results[i] = self._build_results(values[row], indices[row], conf_threshold)
+            except Exception as e:
+                ERRORS.inc(component='recognition')
+                for i in chunk_positions:
+                    results[i] = {"success": False, "error": f"识别异常：{str(e)}", "result": []}
+
+        return results
+
+    def warm_up(self):
+        """
+        预热：用一张纯色图片完整执行一次 预处理 + 编码 + 检索
+        触发首次推理时才发生的初始化（内存分配、ONNX 会话创建、torch.compile 编译等），失败时抛出异常
+        """
+        buffer = io.BytesIO()
+        Image.new("RGB", (self.input_size, self.input_size), (128, 128, 128)).save(buffer, "JPEG")
+        image_tensor = self.process_image(buffer.getvalue())
+        if image_tensor is None:
+            raise RuntimeError("预热失败：图片预处理失败")
+        self._search(self._encode_images(image_tensor), 1)
+
 # 测试代码（可选）
 if __name__ == "__main__":
     recognizer = ArtifactRecognizer()
@@ -0,0 +1,108 @@
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+from .metrics import QUEUE_DEPTH, ERRORS
+from .process_local import ProcessLocal
+from .request_log import log
+
+
+class BatchScheduler:
+    """
+    动态批处理调度器
+    将并发到达的识别请求合并成一个批次，只做一次 encode_image + 相似度计算，
+    再把每张图片各自的结果交还给对应的调用方。
+    对外提供与 ArtifactRecognizer.recognize 相同的调用方式，可直接替换使用。
+    """
+
+    def __init__(self, recognizer, max_batch_size=16, max_wait_ms=10):
+        """
+        :param recognizer: 已初始化的 ArtifactRecognizer 实例
+        :param max_batch_size: 单个批次最多包含的图片数
+        :param max_wait_ms: 收到第一张图片后最多等待多少毫秒凑批
+        """
+        self.recognizer = recognizer
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+
+        # 请求队列和批处理线程：每个进程在首次请求时各自启动
+        self._queue = ProcessLocal(self._start_worker)
+
+    def _start_worker(self):
+        """创建请求队列并启动批处理线程"""
+        request_queue = queue.Queue()
+        QUEUE_DEPTH.set_function(request_queue.qsize, queue='batch_scheduler')
+        worker = threading.Thread(target=self._run, args=(request_queue,), name="batch-scheduler", daemon=True)
+        worker.start()
+        return request_queue
+
+    def recognize(self, image_input, top_k=3, conf_threshold=0.2):
+        """
+        提交一张图片并等待识别结果
+        预处理在调用方线程中完成（各请求线程并行解码），批处理线程只负责模型推理
+        调用方的上下文（请求ID）随请求一起入队，批处理线程在其中生成结果和输出日志
+        """
+        image_tensor = self.recognizer.process_image(image_input)
+        if image_tensor is None:
+            return {"success": False, "error": "图片预处理失败"}
+
+        future = Future()
+        self._queue.get().put((image_tensor, top_k, conf_threshold, future, contextvars.copy_context()))
+        return future.result()
+
+    def recognize_batch(self, image_inputs, top_k=3, conf_threshold=0.2):
+        """批量请求本身已是一个完整批次，直接交给识别器处理"""
+        return self.recognizer.recognize_batch(image_inputs, top_k=top_k, conf_threshold=conf_threshold,
+                                               batch_size=self.max_batch_size)
+
+    def warm_up(self):
+        """预热被包装的识别器"""
+        self.recognizer.warm_up()
+
+    def _collect_batch(self, request_queue):
+        """阻塞等待第一个请求，然后在等待窗口内尽量凑满一个批次"""
+        batch = [request_queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(request_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, request_queue):
+        """批处理线程主循环"""
+        while True:
+            batch = self._collect_batch(request_queue)
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                ERRORS.inc(component='recognition')
+                for _, _, _, future, context in batch:
+                    if not future.done():
+                        context.run(log, f"批量识别失败：{str(e)}")
+                        future.set_result({"success": False, "error": f"识别异常：{str(e)}", "result": []})
+
+    def _process_batch(self, batch):
+        """对一个批次执行一次编码和检索，并把结果分发给各个请求"""
+        image_tensor = torch.cat([item[0] for item in batch], dim=0)
+        max_k = max(item[1] for item in batch)
+
+        image_features = self.recognizer._encode_images(image_tensor)
+        values, indices = self.recognizer._search(image_features, max_k)
+
+        for i, (_, top_k, conf_threshold, future, context) in enumerate(batch):
+            try:
+                result = context.run(self.recognizer._build_results,
+                                     values[i][:top_k], indices[i][:top_k], conf_threshold)
+            except Exception as e:
+                context.run(log, f"识别结果生成失败：{str(e)}")
+                result = {"success": False, "error": f"识别异常：{str(e)}", "result": []}
+            future.set_result(result)
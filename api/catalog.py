@@ -0,0 +1,180 @@
+import csv
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+# 编译后的文物目录文件格式：
+#   8字节魔数 | 8字节头部长度（小端 uint64）| 头部 JSON（UTF-8）| 补零到64字节对齐 | 标签向量（float32，count x dim，行优先）
+# 头部包含标签、名称、朝代、简介，以及编译时使用的模型、提示词模板和数据文件哈希
+CATALOG_MAGIC = b'ARTCAT01'
+CATALOG_FORMAT_VERSION = 1
+CATALOG_ALIGNMENT = 64
+DEFAULT_INTRO = "暂无介绍"
+
+
+class CatalogError(Exception):
+    """文物目录文件损坏或格式不兼容"""
+
+
+def load_artifact_records(path):
+    """
+    读取文物数据CSV（name, dynasty, intro），返回记录列表
+    只使用标准库 csv 模块，服务进程无需导入 pandas
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return [
+            {
+                "name": (row.get("name") or "").strip(),
+                "dynasty": (row.get("dynasty") or "").strip(),
+                "intro": (row.get("intro") or "").strip()
+            }
+            for row in csv.DictReader(f)
+        ]
+
+
+def model_embedding_dim(model):
+    """CLIP 模型输出向量的维度（visual.output_dim 或 text_projection 的列数），无法判断时返回 None"""
+    output_dim = getattr(getattr(model, "visual", None), "output_dim", None)
+    if output_dim is not None:
+        return int(output_dim)
+    text_projection = getattr(model, "text_projection", None)
+    if text_projection is not None:
+        return int(text_projection.shape[1])
+    return None
+
+
+def file_hash(path):
+    """数据文件内容的 SHA-256，用于判断编译后的目录是否过期"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _content_hash(header, embeddings):
+    digest = hashlib.sha256()
+    for field in ("model_name", "prompt_template", "labels", "names", "dynasties", "intros"):
+        digest.update(json.dumps(header[field], ensure_ascii=False).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(embeddings.tobytes())
+    return digest.hexdigest()[:16]
+
+
+class Catalog:
+    """
+    编译后的文物目录：标签、名称、朝代、简介和归一化的标签向量
+    标签向量以写时复制的内存映射方式读取，多个进程读取同一文件时共享物理内存页
+    """
+
+    def __init__(self, header, embeddings, path=None):
+        self.header = header
+        self.embeddings = embeddings
+        self.path = path
+
+    def __len__(self):
+        return self.header["count"]
+
+    @property
+    def labels(self):
+        return self.header["labels"]
+
+    @property
+    def content_hash(self):
+        return self.header["content_hash"]
+
+    @property
+    def dim(self):
+        return self.header["dim"]
+
+    def records(self):
+        """与标签一一对应的文物信息列表，每项包含 name, dynasty, intro，识别时按标签下标直接取用"""
+        return [
+            {"name": name, "dynasty": dynasty, "intro": intro}
+            for name, dynasty, intro in zip(self.header["names"], self.header["dynasties"], self.header["intros"])
+        ]
+
+    def is_current(self, model_name, prompt_template, source_hash=None, dim=None):
+        """
+        目录是否由当前的模型、提示词模板（以及数据文件，source_hash 不为空时）编译而成
+        :param dim: 当前模型的输出向量维度，不为空时同时检查标签向量的维度
+                    （模型名称相同但实际加载的权重不同时，只比较名称无法发现）
+        """
+        return (self.header["model_name"] == model_name
+                and self.header["prompt_template"] == prompt_template
+                and (source_hash is None or self.header["source_hash"] == source_hash)
+                and (dim is None or self.header["dim"] == dim))
+
+
+def write_catalog(path, entries, embeddings, model_name, prompt_template, source_hash):
+    """
+    写入编译后的文物目录
+    先写入临时文件再原子替换，避免多个worker同时启动时读到写了一半的文件
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="<f4")
+    if embeddings.ndim != 2 or embeddings.shape[0] != len(entries):
+        raise ValueError(f"标签向量形状 {embeddings.shape} 与条目数 {len(entries)} 不一致")
+
+    header = {
+        "format_version": CATALOG_FORMAT_VERSION,
+        "model_name": model_name,
+        "prompt_template": prompt_template,
+        "source_hash": source_hash,
+        "count": len(entries),
+        "dim": embeddings.shape[1],
+        "labels": [entry["label"] for entry in entries],
+        "names": [entry["name"] for entry in entries],
+        "dynasties": [entry["dynasty"] for entry in entries],
+        "intros": [entry["intro"] for entry in entries],
+    }
+    header["content_hash"] = _content_hash(header, embeddings)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    prefix_size = len(CATALOG_MAGIC) + 8 + len(header_bytes)
+    padding = -prefix_size % CATALOG_ALIGNMENT
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(CATALOG_MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * padding)
+        f.write(embeddings.tobytes())
+    os.replace(tmp_path, path)
+    return header
+
+
+def load_catalog(path):
+    """
+    读取编译后的文物目录：头部解析为 JSON，标签向量以内存映射方式读取（不复制到内存）
+    :raises FileNotFoundError: 文件不存在
+    :raises CatalogError: 文件损坏或格式版本不兼容
+    """
+    with open(path, "rb") as f:
+        if f.read(len(CATALOG_MAGIC)) != CATALOG_MAGIC:
+            raise CatalogError(f"不是文物目录文件：{path}")
+        try:
+            (header_size,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_size).decode("utf-8"))
+        except (struct.error, ValueError) as e:
+            raise CatalogError(f"文物目录头部损坏：{str(e)}")
+
+    if header.get("format_version") != CATALOG_FORMAT_VERSION:
+        raise CatalogError(f"文物目录格式版本不兼容：{header.get('format_version')}")
+
+    offset = len(CATALOG_MAGIC) + 8 + header_size
+    offset += -offset % CATALOG_ALIGNMENT
+    count, dim = header["count"], header["dim"]
+    if os.path.getsize(path) != offset + count * dim * 4:
+        raise CatalogError(f"文物目录文件大小与头部不一致：{path}")
+
+    if count:
+        embeddings = np.memmap(path, dtype="<f4", mode="c", offset=offset, shape=(count, dim))
+    else:
+        embeddings = np.zeros((0, dim), dtype=np.float32)
+    return Catalog(header, embeddings, path)
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+from .catalog import DEFAULT_INTRO, CatalogError, file_hash, load_catalog, model_embedding_dim, write_catalog
+
+# 文物数据的必需列
+CATALOG_COLUMNS = ["name", "dynasty", "intro"]
+
+
+def read_artifact_data(path):
+    """读取文物数据CSV，UTF-8 解码失败时按 GBK 读取（Windows 下编辑保存的文件）"""
+    try:
+        return pd.read_csv(path, encoding="utf-8", dtype=str, keep_default_na=False)
+    except UnicodeDecodeError:
+        return pd.read_csv(path, encoding="gbk", dtype=str, keep_default_na=False)
+
+
+def clean_artifact_data(df):
+    """
+    清洗文物数据（向量化操作）：去掉首尾空白，过滤名称或朝代为空的行，按 (名称, 朝代) 去重并保留第一次出现的行
+    标签为 "名称-朝代"，不同的 (名称, 朝代) 可能拼出相同的标签（如 "a-b" + "c" 与 "a" + "b-c"），
+    标签是识别结果的唯一标识，相同时只保留第一次出现的行并打印警告
+    结果保持数据文件中的原有顺序，相同的数据文件每次得到相同的结果
+    :return: 包含 label, name, dynasty, intro 列的 DataFrame，label 互不相同
+    """
+    missing = [column for column in CATALOG_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"文物数据缺少必需的列：{', '.join(missing)}")
+
+    df = df[CATALOG_COLUMNS].apply(lambda column: column.str.strip())
+    df = df[(df["name"] != "") & (df["dynasty"] != "")]
+    df = df.drop_duplicates(subset=["name", "dynasty"], keep="first").reset_index(drop=True)
+    df["intro"] = df["intro"].mask(df["intro"] == "", DEFAULT_INTRO)
+    df.insert(0, "label", df["name"] + "-" + df["dynasty"])
+
+    collisions = df["label"].duplicated(keep=False)
+    if collisions.any():
+        for label, group in df[collisions].groupby("label", sort=False):
+            kept, *dropped = [f"{name}（{dynasty}）" for name, dynasty in zip(group["name"], group["dynasty"])]
+            print(f"警告：标签 {label} 对应多件文物，保留 {kept}，忽略 {'、'.join(dropped)}")
+        df = df.drop_duplicates(subset=["label"], keep="first").reset_index(drop=True)
+    return df
+
+
+def encode_labels(model, labels, prompt_template, device, batch_size=256):
+    """
+    将标签文本编码为归一化的 CLIP 向量（float32 numpy 数组），分批编码避免标签很多时占满内存
+    :param prompt_template: 提示词模板，{} 会被替换为标签
+    """
+    import clip
+    import torch
+
+    features = []
+    for start in range(0, len(labels), batch_size):
+        texts = [prompt_template.format(label) for label in labels[start:start + batch_size]]
+        tokens = clip.tokenize(texts).to(device)
+        with torch.no_grad():
+            text_features = model.encode_text(tokens).float()
+        text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+        features.append(text_features.cpu().numpy())
+    return np.concatenate(features)
+
+
+def _previous_embeddings(output_path, model_name, prompt_template, dim=None):
+    """读取上一次编译的目录，用于复用标签向量；不存在、损坏或模型/模板/向量维度不同时返回 None"""
+    try:
+        previous = load_catalog(output_path)
+    except (FileNotFoundError, CatalogError):
+        return None
+    if not previous.is_current(model_name, prompt_template, dim=dim):
+        return None
+    # 旧版本编译的目录中可能有重复的标签（相同标签的向量相同），只保留第一次出现的位置，reindex 要求索引唯一
+    index = pd.Index(previous.labels)
+    unique = ~index.duplicated(keep="first")
+    return pd.Series(np.arange(len(previous))[unique], index=index[unique]), previous.embeddings
+
+
+def compile_catalog(source_path, output_path, model_name, prompt_template, model=None, device=None,
+                    incremental=True, cleaned_output=None):
+    """
+    把文物数据CSV编译为文物目录文件：标签、名称、朝代、简介与标签向量来自同一份数据，不会互相不一致
+    标签向量只取决于标签文本、模型和提示词模板，增量编译时复用上一次编译结果中相同标签的向量，
+    只编码新增或修改过名称/朝代的行；全部可以复用时不需要加载模型
+    :param model: 已加载的 CLIP 模型；为 None 且需要编码时按 model_name 加载
+    :param device: 模型所在设备，默认有GPU时使用GPU
+    :param incremental: 为 False 时重新编码全部标签
+    :param cleaned_output: 不为空时把清洗后的文物数据另存为CSV
+    :return: 编译后重新读取的 Catalog
+    """
+    df = clean_artifact_data(read_artifact_data(source_path))
+    if df.empty:
+        raise ValueError(f"文物数据中没有有效的记录：{source_path}")
+    if cleaned_output:
+        df[CATALOG_COLUMNS].to_csv(cleaned_output, index=False, encoding="utf-8")
+
+    labels = df["label"].to_numpy()
+    dim = model_embedding_dim(model) if model is not None else None
+    previous = _previous_embeddings(output_path, model_name, prompt_template, dim) if incremental else None
+    if previous is not None:
+        previous_index, previous_embeddings = previous
+        positions = previous_index.reindex(labels).to_numpy()
+        reused = ~np.isnan(positions)
+    else:
+        reused = np.zeros(len(labels), dtype=bool)
+
+    to_encode = labels[~reused].tolist()
+    new_embeddings = None
+    if to_encode:
+        if model is None:
+            import clip
+            import torch
+            device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+            model, _ = clip.load(model_name, device=device)
+            model.eval()
+        new_embeddings = encode_labels(model, to_encode, prompt_template, device)
+        if reused.any() and new_embeddings.shape[1] != previous_embeddings.shape[1]:
+            # 上一次编译使用的模型权重与当前不同（名称相同但维度不同），不能复用，全部重新编码
+            print(f"上一次编译的标签向量维度（{previous_embeddings.shape[1]}）与模型输出维度"
+                  f"（{new_embeddings.shape[1]}）不一致，重新编码全部标签")
+            reused[:] = False
+            to_encode = labels.tolist()
+            new_embeddings = encode_labels(model, to_encode, prompt_template, device)
+
+    dim = new_embeddings.shape[1] if new_embeddings is not None else previous_embeddings.shape[1]
+    embeddings = np.empty((len(labels), dim), dtype=np.float32)
+    if reused.any():
+        embeddings[reused] = previous_embeddings[positions[reused].astype(np.int64)]
+    if new_embeddings is not None:
+        embeddings[~reused] = new_embeddings
+    print(f"文物目录共{len(labels)}个标签：复用{int(reused.sum())}个标签向量，新编码{len(to_encode)}个")
+
+    entries = df[["label", "name", "dynasty", "intro"]].to_dict("records")
+    write_catalog(output_path, entries, embeddings, model_name=model_name, prompt_template=prompt_template,
+                  source_hash=file_hash(source_path))
+    return load_catalog(output_path)
@@ -0,0 +1,126 @@
+import threading
+import time
+
+from config import RECOGNIZER_CONFIG
+
+
+def create_local_engine():
+    """在当前进程中加载识别器，按配置叠加动态批处理和结果缓存"""
+    from .artifact_recognizer import ArtifactRecognizer
+    from .batch_scheduler import BatchScheduler
+    from .result_cache import CachedRecognizer, ResultCache
+
+    engine = ArtifactRecognizer()
+
+    batching_config = RECOGNIZER_CONFIG['batching']
+    if batching_config['enabled']:
+        engine = BatchScheduler(
+            engine,
+            max_batch_size=batching_config['max_batch_size'],
+            max_wait_ms=batching_config['max_wait_ms']
+        )
+
+    # 结果缓存放在最外层，命中时连预处理和排队都可以跳过
+    cache_config = RECOGNIZER_CONFIG['result_cache']
+    if cache_config['enabled']:
+        engine = CachedRecognizer(
+            engine,
+            ResultCache(max_size=cache_config['max_size'], ttl_seconds=cache_config['ttl_seconds']),
+            use_perceptual_hash=cache_config['perceptual_hash'],
+            perceptual_max_distance=cache_config['perceptual_max_distance']
+        )
+    return engine
+
+
+def create_recognition_engine():
+    """
+    创建识别引擎，Flask 蓝图和 FastAPI 服务共用
+    - 开启独立推理服务时：返回推理服务客户端，当前进程不加载模型
+    - 否则：在当前进程中加载模型
+    """
+    server_config = RECOGNIZER_CONFIG['inference_server']
+    if server_config['enabled']:
+        from .inference_client import InferenceClient
+        return InferenceClient(
+            address=server_config['address'],
+            authkey=server_config['authkey'],
+            pool_size=server_config['pool_size'],
+            timeout=server_config['timeout']
+        )
+    return create_local_engine()
+
+
+class EngineLoader:
+    """
+    识别引擎加载器
+    模型加载（首次启动时还需下载权重）耗时较长，后台加载模式下 Web 服务可以先启动，
+    加载期间识别接口返回503，/readyz 报告未就绪；加载完成后先做一次预热推理再标记为就绪。
+    """
+
+    def __init__(self, factory):
+        """
+        :param factory: 无参数的引擎创建函数，例如 create_recognition_engine
+        """
+        self.factory = factory
+        self.engine = None
+        self.state = 'pending'
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+
+    def start(self, mode='background'):
+        """
+        开始加载
+        :param mode: eager - 在当前线程中同步加载（gunicorn 预加载模式下在 master 中加载，加载失败直接抛出）
+                     background - 在后台线程中加载，不阻塞应用启动
+        """
+        if mode == 'eager':
+            self.load()
+        else:
+            threading.Thread(target=self._load_in_background, name="engine-loader", daemon=True).start()
+
+    def _load_in_background(self):
+        try:
+            self.load()
+        except Exception:
+            # 失败原因已记录在 state / error 中，由 /readyz 和识别接口返回
+            pass
+
+    def load(self):
+        """加载引擎并预热，重复调用时直接返回已加载的引擎"""
+        with self._lock:
+            if self.engine is not None:
+                return self.engine
+
+            self.state = 'loading'
+            started_at = time.monotonic()
+            try:
+                engine = self.factory()
+                engine.warm_up()
+            except Exception as e:
+                self.state = 'failed'
+                self.error = str(e)
+                print(f"识别引擎加载失败：{str(e)}")
+                raise
+
+            self.load_seconds = round(time.monotonic() - started_at, 2)
+            self.engine = engine
+            self.state = 'ready'
+            print(f"识别引擎加载并预热完成，耗时 {self.load_seconds} 秒")
+            return engine
+
+    def get(self):
+        """返回已就绪的引擎，尚未就绪时返回 None"""
+        return self.engine
+
+    @property
+    def ready(self):
+        return self.engine is not None
+
+    def status(self):
+        """返回加载状态：pending / loading / ready / failed"""
+        return {
+            'state': self.state,
+            'error': self.error,
+            'load_seconds': self.load_seconds
+        }
@@ -0,0 +1,171 @@
+"""
+本地讲解模拟服务：同时兼容 DashScope 文本生成接口和 OpenAI Chat Completions 接口（普通响应和 SSE 流式响应），
+可配置首字延迟、输出速率和错误率，用于在不调用付费大模型的情况下压测讲解接口的吞吐量、缓存和流式推送
+
+用法：
+    python -m api.fake_narration_server --port 8790 --first-token-ms 300 --tokens-per-second 40 --error-rate 0.01
+
+然后把讲解服务指向它（两种后端都可以）：
+    NARRATION_BASE_URL=http://127.0.0.1:8790 NARRATION_API_KEY=sk-fake python app.py
+    NARRATION_BACKEND=openai NARRATION_BASE_URL=http://127.0.0.1:8790 NARRATION_API_KEY=sk-fake python app.py
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NARRATION_TEMPLATE = ('我是{name}，{dynasty}的匠人用心将我塑造成今天的模样。我的造型端庄，纹饰精美，'
+                      '见证了那个时代高超的工艺水平，也记录了古人的生活与信仰。')
+
+
+class FakeNarrationHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # 以下参数在启动时按命令行参数设置
+    first_token_delay = 0.3      # 首字延迟（秒）
+    latency_jitter = 0.0         # 首字延迟的随机波动幅度（秒）
+    tokens_per_second = 40.0     # 输出速率（字/秒），0 表示不限速
+    chunk_size = 4               # 流式响应每段的字数
+    length = 180                 # 讲解字数
+    error_rate = 0.0             # 直接返回错误状态码的请求比例
+    error_status = 500           # 错误状态码（如 429 模拟限流）
+    stream_error_rate = 0.0      # 流式输出到一半时返回错误事件的请求比例
+    rng = random.Random()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json(400, {'code': 'InvalidParameter', 'message': 'invalid json'})
+
+        if self.path.endswith('/chat/completions'):
+            protocol = 'openai'
+            prompt = ''.join(message.get('content', '') for message in request.get('messages', []))
+            stream = bool(request.get('stream'))
+        elif self.path.endswith('/text-generation/generation'):
+            protocol = 'dashscope'
+            prompt = request.get('input', {}).get('prompt', '')
+            stream = self.headers.get('X-DashScope-SSE') == 'enable'
+        else:
+            return self._send_json(404, {'code': 'NotFound', 'message': self.path})
+
+        time.sleep(max(0.0, self.first_token_delay + self.rng.uniform(-1, 1) * self.latency_jitter))
+        if self.rng.random() < self.error_rate:
+            return self._send_json(self.error_status, {'code': 'FakeError', 'message': '模拟的上游错误'})
+
+        text = self._narration(prompt)
+        if stream:
+            self._send_stream(protocol, request.get('model', ''), text)
+        else:
+            if self.tokens_per_second:
+                time.sleep(len(text) / self.tokens_per_second)
+            if protocol == 'openai':
+                body = {'id': self._id(), 'object': 'chat.completion', 'model': request.get('model', ''),
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                                     'finish_reason': 'stop'}]}
+            else:
+                body = {'request_id': self._id(), 'output': {'text': text, 'finish_reason': 'stop'}}
+            self._send_json(200, body)
+
+    def _narration(self, prompt):
+        """按提示词中的文物名称和朝代生成固定长度的讲解"""
+        name = re.search(r'文物：(.*)', prompt)
+        dynasty = re.search(r'朝代：(.*)', prompt)
+        sentence = NARRATION_TEMPLATE.format(name=name.group(1).strip() if name else '这件文物',
+                                             dynasty=dynasty.group(1).strip() if dynasty else '古代')
+        return (sentence * (self.length // len(sentence) + 1))[:self.length]
+
+    def _send_stream(self, protocol, model, text):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        pieces = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        fail_at = len(pieces) // 2 if self.rng.random() < self.stream_error_rate else None
+        chunk_delay = self.chunk_size / self.tokens_per_second if self.tokens_per_second else 0
+        request_id = self._id()
+        try:
+            for i, piece in enumerate(pieces):
+                if i:
+                    time.sleep(chunk_delay)
+                if i == fail_at:
+                    if protocol == 'openai':
+                        data = {'error': {'code': 'fake_stream_error', 'message': '模拟的流式输出中断'}}
+                    else:
+                        data = {'code': 'FakeStreamError', 'message': '模拟的流式输出中断', 'request_id': request_id}
+                    self._write_chunk(f"data:{json.dumps(data, ensure_ascii=False)}\n\n")
+                    break
+                if protocol == 'openai':
+                    data = {'id': request_id, 'object': 'chat.completion.chunk', 'model': model,
+                            'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]}
+                    self._write_chunk(f"data: {json.dumps(data, ensure_ascii=False)}\n\n")
+                else:
+                    data = {'output': {'text': piece, 'finish_reason': 'null'}, 'request_id': request_id}
+                    self._write_chunk(f"id:{i + 1}\nevent:result\ndata:{json.dumps(data, ensure_ascii=False)}\n\n")
+            else:
+                if protocol == 'openai':
+                    self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端中途断开
+            self.close_connection = True
+
+    def _write_chunk(self, event):
+        data = event.encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _id(self):
+        return uuid.uuid4().hex
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地讲解模拟服务（兼容 DashScope 和 OpenAI 接口）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--first-token-ms', type=float, default=300, help='收到请求到返回第一段文字的平均延迟')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='首字延迟的随机波动幅度（均匀分布）')
+    parser.add_argument('--tokens-per-second', type=float, default=40, help='输出速率（字/秒），0 表示不限速')
+    parser.add_argument('--chunk-size', type=int, default=4, help='流式响应每段的字数')
+    parser.add_argument('--length', type=int, default=180, help='讲解字数')
+    parser.add_argument('--error-rate', type=float, default=0, help='直接返回错误状态码的请求比例（0-1）')
+    parser.add_argument('--error-status', type=int, default=500, help='错误状态码，例如 429 模拟限流')
+    parser.add_argument('--stream-error-rate', type=float, default=0, help='流式输出到一半时中断的请求比例（0-1）')
+    parser.add_argument('--seed', type=int, help='随机数种子，固定后错误出现的顺序可复现')
+    args = parser.parse_args()
+
+    FakeNarrationHandler.first_token_delay = args.first_token_ms / 1000
+    FakeNarrationHandler.latency_jitter = args.jitter_ms / 1000
+    FakeNarrationHandler.tokens_per_second = args.tokens_per_second
+    FakeNarrationHandler.chunk_size = max(1, args.chunk_size)
+    FakeNarrationHandler.length = max(1, args.length)
+    FakeNarrationHandler.error_rate = args.error_rate
+    FakeNarrationHandler.error_status = args.error_status
+    FakeNarrationHandler.stream_error_rate = args.stream_error_rate
+    FakeNarrationHandler.rng = random.Random(args.seed)
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeNarrationHandler)
+    server.daemon_threads = True
+    print(f"讲解模拟服务已启动：http://{args.host}:{args.port}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,21 @@
 from flask import Blueprint, request, jsonify
-from config import FRONTEND_CONFIG
+from werkzeug.exceptions import RequestEntityTooLarge
+from config import FRONTEND_CONFIG, RECOGNIZER_CONFIG, UPLOAD_CONFIG, SERVING_CONFIG
 import os
-from .artifact_recognizer import ArtifactRecognizer
+import shutil
+import tempfile
+import zipfile
+import zlib
+from .engine import EngineLoader, create_recognition_engine
+from .preprocess import sniff_image_format
 
 # 创建图像识别API蓝图
 image_api = Blueprint('image_api', __name__)
 
-# 初始化图像识别器
-recognizer = ArtifactRecognizer()
+# 加载识别引擎（本地模型 + 动态批处理，或独立推理服务的客户端）
+# 默认在后台线程中加载，加载完成前识别接口返回503；gunicorn 预加载模式下在 master 中同步加载
+engine_loader = EngineLoader(create_recognition_engine)
+engine_loader.start(SERVING_CONFIG['model_loading'])
 
 @image_api.route('/', methods=['POST'])
 def image_recognition():
@@ -22,73 +30,308 @@ def image_recognition():
     - 前端可以通过此接口上传文物图片进行识别
     """
     try:
-        # 检查是否有文件上传
-        if 'image' not in request.files:
+        recognition_engine, error_response = get_recognition_engine()
+        if error_response:
+            return error_response
+        
+        image_file, error_response = get_uploaded_image()
+        if error_response:
+            return error_response
+        
+        # 使用图像识别器处理图片（直接从上传文件的暂存文件解码，不整体读入内存）
+        recognition_result = recognition_engine.recognize(image_file.stream)
+        
+        # 转换结果格式以匹配现有API结构
+        result = format_recognition_result(recognition_result)
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({
+            'error': f'处理图像时发生错误: {str(e)}',
+            'code': 500
+        }), 500
+
+@image_api.route('/batch', methods=['POST'])
+def batch_image_recognition():
+    """
+    批量图像识别接口
+    输入: 多个图片文件（字段名: images），或一个zip压缩包（字段名: archive）
+    输出: JSON格式的识别结果列表，顺序与上传顺序一致
+    
+    接口说明:
+    - 所有图片的预处理和模型编码在一次批量推理中完成
+    - 单张图片失败不影响其他图片，每项结果单独带有 success 字段
+    """
+    archive_images = None
+    try:
+        recognition_engine, error_response = get_recognition_engine()
+        if error_response:
+            return error_response
+        
+        max_images = RECOGNIZER_CONFIG['batch_endpoint']['max_images']
+        
+        # 收集待识别的图片（文件名, 上传文件或压缩包内图片的暂存文件, 校验错误）
+        if 'archive' in request.files:
+            images = archive_images = read_images_from_archive(request.files['archive'], max_images)
+        else:
+            # 文件名为空或格式不支持的文件同样占一个位置，保证结果与上传顺序一一对应
+            images = []
+            for f in request.files.getlist('images'):
+                error = validate_filename(f.filename)
+                images.append((f.filename, None, error) if error else
+                              (f.filename, f.stream, validate_image_stream(f.stream)))
+        
+        if images is None:
             return jsonify({
-                'error': '未找到图片文件',
+                'error': '压缩包无法解析或已损坏，请上传zip格式文件',
                 'code': 400
             }), 400
         
-        image_file = request.files['image']
-        
-        # 检查文件是否为空
-        if image_file.filename == '':
+        if not images:
             return jsonify({
-                'error': '未选择文件',
+                'error': '未找到可识别的图片文件',
                 'code': 400
             }), 400
         
-        # 检查文件格式
-        if not allowed_file(image_file.filename):
+        if len(images) > max_images:
             return jsonify({
-                'error': f'不支持的文件格式，支持格式: {", ".join(FRONTEND_CONFIG["allowed_extensions"])}',
+                'error': f'单次最多上传 {max_images} 张图片',
                 'code': 400
             }), 400
         
-        # 使用图像识别器处理图片
-        image_bytes = image_file.read()
-        recognition_result = recognizer.recognize(image_bytes)
+        # 通过校验的图片一次批量推理，未通过的图片单独返回错误
+        valid_inputs = [image_input for _, image_input, error in images if error is None]
+        recognition_results = iter(recognition_engine.recognize_batch(valid_inputs) if valid_inputs else [])
         
-        # 转换结果格式以匹配现有API结构
-        if recognition_result.get('success'):
-            # 成功识别到文物
-            results = recognition_result['result']
-            if results:
-                # 返回最匹配的结果
-                best_match = results[0]
-                result = {
-                    'success': True,
-                    'message': '图像识别成功',
-                    'data': {
-                        'name': best_match['name'],  # 文物名称
-                        'era': best_match['dynasty'],  # 年代
-                        'intro': best_match['intro'],  # 描述
-                        'confidence': best_match['confidence'],  # 识别置信度
-                    },
-                    'all_results': results  # 包含所有匹配结果
-                }
+        data = []
+        for filename, _, error in images:
+            if error is None:
+                item = format_recognition_result(next(recognition_results))
             else:
-                result = {
-                    'success': False,
-                    'error': '未识别到已知文物',
-                    'code': 404
-                }
-        else:
-            # 识别失败
-            result = {
-                'success': False,
-                'error': recognition_result.get('error', '识别失败'),
-                'code': 500
-            }
+                item = {'success': False, 'error': error, 'code': 400}
+            item['filename'] = filename
+            data.append(item)
         
-        return jsonify(result)
+        return jsonify({
+            'success': True,
+            'message': '批量识别完成',
+            'count': len(data),
+            'data': data
+        })
         
+    except RequestEntityTooLarge:
+        return upload_too_large_response(UPLOAD_CONFIG['max_content_length'])
     except Exception as e:
         return jsonify({
-            'error': f'处理图像时发生错误: {str(e)}',
+            'error': f'批量处理图像时发生错误: {str(e)}',
+            'code': 500
+        }), 500
+    finally:
+        # 压缩包内的图片解压到了临时文件，识别完成后关闭（删除）
+        for _, image_file, _ in archive_images or []:
+            if image_file is not None:
+                image_file.close()
+
+@image_api.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """识别结果缓存统计接口：返回缓存条目数、命中次数、未命中次数和命中率"""
+    try:
+        recognition_engine, error_response = get_recognition_engine()
+        if error_response:
+            return error_response
+        
+        # 本地引擎未开启缓存时没有 cache_stats 方法；独立推理服务未开启缓存时返回 None
+        stats = recognition_engine.cache_stats() if hasattr(recognition_engine, 'cache_stats') else None
+        if stats is None:
+            return jsonify({
+                'success': False,
+                'error': '识别结果缓存未开启',
+                'code': 404
+            }), 404
+        return jsonify({
+            'success': True,
+            'data': stats
+        })
+    except Exception as e:
+        return jsonify({
+            'error': f'获取缓存统计时发生错误: {str(e)}',
             'code': 500
         }), 500
 
+def get_recognition_engine():
+    """
+    获取已就绪的识别引擎
+    :return: (engine, error_response)，模型尚未加载完成或加载失败时 error_response 为503响应
+    """
+    engine = engine_loader.get()
+    if engine is not None:
+        return engine, None
+    
+    status = engine_loader.status()
+    if status['state'] == 'failed':
+        error = f'识别模型加载失败: {status["error"]}'
+    else:
+        error = '识别模型正在加载，请稍后重试'
+    return None, (jsonify({
+        'error': error,
+        'code': 503
+    }), 503, {'Retry-After': '5'})
+
+def get_uploaded_image():
+    """
+    校验上传的图片文件（字段名: image）
+    在解析请求体之前先根据 Content-Length 检查大小，只读取文件头判断是否为图片
+    :return: (image_file, error_response)，校验失败时 error_response 为可直接返回的错误响应
+    """
+    # 检查请求体大小（此时尚未读取请求体）
+    max_size = UPLOAD_CONFIG['max_image_size']
+    if request.content_length and request.content_length > max_size:
+        return None, upload_too_large_response(max_size)
+    
+    # 检查是否有文件上传：本次请求的上限收紧为单张图片的上限，
+    # 未声明 Content-Length（分块传输）的请求体读取超过上限时立即中止并抛出 RequestEntityTooLarge，不会继续暂存
+    request.max_content_length = max_size
+    try:
+        has_image = 'image' in request.files
+    except RequestEntityTooLarge:
+        return None, upload_too_large_response(max_size)
+    if not has_image:
+        return None, (jsonify({
+            'error': '未找到图片文件',
+            'code': 400
+        }), 400)
+    
+    image_file = request.files['image']
+    
+    # 检查文件名和文件格式，再检查文件头，扩展名正确但内容不是图片时直接拒绝
+    error = validate_filename(image_file.filename) or validate_image_stream(image_file.stream)
+    if error:
+        return None, (jsonify({
+            'error': error,
+            'code': 400
+        }), 400)
+    
+    return image_file, None
+
+def validate_filename(filename):
+    """检查文件名：为空或扩展名不支持时返回错误信息，否则返回 None"""
+    if not filename:
+        return '未选择文件'
+    if not allowed_file(filename):
+        return f'不支持的文件格式，支持格式: {", ".join(FRONTEND_CONFIG["allowed_extensions"])}'
+    return None
+
+def validate_image_stream(stream):
+    """
+    校验单张上传图片：大小不超过单张图片上限，文件头是支持的图片格式
+    :param stream: 上传文件的暂存文件（可 seek）
+    :return: 错误信息；校验通过时返回 None
+    """
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    if size > UPLOAD_CONFIG['max_image_size']:
+        return f'图片过大，最大允许 {UPLOAD_CONFIG["max_image_size"] // (1024 * 1024)}MB'
+    header = stream.read(16)
+    stream.seek(0)
+    return validate_image_bytes(header)
+
+def validate_image_bytes(header):
+    """根据文件头判断是否为支持的图片格式，不是时返回错误信息"""
+    if sniff_image_format(header[:16]) is None:
+        return '文件内容不是有效的图片'
+    return None
+
+def upload_too_large_response(max_size):
+    """上传内容超过大小限制时的错误响应"""
+    return jsonify({
+        'error': f'上传文件过大，最大允许 {max_size // (1024 * 1024)}MB',
+        'code': 413
+    }), 413
+
+def format_recognition_result(recognition_result):
+    """将识别器返回的结果转换为接口返回的JSON结构"""
+    if recognition_result.get('success'):
+        # 成功识别到文物
+        results = recognition_result['result']
+        if results:
+            # 返回最匹配的结果
+            best_match = results[0]
+            return {
+                'success': True,
+                'message': '图像识别成功',
+                'data': {
+                    'name': best_match['name'],  # 文物名称
+                    'era': best_match['dynasty'],  # 年代
+                    'intro': best_match['intro'],  # 描述
+                    'confidence': best_match['confidence'],  # 识别置信度
+                },
+                'all_results': results  # 包含所有匹配结果
+            }
+        return {
+            'success': False,
+            'error': '未识别到已知文物',
+            'code': 404
+        }
+    # 识别失败
+    return {
+        'success': False,
+        'error': recognition_result.get('error', '识别失败'),
+        'code': 500
+    }
+
+# 压缩包损坏（CRC 校验失败、数据被截断）、加密或使用不支持的压缩算法时 zipfile 可能抛出的异常
+ARCHIVE_ERRORS = (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError, RuntimeError, ValueError)
+
+# 压缩包内的图片解压到暂存文件，超过该大小的部分写入磁盘（与 Werkzeug 暂存上传文件的阈值相同）
+ARCHIVE_SPOOL_SIZE = 500 * 1024
+
+def extract_archive_member(archive, info):
+    """把压缩包内的一个文件按块解压到暂存文件（解压时校验CRC），不会整体读入内存"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_SIZE)
+    try:
+        with archive.open(info) as member:
+            shutil.copyfileobj(member, spooled)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled
+
+def read_images_from_archive(archive_file, max_images):
+    """
+    从zip压缩包中读取图片，按压缩包内的顺序返回 (文件名, 暂存文件, 校验错误) 列表（目录除外，格式不支持的文件标记为错误）
+    每张图片逐个解压到暂存文件（与上传文件一样，较大的图片写入磁盘），全部图片不会同时解压在内存中；
+    返回的暂存文件由调用方在识别完成后关闭
+    压缩包无法解析或其中的文件已损坏时返回 None；超过 max_images 张时只多读一张用于判断超限
+    声明的解压后大小超过单张图片上限的文件不解压，直接标记为错误，避免压缩炸弹占满磁盘
+    """
+    max_size = UPLOAD_CONFIG['max_image_size']
+    images = []
+    try:
+        archive = zipfile.ZipFile(archive_file.stream)
+        with archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                error = validate_filename(info.filename)
+                if error:
+                    images.append((info.filename, None, error))
+                elif info.file_size > max_size:
+                    images.append((info.filename, None, f'图片过大，最大允许 {max_size // (1024 * 1024)}MB'))
+                else:
+                    image_file = extract_archive_member(archive, info)
+                    images.append((info.filename, image_file, validate_image_stream(image_file)))
+                if len(images) > max_images:
+                    break
+        return images
+    except ARCHIVE_ERRORS:
+        for _, image_file, _ in images:
+            if image_file is not None:
+                image_file.close()
+        return None
+
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
     return '.' in filename and \
@@ -0,0 +1,173 @@
+import os
+
+import torch
+
+from .serving import inference_context
+from .process_local import ProcessLocal
+
+# 可选的图片编码后端
+BACKENDS = ('torch', 'torch_int8', 'onnx')
+
+# torch 后端可选的图优化方式
+JIT_MODES = ('none', 'trace', 'compile')
+
+
+class TorchImageEncoder:
+    """
+    PyTorch 原始精度（CPU 上为 fp32）的 CLIP 图片编码器，即 clip.load 加载的模型本身
+    可选用 torch.jit.trace 或 torch.compile 优化图片编码部分
+    """
+
+    name = 'torch'
+
+    def __init__(self, model, jit='none', input_size=224):
+        """
+        :param model: clip.load 返回的模型
+        :param jit: 图优化方式，none / trace / compile
+        :param input_size: 模型输入边长（trace 时用于构造示例输入）
+        """
+        if jit not in JIT_MODES:
+            raise ValueError(f"不支持的图优化方式：{jit}，可选：{', '.join(JIT_MODES)}")
+        self.model = model
+        self.jit = jit
+        self.forward = model.encode_image
+
+        if jit == 'trace':
+            # 用两种批次大小检查 trace 结果，确保批次维度没有被固化
+            device = next(model.parameters()).device
+            example = torch.randn(1, 3, input_size, input_size, dtype=model.dtype, device=device)
+            check = torch.randn(2, 3, input_size, input_size, dtype=model.dtype, device=device)
+            with torch.no_grad():
+                self.forward = torch.jit.trace(_ImageEncoderModule(model).eval(), example,
+                                               check_inputs=[(check,)])
+        elif jit == 'compile':
+            # torch.compile 在首次推理时才编译，fork 出来的 worker 各自编译一次
+            self.forward = torch.compile(_ImageEncoderModule(model).eval())
+
+        if jit != 'none':
+            self.name = f'torch+{jit}'
+
+    def encode(self, image_tensor):
+        """编码图片张量，返回未归一化的图片向量"""
+        with inference_context():
+            return self.forward(image_tensor)
+
+
+class QuantizedImageEncoder:
+    """
+    PyTorch 动态量化（int8）的 CLIP 图片编码器
+    把视觉编码器中的全连接层权重量化为 int8，激活值在推理时动态量化；只支持 CPU。
+    原模型保持不变，文本编码器仍使用原始精度（标签向量只在启动时编码一次）。
+    """
+
+    name = 'torch_int8'
+
+    def __init__(self, model):
+        self.dtype = model.dtype
+        self.visual = torch.ao.quantization.quantize_dynamic(
+            model.visual, {torch.nn.Linear}, dtype=torch.qint8)
+        self.visual.eval()
+
+    def encode(self, image_tensor):
+        with inference_context():
+            return self.visual(image_tensor.type(self.dtype))
+
+
+class OnnxImageEncoder:
+    """
+    ONNX Runtime 运行的 CLIP 图片编码器（CPU）
+    模型文件由 scripts/export_onnx.py 导出。推理会话按进程延迟创建，
+    gunicorn 预加载模式下 fork 出来的 worker 各自创建，不会继承 master 中的线程池。
+    """
+
+    name = 'onnx'
+
+    def __init__(self, model_path, num_threads=0):
+        """
+        :param model_path: 导出的 .onnx 文件路径
+        :param num_threads: 单次推理使用的线程数，0 表示使用 ONNX Runtime 的默认值
+        """
+        import onnxruntime  # 可选依赖，只在选择该后端时导入
+
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNX模型文件不存在：{model_path}，请先运行 scripts/export_onnx.py 导出")
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self._onnxruntime = onnxruntime
+        self._session = ProcessLocal(self._create_session)
+
+    def _create_session(self):
+        options = self._onnxruntime.SessionOptions()
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        return self._onnxruntime.InferenceSession(self.model_path, options, providers=['CPUExecutionProvider'])
+
+    def encode(self, image_tensor):
+        session = self._session.get()
+        inputs = {session.get_inputs()[0].name: image_tensor.float().cpu().numpy()}
+        return torch.from_numpy(session.run(None, inputs)[0])
+
+
+class _ImageEncoderModule(torch.nn.Module):
+    """导出 ONNX、trace 和 compile 用的包装模块：只包含 CLIP 的图片编码部分"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, image):
+        return self.model.encode_image(image)
+
+
+def export_onnx(model, path, input_size=224, opset_version=17):
+    """
+    把 CLIP 图片编码器导出为 ONNX 模型（批次维度可变）
+    :param model: clip.load 返回的模型（需在 CPU 上、fp32 精度）
+    :param path: 输出文件路径
+    :param input_size: 模型输入边长
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    dummy = torch.randn(1, 3, input_size, input_size)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            _ImageEncoderModule(model).eval(), (dummy,), tmp_path,
+            input_names=['image'], output_names=['image_features'],
+            dynamic_axes={'image': {0: 'batch'}, 'image_features': {0: 'batch'}},
+            opset_version=opset_version, dynamo=False
+        )
+    os.replace(tmp_path, path)
+    return path
+
+
+def create_image_encoder(model, device, backend_config, jit='none', input_size=224):
+    """
+    按配置创建图片编码后端
+    int8 量化和 ONNX Runtime 后端只支持 CPU；所选后端不可用时打印原因并回退到 PyTorch 原始精度
+    :param model: clip.load 返回的模型
+    :param device: 运行设备
+    :param backend_config: RECOGNIZER_CONFIG['inference_backend']
+    :param jit: torch 后端的图优化方式（SERVING_CONFIG['jit']）
+    :param input_size: 模型输入边长
+    """
+    backend = backend_config['backend']
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的推理后端：{backend}，可选：{', '.join(BACKENDS)}")
+
+    if backend == 'torch':
+        return TorchImageEncoder(model, jit=jit, input_size=input_size)
+
+    if device != 'cpu':
+        print(f"推理后端 {backend} 只支持CPU，当前设备为 {device}，使用 torch 后端")
+        return TorchImageEncoder(model, jit=jit, input_size=input_size)
+
+    try:
+        if backend == 'torch_int8':
+            return QuantizedImageEncoder(model)
+        return OnnxImageEncoder(backend_config['onnx_path'], num_threads=backend_config['onnx_threads'])
+    except (ImportError, OSError, RuntimeError) as e:
+        print(f"推理后端 {backend} 初始化失败，使用 torch 后端：{str(e)}")
+        return TorchImageEncoder(model, jit=jit, input_size=input_size)
@@ -0,0 +1,123 @@
+import queue
+import time
+from multiprocessing.connection import Client
+
+from .metrics import ERRORS
+from .process_local import ProcessLocal
+
+
+class InferenceClient:
+    """
+    推理服务客户端
+    提供与 ArtifactRecognizer 相同的 recognize / recognize_batch 调用方式，
+    实际推理由独立的推理进程（api/inference_server.py）完成，Web 进程本身不加载模型。
+    """
+
+    def __init__(self, address, authkey, pool_size=8, timeout=60):
+        """
+        :param address: 推理服务的 Unix socket 文件路径
+        :param authkey: 连接认证密钥（bytes），不能为空
+        :param pool_size: 连接池中最多保留的空闲连接数
+        :param timeout: 等待推理结果的最长时间（秒）
+        """
+        if not authkey:
+            raise ValueError("未配置推理服务认证密钥（INFERENCE_SERVER_AUTHKEY）")
+        self.address = address
+        self.authkey = authkey
+        self.pool_size = pool_size
+        self.timeout = timeout
+        # 空闲连接池：连接不能跨进程复用，每个进程使用自己的连接池
+        self._pool = ProcessLocal(lambda: queue.LifoQueue(maxsize=self.pool_size))
+
+    def _connect(self):
+        """新建一个到推理服务的连接"""
+        return Client(self.address, family='AF_UNIX', authkey=self.authkey)
+
+    def _acquire(self):
+        """从连接池取出一个空闲连接，没有则新建"""
+        try:
+            return self._pool.get().get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _release(self, conn):
+        """把连接放回连接池，池已满时直接关闭"""
+        try:
+            self._pool.get().put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _call(self, method, *args, **kwargs):
+        """
+        发送一次远程调用并等待结果
+        连接失效（推理服务重启等）时丢弃该连接并新建连接重试一次；
+        超过 timeout 没有返回时关闭该连接（迟到的结果不能再被其他请求读到）并抛出 TimeoutError，不重试
+        """
+        for attempt in range(2):
+            conn = self._acquire() if attempt == 0 else self._connect()
+            try:
+                conn.send((method, args, kwargs))
+                if not conn.poll(self.timeout):
+                    raise TimeoutError(f"推理服务在 {self.timeout} 秒内没有返回结果")
+                status, payload = conn.recv()
+            except TimeoutError:
+                conn.close()
+                raise
+            except (EOFError, OSError):
+                conn.close()
+                if attempt == 1:
+                    raise
+                continue
+            self._release(conn)
+            if status != 'ok':
+                raise RuntimeError(payload)
+            return payload
+
+    @staticmethod
+    def _serializable(image_input):
+        """文件对象无法跨进程传递，发送前读取为字节流"""
+        if hasattr(image_input, 'read'):
+            image_input.seek(0)
+            return image_input.read()
+        return image_input
+
+    def recognize(self, image_input, top_k=3, conf_threshold=0.2):
+        """远程识别单张图片，返回格式与 ArtifactRecognizer.recognize 一致"""
+        try:
+            return self._call('recognize', self._serializable(image_input), top_k=top_k, conf_threshold=conf_threshold)
+        except TimeoutError as e:
+            ERRORS.inc(component='inference_client')
+            return {"success": False, "error": f"推理服务响应超时：{str(e)}", "result": []}
+        except Exception as e:
+            ERRORS.inc(component='inference_client')
+            return {"success": False, "error": f"推理服务不可用：{str(e)}", "result": []}
+
+    def recognize_batch(self, image_inputs, top_k=3, conf_threshold=0.2):
+        """远程批量识别，返回格式与 ArtifactRecognizer.recognize_batch 一致"""
+        try:
+            return self._call('recognize_batch', [self._serializable(image_input) for image_input in image_inputs],
+                              top_k=top_k, conf_threshold=conf_threshold)
+        except Exception as e:
+            ERRORS.inc(component='inference_client')
+            reason = "推理服务响应超时" if isinstance(e, TimeoutError) else "推理服务不可用"
+            error = {"success": False, "error": f"{reason}：{str(e)}", "result": []}
+            return [dict(error) for _ in image_inputs]
+
+    def cache_stats(self):
+        """获取推理进程中的结果缓存统计，推理进程未开启结果缓存时返回 None"""
+        return self._call('cache_stats')
+
+    def ping(self):
+        """检查推理服务是否可用"""
+        try:
+            return self._call('ping') == 'pong'
+        except Exception:
+            return False
+
+    def warm_up(self, timeout=60):
+        """等待推理服务可用（推理服务自己负责加载和预热模型），超时后抛出异常"""
+        deadline = time.monotonic() + timeout
+        while not self.ping():
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"推理服务不可用：{self.address}")
+            time.sleep(0.5)
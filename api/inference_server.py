@@ -0,0 +1,158 @@
+import os
+import socket
+import stat
+import sys
+import threading
+from multiprocessing.connection import Listener
+
+from config import RECOGNIZER_CONFIG
+
+# 允许客户端调用的识别方法
+ALLOWED_METHODS = {'recognize', 'recognize_batch', 'cache_stats'}
+
+
+class InferenceServer:
+    """
+    独立的模型推理进程
+    独占一个识别引擎（ArtifactRecognizer，可叠加动态批处理），通过本地 Unix socket 为各个 Web worker 提供识别服务。
+    每个客户端连接由一个线程负责收发，多个连接上的并发请求会在批处理调度器中合并推理。
+    """
+
+    def __init__(self, engine, address, authkey):
+        """
+        :param engine: 提供 recognize / recognize_batch 方法的识别引擎
+        :param address: Unix socket 文件路径，所在目录必须只有当前用户可以访问
+        :param authkey: 连接认证密钥（bytes），不能为空
+        """
+        if not authkey:
+            raise ValueError("未配置推理服务认证密钥（INFERENCE_SERVER_AUTHKEY）")
+        self.engine = engine
+        self.address = address
+        self.authkey = authkey
+
+    def serve_forever(self):
+        """监听 socket 并为每个连接启动一个处理线程"""
+        prepare_socket_path(self.address)
+
+        # socket 文件创建时即为 0600，只有当前用户可以连接
+        old_umask = os.umask(0o177)
+        try:
+            listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        finally:
+            os.umask(old_umask)
+
+        with listener:
+            print(f"推理服务已启动，监听地址：{self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"接受连接失败：{str(e)}")
+                    continue
+                threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+
+    def _handle_connection(self, conn):
+        """循环处理单个连接上的请求，直到客户端断开"""
+        with conn:
+            while True:
+                try:
+                    method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                try:
+                    if method == 'ping':
+                        response = ('ok', 'pong')
+                    elif method == 'cache_stats' and not hasattr(self.engine, 'cache_stats'):
+                        # 推理进程未开启结果缓存
+                        response = ('ok', None)
+                    elif method in ALLOWED_METHODS:
+                        response = ('ok', getattr(self.engine, method)(*args, **kwargs))
+                    else:
+                        response = ('error', f'不支持的方法：{method}')
+                except Exception as e:
+                    response = ('error', str(e))
+
+                try:
+                    conn.send(response)
+                except (EOFError, OSError):
+                    return
+
+
+def prepare_socket_path(address):
+    """
+    检查 socket 文件所在的目录，并清理上次异常退出残留的 socket 文件
+    目录不存在时以 0700 权限创建；目录不属于当前用户或其他用户可以访问时拒绝启动。
+    只删除属于当前用户、且没有服务在监听的 socket 文件，路径上是其他文件时拒绝启动。
+    """
+    directory = os.path.dirname(os.path.abspath(address))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"socket 所在目录必须属于当前用户且权限为 0700：{directory}")
+
+    try:
+        info = os.lstat(address)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        raise RuntimeError(f"socket 路径已被其他文件占用：{address}")
+    if socket_in_use(address):
+        raise RuntimeError(f"已有推理服务在监听：{address}")
+    os.unlink(address)
+
+
+def socket_in_use(address):
+    """是否有进程在监听该 Unix socket"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+        return True
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False
+    finally:
+        sock.close()
+
+
+def parse_cpu_list(cpu_list):
+    """解析CPU核心列表，例如 "0-3,6" -> {0, 1, 2, 3, 6}"""
+    cpus = set()
+    for part in cpu_list.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def main():
+    """推理服务入口：python -m api.inference_server"""
+    from .engine import create_local_engine
+
+    server_config = RECOGNIZER_CONFIG['inference_server']
+    if not server_config['authkey']:
+        sys.exit("未配置推理服务认证密钥，请设置环境变量 INFERENCE_SERVER_AUTHKEY（Web 进程使用相同的值）")
+
+    # 把推理进程绑定到指定的CPU核心，与Web进程互不争抢
+    if server_config['cpu_affinity'] and hasattr(os, 'sched_setaffinity'):
+        cpus = parse_cpu_list(server_config['cpu_affinity'])
+        os.sched_setaffinity(0, cpus)
+        print(f"推理进程已绑定CPU核心：{sorted(cpus)}")
+
+    engine = create_local_engine()
+    engine.warm_up()
+
+    server = InferenceServer(
+        engine,
+        address=server_config['address'],
+        authkey=server_config['authkey']
+    )
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# 各处理阶段耗时的分桶（秒），同时覆盖毫秒级的模型推理和数十秒的大模型调用
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# 批次大小分桶
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class _Metric:
+    """指标基类：按标签值分别保存数据"""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        """返回 (后缀, 标签列表, 数值) 列表"""
+        with self._lock:
+            return [('', list(zip(self.labelnames, key)), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值；也可以设置回调函数，在采集时读取当前值（例如队列长度）"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function, **labels):
+        """采集时调用 function() 取值，替代手动 set"""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        for key, function in functions.items():
+            try:
+                values[key] = function()
+            except Exception:
+                continue
+        return [('', list(zip(self.labelnames, key)), value) for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    """分桶统计的直方图，用于耗时和批次大小等分布"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # 每个桶的计数（不累积）+ 超出最大桶的计数、总和
+                state = self._values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+            state['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            state['sum'] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """统计代码块耗时（秒），代码块抛出异常时同样记录"""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            items = sorted((key, list(state['counts']), state['sum']) for key, state in self._values.items())
+        for key, counts, total in items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', labels + [('le', _format_value(bound))], cumulative))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, cumulative))
+        return samples
+
+
+class Registry:
+    """指标注册表，按 Prometheus 文本格式输出全部指标"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# 进程内的全局注册表（gunicorn 多 worker 时每个 worker 各自统计）
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'artifact_stage_seconds',
+    '各处理阶段耗时（秒）：decode / preprocess / encode / search / lookup / narration_upstream / narration_first_token',
+    labelnames=('stage',)
+))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    'artifact_batch_size', '每次送入模型编码的图片数', buckets=BATCH_SIZE_BUCKETS
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'artifact_queue_depth', '等待处理的请求数', labelnames=('queue',)
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'artifact_cache_requests_total', '缓存查找次数，result 为 hit / perceptual_hit / miss / coalesced',
+    labelnames=('cache', 'result')
+))
+ERRORS = REGISTRY.register(Counter(
+    'artifact_errors_total', '各环节的错误次数', labelnames=('component',)
+))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'artifact_http_requests_total', 'HTTP 请求数', labelnames=('endpoint', 'method', 'status')
+))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'artifact_http_request_seconds', 'HTTP 请求耗时（秒，流式响应为返回响应头之前的耗时）', labelnames=('endpoint',)
+))
+RESILIENCE_EVENTS = REGISTRY.register(Counter(
+    'artifact_resilience_events_total',
+    '上游调用的容错事件，event 为 retry / hedge / hedge_won / deadline_exceeded / circuit_rejected / fallback',
+    labelnames=('component', 'event')
+))
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    'artifact_circuit_state', '熔断器状态：0 关闭 / 1 半开 / 2 打开', labelnames=('component',)
+))
@@ -0,0 +1,304 @@
+import os
+import sqlite3
+import threading
+import time
+
+from .metrics import CACHE_REQUESTS
+from .process_local import ProcessLocal
+from .result_cache import ResultCache
+
+
+def narration_cache_key(name, dynasty, model, prompt_version):
+    """讲解缓存键：文物名称、朝代、模型和提示词版本任意一项不同都视为不同的讲解"""
+    return f"{model}|{prompt_version}|{name}|{dynasty}"
+
+
+class NarrationStore:
+    """
+    基于 SQLite 的讲解持久化存储
+    进程重启或多个 worker 之间都可以复用已经生成过的讲解；每个进程的每个线程使用独立的数据库连接
+    连接在第一次读写时才创建，gunicorn --preload 在 fork 之前导入应用时不会打开数据库，
+    fork 出的 worker 也不会沿用父进程的连接
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # 每个进程的每个线程各自的连接；父进程打开的连接在子进程中不再使用，也不关闭
+        self._local = ProcessLocal(threading.local)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connect(self):
+        """返回当前进程、当前线程的连接，不存在时新建（并确保表结构存在）"""
+        local = self._local.get()
+        conn = getattr(local, 'conn', None)
+        if conn is not None:
+            return conn
+        conn = sqlite3.connect(self.path, timeout=10)
+        # WAL 模式下读写互不阻塞，适合多个 worker 同时访问
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS narrations ("
+                "cache_key TEXT PRIMARY KEY, name TEXT, dynasty TEXT, model TEXT, "
+                "prompt_version TEXT, narration TEXT NOT NULL, created_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS narrations_artifact ON narrations (name, dynasty)")
+        local.conn = conn
+        return conn
+
+    def get(self, cache_key):
+        """读取讲解，不存在时返回 None"""
+        row = self._connect().execute(
+            "SELECT narration FROM narrations WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def latest(self, name, dynasty):
+        """读取该文物最近一次生成的讲解（不限模型和提示词版本），用作兜底讲解；不存在时返回 None"""
+        row = self._connect().execute(
+            "SELECT narration FROM narrations WHERE name = ? AND dynasty = ? ORDER BY created_at DESC LIMIT 1",
+            (name, dynasty)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, cache_key, narration, name='', dynasty='', model='', prompt_version=''):
+        """写入或覆盖讲解"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO narrations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cache_key, name, dynasty, model, prompt_version, narration, time.time())
+            )
+
+
+class _Flight:
+    """
+    一次正在进行的讲解生成（single-flight 的领头请求）
+    流式生成时逐段保存已生成的文字，跟随的请求从头读取已有的文字并等待后续文字；
+    结束后保存完整讲解或异常，所有等待的请求拿到相同的结果
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.narration = None
+        self.error = None
+        self.done = False
+        # 写入持久化存储的附加字段，由领头请求设置
+        self.metadata = {}
+        # 跟随的请求数（在 NarrationCache._lock 中读写）
+        self.followers = 0
+        self._cond = threading.Condition()
+
+    def append(self, text):
+        with self._cond:
+            self.chunks.append(text)
+            self._cond.notify_all()
+
+    def finish(self, narration=None, error=None):
+        with self._cond:
+            self.narration = narration
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def result(self):
+        """等待生成结束，返回完整讲解；生成失败时抛出相同的异常"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.done)
+        if self.error is not None:
+            raise self.error
+        return self.narration
+
+    def follow(self):
+        """
+        逐段产出 ('delta', 文字)，最后产出 ('done', 完整讲解)；生成失败时抛出相同的异常
+        领头请求是非流式生成时没有分段文字，结束后把完整讲解作为一段产出
+        """
+        position = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.done or position < len(self.chunks))
+                chunks = self.chunks[position:]
+                done = self.done
+            position += len(chunks)
+            for text in chunks:
+                yield 'delta', text
+            if done:
+                break
+        if self.error is not None:
+            raise self.error
+        if not position:
+            yield 'delta', self.narration
+        yield 'done', self.narration
+
+
+class NarrationCache:
+    """
+    讲解缓存：内存 LRU + 可选的 SQLite 持久化存储
+    并对相同文物的并发请求做合并（single-flight）：同一时刻只有一个请求真正调用大模型，其余请求等待它的结果
+    """
+
+    def __init__(self, max_size=512, ttl_seconds=86400, store=None):
+        """
+        :param max_size: 内存中最多缓存的讲解条数
+        :param ttl_seconds: 内存缓存有效期（秒），0 表示永不过期
+        :param store: 可选的 NarrationStore 持久化存储
+        """
+        self.memory = ResultCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.store = store
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, cache_key):
+        """
+        依次查找内存缓存和持久化存储，持久化存储命中时回填内存缓存
+        持久化存储读取失败（数据库被锁、文件损坏等）时视为未命中，与写入失败一样只记录日志
+        """
+        narration = self.memory.get(cache_key)
+        if narration is None and self.store is not None:
+            try:
+                narration = self.store.get(cache_key)
+            except sqlite3.Error as e:
+                print(f"讲解缓存读取失败：{str(e)}")
+                return None
+            if narration is not None:
+                self.memory.set(cache_key, narration)
+        return narration
+
+    def set(self, cache_key, narration, **metadata):
+        """写入内存缓存和持久化存储"""
+        self.memory.set(cache_key, narration)
+        if self.store is not None:
+            try:
+                self.store.set(cache_key, narration, **metadata)
+            except sqlite3.Error as e:
+                print(f"讲解缓存写入失败：{str(e)}")
+
+    def _lookup(self, cache_key):
+        """读取缓存并统计命中"""
+        narration = self.get(cache_key)
+        if narration is not None:
+            with self._lock:
+                self.hits += 1
+            CACHE_REQUESTS.inc(cache='narration', result='hit')
+        return narration
+
+    def _join(self, cache_key):
+        """
+        加入该缓存键正在进行的生成
+        :return: (flight, leader)，没有正在进行的生成时新建一个，当前请求作为领头请求负责生成
+        """
+        with self._lock:
+            flight = self._inflight.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[cache_key] = _Flight()
+                self.misses += 1
+            else:
+                flight.followers += 1
+                self.coalesced += 1
+        CACHE_REQUESTS.inc(cache='narration', result='miss' if leader else 'coalesced')
+        return flight, leader
+
+    def _finish(self, cache_key, flight, narration=None, error=None):
+        """领头请求结束：成功时先写入缓存，再唤醒等待的请求"""
+        if error is None:
+            self.set(cache_key, narration, **flight.metadata)
+        with self._lock:
+            self._inflight.pop(cache_key, None)
+        flight.finish(narration, error)
+
+    def get_or_generate(self, cache_key, generate, **metadata):
+        """
+        读取缓存，未命中时调用 generate() 生成并写入缓存
+        generate 抛出的异常会原样抛给所有等待该结果的请求，失败结果不会被缓存
+        :param cache_key: narration_cache_key 生成的缓存键
+        :param generate: 无参数的生成函数，返回讲解文案
+        :param metadata: 写入持久化存储的附加字段（name, dynasty, model, prompt_version）
+        """
+        narration = self._lookup(cache_key)
+        if narration is not None:
+            return narration
+
+        flight, leader = self._join(cache_key)
+        if not leader:
+            return flight.result()
+
+        flight.metadata = metadata
+        try:
+            narration = generate()
+        except BaseException as e:
+            self._finish(cache_key, flight, error=e)
+            raise
+        self._finish(cache_key, flight, narration)
+        return narration
+
+    def stream_or_generate(self, cache_key, stream, clean, **metadata):
+        """
+        流式版本的 get_or_generate：逐段产出 ('delta', 文字)，最后产出 ('done', 完整讲解)
+        缓存命中时一次性产出完整讲解；未命中时与 get_or_generate 共用 single-flight：
+        同一文物同一时刻只有一个请求调用大模型，其余请求（流式或非流式）读取它已生成的文字并等待后续文字。
+        领头请求的客户端中途断开时，如果还有其他请求在等待，则在关闭响应时继续读完上游（结果写入缓存），否则直接停止
+        :param stream: 无参数的流式生成函数，返回逐段产出文字的迭代器
+        :param clean: 把拼接后的全部文字整理为最终讲解的函数
+        """
+        narration = self._lookup(cache_key)
+        if narration is not None:
+            yield 'delta', narration
+            yield 'done', narration
+            return
+
+        flight, leader = self._join(cache_key)
+        if not leader:
+            yield from flight.follow()
+            return
+
+        flight.metadata = metadata
+        upstream = None
+        try:
+            upstream = iter(stream())
+            for text in upstream:
+                flight.append(text)
+                yield 'delta', text
+        except GeneratorExit:
+            # 客户端断开：没有其他请求在等待时停止生成（此后的请求会重新发起生成）
+            with self._lock:
+                abandoned = flight.followers == 0
+                if abandoned:
+                    self._inflight.pop(cache_key, None)
+            if abandoned:
+                if hasattr(upstream, 'close'):
+                    upstream.close()
+                return
+            try:
+                for text in upstream:
+                    flight.append(text)
+            except Exception as e:
+                self._finish(cache_key, flight, error=e)
+                return
+            self._finish(cache_key, flight, clean(''.join(flight.chunks)))
+            return
+        except BaseException as e:
+            self._finish(cache_key, flight, error=e)
+            raise
+
+        narration = clean(''.join(flight.chunks))
+        self._finish(cache_key, flight, narration)
+        yield 'done', narration
+
+    def stats(self):
+        """返回缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses + self.coalesced
+            return {
+                'size': len(self.memory),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': round((self.hits + self.coalesced) / total, 4) if total else 0.0,
+                'persistent': self.store is not None
+            }
@@ -0,0 +1,273 @@
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import STAGE_SECONDS, ERRORS
+
+
+class NarrationError(Exception):
+    """讲解生成失败，异常信息即为可直接展示给用户的提示文案"""
+
+    def __init__(self, message, retryable=False):
+        """
+        :param retryable: 是否为可重试的上游故障（网络错误、超时、429/5xx），参数错误、鉴权失败等重试无益
+        """
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class NarrationClient:
+    """
+    讲解生成后端的公共基类：长期复用的大模型 HTTP 客户端
+    - 每个客户端持有独立的 API 密钥，不修改任何 SDK 的进程级全局配置，并发请求之间不会串用密钥
+    - 基于 requests.Session 的 keep-alive 连接池，避免每次讲解都重新建立 TLS 连接
+    - 可配置的连接/读取超时，以及用信号量限制同时进行的上游调用数
+    子类只需描述各自的请求格式和响应格式（_payload / _parse_response / _parse_event）。
+    应用启动时创建一次，由所有请求共用。
+    """
+
+    name = None
+    DEFAULT_BASE_URL = None
+    GENERATION_PATH = None
+    # 流式请求额外携带的请求头
+    STREAM_HEADERS = {'Accept': 'text/event-stream'}
+
+    def __init__(self, api_key, base_url=None, connect_timeout=5, read_timeout=60,
+                 pool_size=16, max_concurrency=8, acquire_timeout=10):
+        """
+        :param api_key: 服务的API密钥
+        :param base_url: 服务地址，默认为各后端的官方地址
+        :param connect_timeout: 建立连接的超时时间（秒）
+        :param read_timeout: 等待响应数据的超时时间（秒）
+        :param pool_size: 连接池中保持的最大连接数
+        :param max_concurrency: 同时进行的最大上游调用数
+        :param acquire_timeout: 等待空闲调用名额的最长时间（秒），超时视为系统繁忙
+        """
+        self.base_url = (base_url or self.DEFAULT_BASE_URL).rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.acquire_timeout = acquire_timeout
+        self.max_concurrency = max_concurrency
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._active = 0
+        self._active_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        })
+
+    def _acquire(self):
+        """占用一个调用名额，等待超时时抛出 NarrationError"""
+        if not self._semaphore.acquire(timeout=self.acquire_timeout):
+            raise NarrationError("系统繁忙，请稍后重试。错误：讲解生成并发已满")
+        with self._active_lock:
+            self._active += 1
+
+    def _release(self):
+        with self._active_lock:
+            self._active -= 1
+        self._semaphore.release()
+
+    def idle_slots(self):
+        """当前空闲的调用名额数（近似值，用于决定是否发起可有可无的后台调用）"""
+        with self._active_lock:
+            return self.max_concurrency - self._active
+
+    def _payload(self, model, prompt, parameters, stream):
+        """构造请求体"""
+        raise NotImplementedError
+
+    def _parse_response(self, data):
+        """从普通响应中取出生成的文本"""
+        raise NotImplementedError
+
+    def _parse_event(self, data):
+        """从一条流式事件中取出新增的文本（没有文本时返回 None），事件表示出错时抛出 NarrationError"""
+        raise NotImplementedError
+
+    def generate(self, model, prompt, timeout=None, **parameters):
+        """
+        生成完整文本
+        :param timeout: 本次调用的 (连接超时, 读取超时)，默认使用客户端配置
+        :param parameters: 生成参数，例如 max_tokens、temperature
+        :return: 生成的文本
+        """
+        try:
+            with STAGE_SECONDS.time(stage='narration_upstream'):
+                return self._generate(model, prompt, parameters, timeout or self.timeout)
+        except NarrationError:
+            ERRORS.inc(component='narration')
+            raise
+
+    def _generate(self, model, prompt, parameters, timeout):
+        self._acquire()
+        try:
+            response = self.session.post(
+                self.base_url + self.GENERATION_PATH,
+                json=self._payload(model, prompt, parameters, stream=False),
+                timeout=timeout
+            )
+        except requests.RequestException as e:
+            raise NarrationError(f"系统繁忙，请稍后重试。错误：{str(e)}", retryable=True)
+        finally:
+            self._release()
+
+        if response.status_code != 200:
+            raise self._status_error(response.status_code)
+        try:
+            return self._parse_response(response.json())
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise NarrationError(f"系统繁忙，请稍后重试。错误：响应格式异常 {str(e)}")
+
+    def stream(self, model, prompt, timeout=None, **parameters):
+        """
+        流式生成文本（SSE），逐段返回新增的文本
+        调用名额在整个流读取期间保持占用
+        :param timeout: 本次调用的 (连接超时, 读取超时)，默认使用客户端配置
+        :return: 生成器，每次产出一段增量文本
+        """
+        started_at = time.perf_counter()
+        first_token = True
+        chunks = self._stream(model, prompt, parameters, timeout or self.timeout)
+        try:
+            for text in chunks:
+                if first_token:
+                    STAGE_SECONDS.observe(time.perf_counter() - started_at, stage='narration_first_token')
+                    first_token = False
+                yield text
+        except NarrationError:
+            ERRORS.inc(component='narration')
+            raise
+        finally:
+            # 客户端中途断开时立即关闭上游连接并释放调用名额
+            chunks.close()
+            STAGE_SECONDS.observe(time.perf_counter() - started_at, stage='narration_upstream')
+
+    def _stream(self, model, prompt, parameters, timeout):
+        self._acquire()
+        try:
+            try:
+                response = self.session.post(
+                    self.base_url + self.GENERATION_PATH,
+                    json=self._payload(model, prompt, parameters, stream=True),
+                    headers=self.STREAM_HEADERS,
+                    timeout=timeout,
+                    stream=True
+                )
+            except requests.RequestException as e:
+                raise NarrationError(f"系统繁忙，请稍后重试。错误：{str(e)}", retryable=True)
+
+            with response:
+                if response.status_code != 200:
+                    raise self._status_error(response.status_code)
+                # text/event-stream 未声明编码时 requests 会按 ISO-8859-1 解码，这里显式指定
+                response.encoding = 'utf-8'
+                try:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith('data:'):
+                            continue
+                        data = line[5:].strip()
+                        if data == '[DONE]':
+                            break
+                        text = self._parse_event(json.loads(data))
+                        if text:
+                            yield text
+                except requests.RequestException as e:
+                    raise NarrationError(f"系统繁忙，请稍后重试。错误：{str(e)}", retryable=True)
+                except (ValueError, KeyError, IndexError, TypeError) as e:
+                    raise NarrationError(f"系统繁忙，请稍后重试。错误：响应格式异常 {str(e)}")
+        finally:
+            self._release()
+
+    def _status_error(self, status_code):
+        """上游返回非200状态码：限流（429）和服务端错误（5xx）可以重试"""
+        return NarrationError(f"生成失败，请稍后重试。错误码：{status_code}",
+                              retryable=status_code == 429 or status_code >= 500)
+
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+
+
+class DashScopeClient(NarrationClient):
+    """阿里云 DashScope 文本生成接口（通义千问）"""
+
+    name = 'dashscope'
+    DEFAULT_BASE_URL = 'https://dashscope.aliyuncs.com/api/v1'
+    GENERATION_PATH = '/services/aigc/text-generation/generation'
+    STREAM_HEADERS = {'X-DashScope-SSE': 'enable', 'Accept': 'text/event-stream'}
+
+    def _payload(self, model, prompt, parameters, stream):
+        if stream:
+            parameters = dict(parameters, incremental_output=True)
+        return {
+            'model': model,
+            'input': {'prompt': prompt},
+            'parameters': parameters
+        }
+
+    def _parse_response(self, data):
+        return data['output']['text']
+
+    def _parse_event(self, data):
+        if 'output' not in data:
+            # 流式输出过程中上游返回的错误事件
+            raise NarrationError(f"生成失败，请稍后重试。错误码：{data.get('code', '未知')}", retryable=True)
+        return data['output'].get('text')
+
+
+class OpenAICompatibleClient(NarrationClient):
+    """
+    OpenAI 兼容的 Chat Completions 接口
+    适用于 OpenAI、DashScope 兼容模式（https://dashscope.aliyuncs.com/compatible-mode/v1）以及 vLLM 等自建服务
+    """
+
+    name = 'openai'
+    DEFAULT_BASE_URL = 'https://api.openai.com/v1'
+    GENERATION_PATH = '/chat/completions'
+
+    def _payload(self, model, prompt, parameters, stream):
+        return {
+            'model': model,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'stream': stream,
+            **parameters
+        }
+
+    def _parse_response(self, data):
+        return data['choices'][0]['message']['content']
+
+    def _parse_event(self, data):
+        if 'error' in data:
+            error = data['error']
+            code = error.get('code') or error.get('type') if isinstance(error, dict) else error
+            raise NarrationError(f"生成失败，请稍后重试。错误码：{code or '未知'}", retryable=True)
+        # 最后一条事件可能只有用量统计，没有 choices
+        if not data.get('choices'):
+            return None
+        return data['choices'][0].get('delta', {}).get('content')
+
+
+# 可选的讲解生成后端
+NARRATION_BACKENDS = {
+    DashScopeClient.name: DashScopeClient,
+    OpenAICompatibleClient.name: OpenAICompatibleClient,
+}
+
+
+def create_narration_client(backend, api_key, **options):
+    """
+    按名称创建讲解生成客户端
+    :param backend: 后端名称，dashscope / openai
+    :param options: 传给客户端构造函数的参数（base_url、超时、连接池大小等）
+    """
+    if backend not in NARRATION_BACKENDS:
+        raise ValueError(f"不支持的讲解生成后端：{backend}，可选：{', '.join(NARRATION_BACKENDS)}")
+    return NARRATION_BACKENDS[backend](api_key, **options)
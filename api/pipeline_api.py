@@ -0,0 +1,98 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Blueprint, Response, jsonify, stream_with_context
+
+from config import NARRATION_CONFIG
+from .image_api import get_recognition_engine, get_uploaded_image, format_recognition_result
+from . import artifact_api
+from .sse import SSE_HEADERS, sse_event
+
+# 创建 识别+讲解 一体化API蓝图
+pipeline_api = Blueprint('pipeline_api', __name__)
+
+# 预取候选文物讲解的后台线程池；prefetch_slots 限制同时进行（含排队）的预取数，已满时直接跳过而不是排队
+prefetch_config = NARRATION_CONFIG['prefetch']
+prefetch_executor = ThreadPoolExecutor(
+    max_workers=prefetch_config['workers'],
+    thread_name_prefix='narration-prefetch'
+)
+prefetch_slots = threading.BoundedSemaphore(prefetch_config['workers'])
+
+@pipeline_api.route('/', methods=['POST'])
+def recognize_and_narrate():
+    """
+    识别 + 讲解一体化接口（Server-Sent Events）
+    输入: 图片文件（form-data格式，字段名：image）
+    输出: text/event-stream，先推送识别结果，随后在同一个连接上推送讲解文案
+
+    接口说明:
+    - 服务端识别完成后立即开始生成讲解，省去前端再发起一次讲解请求的往返
+    - 开启预取时，最匹配文物的讲解开始生成后，在有空闲调用名额的情况下为其余候选文物在后台生成讲解并写入缓存，
+      用户切换到其他候选结果时可以直接命中缓存
+
+    事件说明:
+    - recognition: 与 /api/image-recognition/ 返回的JSON结构相同
+    - delta / done / error: 与 /api/artifact-narration/stream 相同
+    """
+    try:
+        recognition_engine, error_response = get_recognition_engine()
+        if error_response:
+            return error_response
+
+        image_file, error_response = get_uploaded_image()
+        if error_response:
+            return error_response
+
+        # 在请求上下文中完成识别，流式响应中只负责推送
+        recognition_result = format_recognition_result(recognition_engine.recognize(image_file.stream))
+
+        return Response(
+            stream_with_context(pipeline_events(recognition_result)),
+            mimetype='text/event-stream',
+            headers=SSE_HEADERS
+        )
+
+    except Exception as e:
+        return jsonify({
+            'error': f'处理图像时发生错误: {str(e)}',
+            'code': 500
+        }), 500
+
+def pipeline_events(recognition_result):
+    """先推送识别结果，再推送最匹配文物的讲解"""
+    yield sse_event('recognition', recognition_result)
+
+    if not recognition_result.get('success'):
+        return
+
+    if artifact_api.narration_generator is None:
+        yield sse_event('error', {'error': 'API密钥未配置'})
+        return
+
+    best_match = recognition_result['data']
+    prefetched = False
+    for event in artifact_api.narration_events(best_match['name'], best_match['era']):
+        yield event
+        # 收到第一个事件时最匹配文物的讲解已经占到调用名额（或命中缓存），此时再预取其余候选
+        if not prefetched:
+            prefetched = True
+            prefetch_candidates(recognition_result['all_results'][1:])
+
+def prefetch_candidates(candidates):
+    """
+    在后台为其余候选文物生成讲解，结果写入讲解缓存（失败时忽略）
+    预取是可有可无的：预取数已满或讲解客户端空闲名额不足时直接跳过，不排队、不等待
+    """
+    if not prefetch_config['enabled'] or artifact_api.narration_cache is None:
+        return
+
+    client = artifact_api.narration_generator.client
+    slots = prefetch_slots
+    for candidate in candidates[:prefetch_config['top_k']]:
+        if client.idle_slots() < prefetch_config['min_idle_slots']:
+            return
+        if not slots.acquire(blocking=False):
+            return
+        future = prefetch_executor.submit(artifact_api.get_narration, candidate['name'], candidate['dynasty'])
+        future.add_done_callback(lambda _: slots.release())
@@ -0,0 +1,108 @@
+import contextvars
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from .metrics import STAGE_SECONDS, ERRORS
+from .request_log import log
+from .process_local import ProcessLocal
+
+# 支持的图片格式及其文件头（magic bytes）
+IMAGE_SIGNATURES = {
+    'jpeg': (b'\xff\xd8\xff',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'gif': (b'GIF87a', b'GIF89a'),
+}
+
+
+def sniff_image_format(header):
+    """
+    根据文件头判断图片格式，只需读取前16个字节，无需读取整个文件
+    :return: 'jpeg' / 'png' / 'gif'；不是支持的图片格式时返回 None
+    """
+    for image_format, signatures in IMAGE_SIGNATURES.items():
+        if header.startswith(signatures):
+            return image_format
+    return None
+
+
+def decode_image(image_input, target_size=None, max_pixels=0):
+    """
+    解码图片为RGB格式的 PIL.Image
+    对JPEG使用 draft() 在解码阶段直接按缩小的尺寸（1/2、1/4、1/8）解码，
+    手机拍摄的千万像素大图无需完整解码再缩放，结果尺寸不小于 target_size，不影响后续 CLIP 预处理
+    :param image_input: 图片路径（str）、字节流（bytes）或可 seek 的文件对象（例如上传文件的暂存文件）
+    :param target_size: 模型输入边长，为 None 时完整解码
+    :param max_pixels: 允许的最大像素数，0 表示不限制；只读取文件头判断，超限时不会解码
+    :return: PIL.Image；输入类型不支持时返回 None
+    """
+    if isinstance(image_input, bytes):
+        img = Image.open(io.BytesIO(image_input))
+    elif isinstance(image_input, str):
+        img = Image.open(image_input)
+    elif hasattr(image_input, 'read'):
+        image_input.seek(0)
+        img = Image.open(image_input)
+    else:
+        return None
+
+    if max_pixels and img.width * img.height > max_pixels:
+        raise ValueError(f"图片尺寸过大：{img.width}x{img.height}")
+
+    if target_size:
+        # draft 只对JPEG生效，其他格式会忽略
+        img.draft('RGB', (target_size, target_size))
+    return img.convert("RGB")
+
+
+class ImagePreprocessor:
+    """
+    图片预处理阶段：解码 + CLIP 预处理（resize + center crop + 归一化），输出可直接送入模型的张量
+    批量识别时由线程池并行完成（PIL 解码、缩放和 torch 的张量运算都会释放 GIL），
+    模型推理阶段只需拼接已经准备好的张量。
+    """
+
+    def __init__(self, preprocess, target_size=224, use_draft=True, workers=4, max_pixels=0):
+        """
+        :param preprocess: clip.load 返回的预处理变换
+        :param target_size: 模型输入边长
+        :param use_draft: 是否对JPEG使用缩小尺寸解码
+        :param workers: 预处理线程数，0 表示在调用方线程中逐张处理
+        :param max_pixels: 允许的最大图片像素数，0 表示不限制
+        """
+        self.preprocess = preprocess
+        self.target_size = target_size if use_draft else None
+        self.max_pixels = max_pixels
+        self.workers = max(0, int(workers))
+
+        # 预处理线程池：每个进程在首次批量预处理时各自创建
+        self._executor = ProcessLocal(
+            lambda: ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="preprocess"))
+
+    def process(self, image_input):
+        """
+        预处理单张图片
+        :return: 形状为 (1, 3, H, W) 的CPU张量；图片无法解码时返回 None
+        """
+        try:
+            with STAGE_SECONDS.time(stage='decode'):
+                img = decode_image(image_input, self.target_size, self.max_pixels)
+            if img is None:
+                return None
+            with STAGE_SECONDS.time(stage='preprocess'):
+                return self.preprocess(img).unsqueeze(0)
+        except Exception as e:
+            ERRORS.inc(component='preprocess')
+            log(f"图片预处理失败：{str(e)}")
+            return None
+
+    def process_many(self, image_inputs):
+        """并行预处理多张图片，按输入顺序返回张量列表（失败的位置为 None）"""
+        if self.workers <= 1 or len(image_inputs) <= 1:
+            return [self.process(image_input) for image_input in image_inputs]
+        # 线程池中的线程不会继承调用方的上下文，每张图片在调用方上下文的副本中处理，日志带上当前请求ID
+        executor = self._executor.get()
+        futures = [executor.submit(contextvars.copy_context().run, self.process, image_input)
+                   for image_input in image_inputs]
+        return [future.result() for future in futures]
@@ -0,0 +1,34 @@
+import os
+import threading
+
+
+class ProcessLocal:
+    """
+    按进程延迟创建的对象（线程池、后台线程、连接、推理会话等）
+    线程不会随 fork 复制到子进程，连接也不能在父子进程之间共用：gunicorn 预加载模式下，
+    master 中创建的这类对象被 worker 继承后无法使用。每个进程在第一次 get() 时各自调用 factory 创建一份。
+    父进程创建的对象在子进程中只保留引用、不再使用：不能让它被回收，回收时可能关闭父进程仍在使用的连接
+    （例如 SQLite 连接关闭时可能检查点并删除 WAL 文件）
+    """
+
+    def __init__(self, factory):
+        """
+        :param factory: 无参数的创建函数，每个进程调用一次
+        """
+        self._factory = factory
+        self._value = None
+        self._pid = None
+        self._inherited = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        """返回当前进程的对象，不存在时创建"""
+        if self._pid == os.getpid():
+            return self._value
+        with self._lock:
+            if self._pid != os.getpid():
+                if self._pid is not None:
+                    self._inherited.append(self._value)
+                self._value = self._factory()
+                self._pid = os.getpid()
+        return self._value
@@ -0,0 +1,23 @@
+import contextvars
+import uuid
+
+# 当前请求的ID：Flask 在 before_request 中设置，同一线程中后续的日志都会带上
+_request_id = contextvars.ContextVar('request_id', default='-')
+
+
+def new_request_id():
+    """生成新的请求ID"""
+    return uuid.uuid4().hex[:16]
+
+
+def set_request_id(request_id):
+    _request_id.set(request_id)
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def log(message):
+    """带请求ID前缀输出日志"""
+    print(f"[{get_request_id()}] {message}")
@@ -0,0 +1,350 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .metrics import CIRCUIT_STATE, RESILIENCE_EVENTS
+from .narration_client import NarrationError
+
+
+class CircuitOpenError(NarrationError):
+    """熔断器打开期间被直接拒绝的调用（没有请求上游）"""
+
+
+class Deadline:
+    """一次调用（含全部重试）的截止时间"""
+
+    def __init__(self, seconds):
+        """:param seconds: 允许的总耗时（秒），0 或 None 表示不限制"""
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    def remaining(self):
+        """剩余时间（秒），不限制时返回 None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def limit(self, seconds):
+        """把单次操作的超时时间限制在剩余时间之内"""
+        remaining = self.remaining()
+        return seconds if remaining is None else min(seconds, remaining)
+
+
+class RetryPolicy:
+    """有上限的重试：指数退避 + 完全抖动（在 0 到退避上限之间随机取值），避免故障恢复时所有请求同时重试"""
+
+    def __init__(self, max_attempts=3, base_delay=0.2, max_delay=2.0):
+        """
+        :param max_attempts: 最多尝试次数（含第一次）
+        :param base_delay: 第一次重试前的退避上限（秒），之后每次翻倍
+        :param max_delay: 退避上限的最大值（秒）
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt):
+        """第 attempt 次（从0开始）失败后的等待时间"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后打开，打开期间直接拒绝调用（快速失败）；
+    经过 recovery_timeout 后进入半开状态，只放行一个试探调用，成功则关闭，失败则重新打开
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30, name=None):
+        """
+        :param failure_threshold: 连续失败多少次后打开
+        :param recovery_timeout: 打开后等待多少秒进入半开状态
+        :param name: 名称，用于 /metrics 中的熔断器状态
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        if name:
+            CIRCUIT_STATE.set_function(lambda: self.STATE_VALUES[self.state], component=name)
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def retry_after(self):
+        """距离熔断器进入半开状态（可以再次尝试）还有多少秒，未打开时返回0"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+
+    def allow(self):
+        """是否放行本次调用；半开状态下同一时刻只放行一个试探调用"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def cancel(self):
+        """放行的调用没有结果就结束了（例如客户端断开），不计入成功或失败"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """记录最近若干次成功调用的耗时，用于计算对冲请求的触发阈值（如 p95）"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q, min_samples=20):
+        """样本数不足 min_samples 时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+class ResilientNarrationClient:
+    """
+    为讲解生成客户端加上容错能力，接口与 NarrationClient 相同（generate / stream / close）
+    - 截止时间：每次调用（含全部重试）的总耗时不超过 deadline，单次请求的读取超时也不超过剩余时间
+    - 重试：只重试可重试的故障（网络错误、超时、429/5xx），指数退避 + 抖动；流式输出已经推送文字后不再重试
+    - 熔断：上游连续故障（网络错误、超时、429/5xx）后快速失败，不再请求已经故障的上游，由调用方返回兜底讲解；
+      参数错误、鉴权失败等4xx以及本地并发已满不说明上游故障，不计入
+    - 对冲：普通（非流式）调用超过 hedge_delay（默认为近期耗时的 p95）仍未返回时，再发一个相同的请求，取先成功的结果；
+      对冲线程数有上限，线程已满时直接调用、不发对冲请求
+    """
+
+    def __init__(self, client, deadline=30, retry=None, breaker=None,
+                 hedging=False, hedge_delay=0, hedge_quantile=0.95, hedge_min_samples=20, hedge_workers=8):
+        """
+        :param client: NarrationClient 实例
+        :param deadline: 每次调用的总耗时上限（秒），0 表示不限制
+        :param retry: RetryPolicy，默认最多尝试3次
+        :param breaker: CircuitBreaker，None 表示不熔断
+        :param hedging: 是否开启对冲请求
+        :param hedge_delay: 固定的对冲等待时间（秒），0 表示按近期耗时的 hedge_quantile 分位数自动计算
+        :param hedge_quantile: 自动计算对冲等待时间时使用的分位数
+        :param hedge_min_samples: 样本数不足时不发送对冲请求
+        :param hedge_workers: 对冲线程池的线程数，即同时通过线程池进行的请求（含对冲请求）上限
+        """
+        self.client = client
+        self.deadline = deadline
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker
+        self.hedging = hedging
+        self.hedge_delay = hedge_delay
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyTracker()
+        self._executor = None
+        if hedging:
+            self._executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix='narration-hedge')
+            # 每个提交到线程池的请求占用一个名额，保证任务不会在线程池中排队
+            self._hedge_slots = threading.BoundedSemaphore(hedge_workers)
+
+    def _event(self, event):
+        RESILIENCE_EVENTS.inc(component='narration', event=event)
+
+    def _check_circuit(self):
+        if self.breaker is not None and not self.breaker.allow():
+            self._event('circuit_rejected')
+            raise CircuitOpenError("系统繁忙，请稍后重试。错误：讲解服务暂时不可用")
+
+    def _record(self, outcome):
+        """把调用结果告诉熔断器：True 成功，False 失败，None 没有结果（不计入）"""
+        if self.breaker is None:
+            return
+        if outcome is None:
+            self.breaker.cancel()
+        elif outcome:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def _record_error(self, error):
+        """只有可重试的上游故障（网络错误、超时、429/5xx）计入熔断器的失败次数，其余错误不计入"""
+        self._record(False if error.retryable else None)
+
+    def _deadline_error(self):
+        self._event('deadline_exceeded')
+        return NarrationError("系统繁忙，请稍后重试。错误：讲解生成超时", retryable=True)
+
+    def _timeout(self, deadline):
+        """本次请求的 (连接超时, 读取超时)，截止时间已过时抛出 NarrationError"""
+        if deadline.expired():
+            raise self._deadline_error()
+        connect_timeout, read_timeout = self.client.timeout
+        return deadline.limit(connect_timeout), deadline.limit(read_timeout)
+
+    def _wait_before_retry(self, error, attempt, deadline):
+        """判断是否还能重试，可以时等待退避时间后返回 True"""
+        if not error.retryable or attempt + 1 >= self.retry.max_attempts:
+            return False
+        delay = self.retry.backoff(attempt)
+        remaining = deadline.remaining()
+        if remaining is not None and delay >= remaining:
+            return False
+        self._event('retry')
+        time.sleep(delay)
+        return True
+
+    def generate(self, model, prompt, **parameters):
+        """生成完整文本，失败（含熔断拒绝、超过截止时间）时抛出 NarrationError"""
+        self._check_circuit()
+        deadline = Deadline(self.deadline)
+        try:
+            for attempt in range(self.retry.max_attempts):
+                try:
+                    result = self._attempt(model, prompt, parameters, deadline)
+                    break
+                except NarrationError as e:
+                    if not self._wait_before_retry(e, attempt, deadline):
+                        raise
+        except NarrationError as e:
+            self._record_error(e)
+            raise
+        except BaseException:
+            self._record(None)
+            raise
+        self._record(True)
+        return result
+
+    def _call(self, model, prompt, parameters, deadline):
+        started_at = time.monotonic()
+        result = self.client.generate(model, prompt, timeout=self._timeout(deadline), **parameters)
+        self.latency.observe(time.monotonic() - started_at)
+        return result
+
+    def _hedge_after(self):
+        if not self.hedging:
+            return None
+        if self.hedge_delay:
+            return self.hedge_delay
+        return self.latency.percentile(self.hedge_quantile, self.hedge_min_samples)
+
+    def _submit(self, model, prompt, parameters, deadline):
+        """把一次请求提交到对冲线程池，线程池已满时返回 None（不排队）"""
+        if not self._hedge_slots.acquire(blocking=False):
+            return None
+        future = self._executor.submit(self._call, model, prompt, parameters, deadline)
+        future.add_done_callback(lambda _: self._hedge_slots.release())
+        return future
+
+    def _attempt(self, model, prompt, parameters, deadline):
+        """一次尝试：未开启对冲或对冲线程已满时直接调用；否则超过对冲等待时间后追加一个请求，取先成功的结果"""
+        hedge_after = self._hedge_after()
+        primary = None if hedge_after is None else self._submit(model, prompt, parameters, deadline)
+        if primary is None:
+            return self._call(model, prompt, parameters, deadline)
+
+        pending = {primary}
+        done, _ = wait(pending, timeout=deadline.limit(hedge_after))
+        if not done and not deadline.expired():
+            hedge = self._submit(model, prompt, parameters, deadline)
+            if hedge is not None:
+                self._event('hedge')
+                pending.add(hedge)
+
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                # 已超过截止时间，未完成的请求在后台结束（读取超时不超过截止时间）
+                raise self._deadline_error()
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self._event('hedge_won')
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stream(self, model, prompt, **parameters):
+        """
+        流式生成文本，逐段返回新增的文本
+        还没有推送任何文字时失败可以重试；已经推送过文字后失败直接抛出 NarrationError
+        """
+        self._check_circuit()
+        deadline = Deadline(self.deadline)
+        started = False
+        try:
+            for attempt in range(self.retry.max_attempts):
+                chunks = self.client.stream(model, prompt, timeout=self._timeout(deadline), **parameters)
+                try:
+                    for text in chunks:
+                        if deadline.expired():
+                            raise self._deadline_error()
+                        started = True
+                        yield text
+                    break
+                except NarrationError as e:
+                    if started or not self._wait_before_retry(e, attempt, deadline):
+                        raise
+                finally:
+                    chunks.close()
+        except NarrationError as e:
+            self._record_error(e)
+            raise
+        except BaseException:
+            # 客户端中途断开（GeneratorExit）
+            self._record(None)
+            raise
+        self._record(True)
+
+    @property
+    def timeout(self):
+        return self.client.timeout
+
+    def idle_slots(self):
+        """当前空闲的调用名额数；熔断器未关闭时返回0（上游故障期间不发起可有可无的调用）"""
+        if self.breaker is not None and self.breaker.state != CircuitBreaker.CLOSED:
+            return 0
+        return self.client.idle_slots()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.client.close()
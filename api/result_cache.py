@@ -0,0 +1,309 @@
+import copy
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+from .metrics import CACHE_REQUESTS
+
+
+class ResultCache:
+    """
+    线程安全的 LRU + TTL 缓存
+    超过容量时淘汰最久未使用的条目，超过有效期的条目在读取时视为未命中
+    """
+
+    def __init__(self, max_size=1024, ttl_seconds=3600):
+        """
+        :param max_size: 最多缓存的条目数
+        :param ttl_seconds: 条目有效期（秒），0 表示永不过期
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._eviction_listeners = []
+
+    def add_eviction_listener(self, listener):
+        """注册条目被淘汰或过期删除时的回调，参数为被删除的键（在锁外调用）"""
+        self._eviction_listeners.append(listener)
+
+    def _notify_evicted(self, keys):
+        for key in keys:
+            for listener in self._eviction_listeners:
+                listener(key)
+
+    def get(self, key):
+        """读取缓存，未命中或已过期时返回 None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if not expires_at or expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                return value
+            del self._data[key]
+        self._notify_evicted([key])
+        return None
+
+    def set(self, key, value):
+        """写入缓存"""
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else 0
+        evicted = []
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                evicted.append(self._data.popitem(last=False)[0])
+        self._notify_evicted(evicted)
+
+    def keys(self):
+        """返回当前全部缓存键的快照"""
+        with self._lock:
+            return list(self._data.keys())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+def is_hashable_input(image_input):
+    """字节流和可 seek 的文件对象（例如上传文件的暂存文件）可以按内容哈希缓存"""
+    return isinstance(image_input, bytes) or (hasattr(image_input, 'read') and hasattr(image_input, 'seek'))
+
+
+def content_hash(image_input, chunk_size=1024 * 1024):
+    """图片原始字节的 SHA-256；文件对象按块读取，不会整体读入内存"""
+    if isinstance(image_input, bytes):
+        return hashlib.sha256(image_input).hexdigest()
+
+    digest = hashlib.sha256()
+    image_input.seek(0)
+    for chunk in iter(lambda: image_input.read(chunk_size), b''):
+        digest.update(chunk)
+    image_input.seek(0)
+    return digest.hexdigest()
+
+
+def perceptual_hash(image_input, hash_size=8):
+    """
+    差值哈希（dHash）：缩放为 (hash_size+1) x hash_size 的灰度图，比较相邻像素的明暗
+    同一张图片经过重新压缩、缩放后通常得到相同的哈希值
+    :param image_input: 字节流（bytes）或可 seek 的文件对象
+    :return: 十六进制字符串；图片无法解码时返回 None
+    """
+    try:
+        if isinstance(image_input, bytes):
+            img = Image.open(io.BytesIO(image_input))
+        else:
+            image_input.seek(0)
+            img = Image.open(image_input)
+        # JPEG 直接按缩小的尺寸解码，避免解码整张大图
+        img.draft('L', (hash_size * 8, hash_size * 8))
+        pixels = list(img.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR).getdata())
+    except Exception:
+        return None
+
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+class PerceptualIndex:
+    """
+    感知哈希的近邻索引（多段索引）
+    把64位哈希切成 max_distance + 1 段：汉明距离不超过 max_distance 的两个哈希至少有一段完全相同（抽屉原理），
+    查找时只需比较至少有一段相同的候选，不必扫描全部缓存
+    """
+
+    def __init__(self, max_distance, bits=64):
+        """
+        :param max_distance: 允许相差的最大位数
+        :param bits: 哈希的位数
+        """
+        self.max_distance = max_distance
+        bands = min(bits, max_distance + 1)
+        bounds = [bits * i // bands for i in range(bands + 1)]
+        # 每一段为 (右移位数, 掩码)
+        self._bands = [(bits - end, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _band_keys(self, group, value):
+        return [(group, band, (value >> shift) & mask) for band, (shift, mask) in enumerate(self._bands)]
+
+    def add(self, group, value):
+        """
+        :param group: 只在相同分组内查找（例如相同的 top_k 和置信度阈值）
+        :param value: 感知哈希（整数）
+        """
+        with self._lock:
+            for key in self._band_keys(group, value):
+                self._buckets.setdefault(key, set()).add(value)
+
+    def remove(self, group, value):
+        with self._lock:
+            for key in self._band_keys(group, value):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(value)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def nearest(self, group, value):
+        """返回分组内汉明距离不超过 max_distance 的已索引哈希，按距离从小到大排列"""
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(group, value):
+                candidates |= self._buckets.get(key, set())
+        matches = [(bin(value ^ candidate).count('1'), candidate) for candidate in candidates]
+        return [candidate for distance, candidate in sorted(matches) if distance <= self.max_distance]
+
+
+class CachedRecognizer:
+    """
+    带结果缓存的识别引擎
+    以上传图片内容的哈希为键缓存识别成功的结果，重复上传同一张图片时跳过解码和模型推理；
+    开启感知哈希后，同一张图片被重新压缩或缩放后再上传也能命中缓存。
+    感知哈希相近的不一定是同一件文物（例如同一展台、相同角度拍摄的不同文物），默认关闭，开启时默认要求完全一致。
+    对外提供与 ArtifactRecognizer 相同的 recognize / recognize_batch 调用方式。
+    """
+
+    def __init__(self, engine, cache, use_perceptual_hash=False, perceptual_max_distance=0):
+        """
+        :param engine: 被包装的识别引擎
+        :param cache: ResultCache 实例
+        :param use_perceptual_hash: 是否额外按感知哈希查找缓存
+        :param perceptual_max_distance: 感知哈希允许相差的最大位数（64位中），0 表示必须完全一致
+        """
+        self.engine = engine
+        self.cache = cache
+        self.use_perceptual_hash = use_perceptual_hash
+        self.perceptual_max_distance = perceptual_max_distance
+        self.perceptual_index = None
+        if use_perceptual_hash and perceptual_max_distance > 0:
+            self.perceptual_index = PerceptualIndex(perceptual_max_distance)
+            cache.add_eviction_listener(self._on_evicted)
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+
+    def _cache_keys(self, image_input, top_k, conf_threshold):
+        """依次返回需要查找的缓存键：内容哈希，以及可选的感知哈希"""
+        yield ('sha256', content_hash(image_input), top_k, conf_threshold)
+        if self.use_perceptual_hash:
+            phash = perceptual_hash(image_input)
+            if phash is not None:
+                yield ('dhash', phash, top_k, conf_threshold)
+
+    def _lookup(self, image_input, top_k, conf_threshold):
+        """查找缓存，返回 (缓存结果或None, 本次计算出的全部缓存键)"""
+        keys = []
+        for key in self._cache_keys(image_input, top_k, conf_threshold):
+            keys.append(key)
+            result = self.cache.get(key)
+            if result is None and key[0] == 'dhash':
+                result = self._find_similar(key)
+            if result is not None:
+                if len(keys) > 1:
+                    # 通过感知哈希命中时，补记内容哈希和感知哈希，下次同样的图片可以直接命中
+                    for new_key in keys:
+                        self._set(new_key, result)
+                with self._stats_lock:
+                    self.hits += 1
+                    if key[0] == 'dhash':
+                        self.perceptual_hits += 1
+                CACHE_REQUESTS.inc(cache='recognition', result='perceptual_hit' if key[0] == 'dhash' else 'hit')
+                return copy.deepcopy(result), keys
+        with self._stats_lock:
+            self.misses += 1
+        CACHE_REQUESTS.inc(cache='recognition', result='miss')
+        return None, keys
+
+    def _find_similar(self, key):
+        """通过感知哈希索引查找汉明距离不超过阈值的已缓存图片（完全一致的情况已由缓存键直接命中）"""
+        if self.perceptual_index is None:
+            return None
+        _, phash, top_k, conf_threshold = key
+        for candidate in self.perceptual_index.nearest((top_k, conf_threshold), int(phash, 16)):
+            result = self.cache.get(('dhash', f"{candidate:016x}", top_k, conf_threshold))
+            if result is not None:
+                return result
+        return None
+
+    def _set(self, key, result):
+        """写入缓存，感知哈希键同时加入近邻索引"""
+        self.cache.set(key, result)
+        if key[0] == 'dhash' and self.perceptual_index is not None:
+            self.perceptual_index.add(key[2:], int(key[1], 16))
+
+    def _on_evicted(self, key):
+        """缓存条目被淘汰或过期时，同步从近邻索引中删除"""
+        if key[0] == 'dhash':
+            self.perceptual_index.remove(key[2:], int(key[1], 16))
+
+    def _store(self, keys, result):
+        """只缓存识别成功的结果，避免把推理服务暂时不可用等错误缓存下来"""
+        if result.get('success'):
+            for key in keys:
+                self._set(key, copy.deepcopy(result))
+
+    def recognize(self, image_input, top_k=3, conf_threshold=0.2):
+        """识别单张图片，命中缓存时直接返回缓存结果（仅对字节流和文件对象输入缓存）"""
+        if not is_hashable_input(image_input):
+            return self.engine.recognize(image_input, top_k=top_k, conf_threshold=conf_threshold)
+
+        result, keys = self._lookup(image_input, top_k, conf_threshold)
+        if result is not None:
+            return result
+
+        result = self.engine.recognize(image_input, top_k=top_k, conf_threshold=conf_threshold)
+        self._store(keys, result)
+        return result
+
+    def recognize_batch(self, image_inputs, top_k=3, conf_threshold=0.2):
+        """批量识别，命中缓存的图片直接返回，其余图片合并为一个批次推理"""
+        results = [None] * len(image_inputs)
+        pending = []
+        for i, image_input in enumerate(image_inputs):
+            if is_hashable_input(image_input):
+                results[i], keys = self._lookup(image_input, top_k, conf_threshold)
+            else:
+                keys = []
+            if results[i] is None:
+                pending.append((i, keys))
+
+        # 只把未命中缓存的图片交给模型批量推理
+        if pending:
+            fresh = self.engine.recognize_batch([image_inputs[i] for i, _ in pending],
+                                                top_k=top_k, conf_threshold=conf_threshold)
+            for (i, keys), result in zip(pending, fresh):
+                results[i] = result
+                self._store(keys, result)
+        return results
+
+    def warm_up(self):
+        """预热被包装的识别引擎（预热结果不写入缓存）"""
+        self.engine.warm_up()
+
+    def cache_stats(self):
+        """返回缓存命中统计"""
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self.cache),
+                'max_size': self.cache.max_size,
+                'hits': self.hits,
+                'perceptual_hits': self.perceptual_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
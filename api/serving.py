@@ -0,0 +1,87 @@
+import gc
+import os
+
+import torch
+
+from config import SERVING_CONFIG
+
+
+def prepare_master():
+    """
+    gunicorn 预加载模式下，在 master 进程加载模型之前调用
+    master 只用单线程做一次性的加载和标签编码，避免 fork 前初始化的线程池被子进程继承后卡死
+    """
+    torch.set_num_threads(1)
+
+
+def freeze_model(model):
+    """
+    把模型切换为只读推理状态：eval 模式、关闭梯度
+    关闭梯度后推理不会写入参数页面，fork 出来的 worker 可以一直共享 master 的权重内存
+    """
+    model.eval()
+    for param in model.parameters():
+        param.requires_grad_(False)
+    return model
+
+
+def freeze_shared_memory():
+    """
+    在 fork worker 之前调用：把 master 中已有的 Python 对象移出垃圾回收跟踪
+    避免子进程的 GC 扫描触碰这些对象而引发写时复制，导致共享内存被逐步复制
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def inference_context():
+    """
+    推理时使用的上下文：默认使用 torch.inference_mode()，比 no_grad 少做版本计数和视图跟踪
+    SERVING_CONFIG['inference_mode'] 关闭时退回 torch.no_grad()
+    """
+    return torch.inference_mode() if SERVING_CONFIG['inference_mode'] else torch.no_grad()
+
+
+def configure_worker(cpu_slot=None):
+    """
+    在每个 worker fork 之后调用：按配置设置本进程的推理线程数，以及可选的CPU绑定
+    :param cpu_slot: 本 worker 的CPU分组编号（由 assign_cpu_slot 分配），为 None 时不绑定
+    """
+    torch.set_num_threads(SERVING_CONFIG['torch_threads'])
+
+    # inter-op 线程数只能在进程内首次并行计算之前设置一次；master 不设置，由各 worker 自己设置
+    try:
+        torch.set_num_interop_threads(SERVING_CONFIG['interop_threads'])
+    except RuntimeError as e:
+        print(f"设置 inter-op 线程数失败：{str(e)}")
+
+    if cpu_slot is not None and SERVING_CONFIG['cpu_affinity']:
+        cpus = worker_cpu_set(cpu_slot, SERVING_CONFIG['torch_threads'])
+        if cpus:
+            os.sched_setaffinity(0, cpus)
+        return cpus
+    return None
+
+
+def assign_cpu_slot(used_slots, workers):
+    """
+    在 master 中为新 worker 分配CPU分组编号：取当前存活 worker 未占用的最小编号
+    worker 重启后会接替退出 worker 的编号，各 worker 绑定的核心始终互不重叠
+    """
+    for slot in range(workers):
+        if slot not in used_slots:
+            return slot
+    return len(used_slots) % max(1, workers)
+
+
+def worker_cpu_set(cpu_slot, threads):
+    """
+    返回编号为 cpu_slot 的 worker 应绑定的CPU核心：把当前进程可用的核心按 threads 个一组依次分配
+    核心数不足时循环复用；系统不支持设置CPU亲和性时返回 None
+    """
+    if not hasattr(os, 'sched_getaffinity'):
+        return None
+    available = sorted(os.sched_getaffinity(0))
+    threads = max(1, min(threads, len(available)))
+    start = cpu_slot * threads
+    return {available[(start + i) % len(available)] for i in range(threads)}
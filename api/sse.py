@@ -0,0 +1,13 @@
+import json
+
+
+def sse_event(event, data):
+    """把数据编码为一条 Server-Sent Events 消息（data 为 JSON）"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# 流式响应的通用响应头：禁止缓存，并关闭 nginx 等反向代理的响应缓冲
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
@@ -0,0 +1,190 @@
+import math
+
+import numpy as np
+
+
+def _softmax_topk(logits, k, rest_logits=None, rest_weights=None):
+    """
+    对一行 logits 做 softmax，并返回按概率降序排列的前 k 个 (概率, 位置)
+    :param rest_logits: 未参与排序、只计入归一化分母的 logits（近似检索中未扫描标签的代表样本）
+    :param rest_weights: rest_logits 中每一项代表的标签数
+    """
+    k = min(k, logits.shape[0])
+    shift = logits.max()
+    if rest_logits is not None and len(rest_logits):
+        shift = max(shift, rest_logits.max())
+    shifted = np.exp(logits - shift)
+    total = shifted.sum()
+    if rest_logits is not None and len(rest_logits):
+        total += np.dot(rest_weights, np.exp(rest_logits - shift))
+    probs = shifted / total
+    top = np.argpartition(-probs, k - 1)[:k]
+    top = top[np.argsort(-probs[top])]
+    return probs[top], top
+
+
+class FlatIndex:
+    """
+    精确检索：与全部标签向量计算内积
+    结果与 recognize 中的稠密矩阵乘法 + softmax 完全一致，作为近似检索的对照基准
+    """
+
+    def __init__(self, embeddings):
+        """
+        :param embeddings: 归一化后的标签向量，形状 (标签数, 维度)
+        """
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    def search(self, queries, k, temperature=100.0):
+        """
+        :param queries: 归一化后的图片向量，形状 (图片数, 维度)
+        :param k: 每张图片返回的结果数
+        :param temperature: softmax 前乘在余弦相似度上的系数
+        :return: (概率, 标签下标)，形状均为 (图片数, k)
+        """
+        logits = temperature * (np.asarray(queries, dtype=np.float32) @ self.embeddings.T)
+        k = min(k, self.embeddings.shape[0])
+        values = np.empty((len(queries), k), dtype=np.float32)
+        indices = np.empty((len(queries), k), dtype=np.int64)
+        for i, row in enumerate(logits):
+            values[i], indices[i] = _softmax_topk(row, k)
+        return values, indices
+
+
+class IVFIndex:
+    """
+    倒排文件（IVF）近似检索，仅依赖 numpy
+    用球面 k-means 把标签向量划分为 nlist 个簇；查询时只扫描与图片向量最相近的 nprobe 个簇。
+    nprobe 越大召回率越高、延迟越高；nprobe == nlist 时退化为精确检索。
+
+    置信度与稠密检索一样是对全部标签做 softmax 的概率，阈值（conf_threshold）在两种检索方式下含义相同：
+    CLIP 的标签向量彼此接近，数量很多时未扫描标签的总和在分母中占比不小，只在扫描到的候选上归一化会明显高估置信度。
+    因此每个簇预先等间隔取 norm_samples 个代表向量，查询时用未扫描簇的代表向量（按簇大小加权）估计这部分分母，
+    额外计算量只与 nlist * norm_samples 有关，不随标签数增长。
+    """
+
+    def __init__(self, embeddings, nlist=0, nprobe=16, n_iter=10, train_size=0, seed=0, norm_samples=32):
+        """
+        :param embeddings: 归一化后的标签向量，形状 (标签数, 维度)
+        :param nlist: 簇的数量，0 表示自动取 sqrt(标签数)
+        :param nprobe: 每次查询扫描的簇数量
+        :param n_iter: k-means 迭代次数
+        :param train_size: 训练 k-means 使用的样本数，0 表示自动取 nlist * 64
+        :param seed: 随机种子，保证同一份标签每次构建出相同的索引
+        :param norm_samples: 每个簇用于估计 softmax 分母的代表向量数，0 表示只在扫描到的候选上归一化
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        count = embeddings.shape[0]
+        self.nlist = max(1, min(count, nlist or int(math.sqrt(count))))
+        self.nprobe = max(1, min(self.nlist, nprobe))
+
+        rng = np.random.default_rng(seed)
+        train_size = min(count, train_size or self.nlist * 64)
+        sample = embeddings[rng.choice(count, size=train_size, replace=False)]
+        self.centroids = self._train(sample, n_iter, rng)
+
+        # 按簇重新排列标签向量，每个簇在内存中连续存放
+        assignments = self._assign(embeddings)
+        order = np.argsort(assignments, kind="stable")
+        self.ids = order.astype(np.int64)
+        self.embeddings = embeddings[order]
+        counts = np.bincount(assignments, minlength=self.nlist)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._build_norm_samples(norm_samples)
+
+    def _build_norm_samples(self, norm_samples):
+        """每个簇内等间隔取代表向量，权重为该代表向量对应的标签数（簇不大于 norm_samples 时取全部标签，权重为1）"""
+        positions, weights, clusters = [], [], []
+        for c in range(self.nlist if norm_samples > 0 else 0):
+            start, end = self.offsets[c], self.offsets[c + 1]
+            size = end - start
+            if not size:
+                continue
+            picks = np.linspace(start, end, num=min(norm_samples, size), endpoint=False).astype(np.int64)
+            positions.append(picks)
+            weights.append(np.full(len(picks), size / len(picks), dtype=np.float32))
+            clusters.append(np.full(len(picks), c, dtype=np.int64))
+        if positions:
+            self.norm_vectors = self.embeddings[np.concatenate(positions)]
+            self.norm_weights = np.concatenate(weights)
+            self.norm_clusters = np.concatenate(clusters)
+        else:
+            self.norm_vectors = np.zeros((0, self.embeddings.shape[1]), dtype=np.float32)
+            self.norm_weights = np.zeros(0, dtype=np.float32)
+            self.norm_clusters = np.zeros(0, dtype=np.int64)
+
+    def _train(self, sample, n_iter, rng):
+        """球面 k-means：以内积为相似度，每轮迭代后把簇中心重新归一化"""
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)].copy()
+        for _ in range(n_iter):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(self.nlist):
+                members = sample[assignments == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+                else:
+                    # 空簇用随机样本重新初始化
+                    centroids[c] = sample[rng.integers(len(sample))]
+            centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+        return centroids
+
+    def _assign(self, embeddings, chunk_size=8192):
+        """分块计算每个向量所属的簇，避免一次性生成超大的相似度矩阵"""
+        assignments = np.empty(len(embeddings), dtype=np.int64)
+        for start in range(0, len(embeddings), chunk_size):
+            chunk = embeddings[start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assignments
+
+    def search(self, queries, k, temperature=100.0, nprobe=None):
+        """
+        :param queries: 归一化后的图片向量，形状 (图片数, 维度)
+        :param k: 每张图片返回的结果数
+        :param temperature: softmax 前乘在余弦相似度上的系数
+        :param nprobe: 本次查询扫描的簇数量，默认使用构建时的设置
+        :return: (概率, 标签下标)，形状均为 (图片数, k)；扫描到的候选不足 k 个时，剩余位置的下标为 -1、概率为 nan
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        nprobe = max(1, min(self.nlist, nprobe or self.nprobe))
+        k = min(k, len(self.ids))
+        values = np.full((len(queries), k), np.nan, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+
+        centroid_scores = queries @ self.centroids.T
+        probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+        norm_logits = temperature * (queries @ self.norm_vectors.T)
+        for i, query in enumerate(queries):
+            # 每个簇在内存中连续存放，直接对切片做矩阵乘法，无需复制向量
+            spans = [(self.offsets[c], self.offsets[c + 1]) for c in probes[i] if self.offsets[c + 1] > self.offsets[c]]
+            if not spans:
+                continue
+            logits = temperature * np.concatenate([self.embeddings[start:end] @ query for start, end in spans])
+            positions = np.concatenate([np.arange(start, end) for start, end in spans])
+            # 未扫描簇的代表向量只计入 softmax 分母
+            rest = ~np.isin(self.norm_clusters, probes[i])
+            probs, top = _softmax_topk(logits, k, norm_logits[i][rest], self.norm_weights[rest])
+            # 扫描到的候选不足 k 个时，剩余位置保持为空（-1 / nan）
+            values[i, :len(top)] = probs
+            indices[i, :len(top)] = self.ids[positions[top]]
+        return values, indices
+
+
+def create_vector_index(embeddings, index_config):
+    """
+    根据配置创建标签向量索引
+    :param embeddings: 归一化后的标签向量（numpy数组）
+    :param index_config: RECOGNIZER_CONFIG['vector_index']
+    :return: 索引对象；返回 None 表示直接使用 torch 稠密矩阵乘法
+    """
+    backend = index_config['backend']
+    if backend == 'auto':
+        backend = 'ivf' if len(embeddings) > index_config['ann_threshold'] else 'torch'
+
+    if backend == 'torch':
+        return None
+    if backend == 'flat':
+        return FlatIndex(embeddings)
+    if backend == 'ivf':
+        return IVFIndex(embeddings, nlist=index_config['nlist'], nprobe=index_config['nprobe'],
+                        norm_samples=index_config['norm_samples'])
+    raise ValueError(f"未知的向量索引类型：{backend}")
@@ -1,25 +1,82 @@
-from flask import Flask, request, jsonify, render_template
-from config import FRONTEND_CONFIG, API_CONFIG, SERVER_CONFIG
+from flask import Flask, Response, g, request, jsonify, render_template
+from werkzeug.exceptions import RequestEntityTooLarge
+from config import FRONTEND_CONFIG, API_CONFIG, SERVER_CONFIG, UPLOAD_CONFIG
 import os
+import time
+from api.metrics import REGISTRY, HTTP_REQUESTS, HTTP_REQUEST_SECONDS
+from api.request_log import new_request_id, set_request_id, get_request_id, log
 
 # 创建Flask应用
 app = Flask(__name__, 
         static_folder=FRONTEND_CONFIG['static_folder'],
         template_folder=FRONTEND_CONFIG['template_folder'])
 
+# 请求体大小上限：超过时在解析表单之前直接返回413；非文件表单字段读入内存，单独限制
+app.config['MAX_CONTENT_LENGTH'] = UPLOAD_CONFIG['max_content_length']
+app.config['MAX_FORM_MEMORY_SIZE'] = UPLOAD_CONFIG['max_form_memory_size']
+
 # 导入API路由
-from api.image_api import image_api
+from api.image_api import image_api, engine_loader, upload_too_large_response
 from api.artifact_api import artifact_api
+from api.pipeline_api import pipeline_api
 
 # 注册API蓝图
 app.register_blueprint(image_api, url_prefix=API_CONFIG['image_recognition']['endpoint'])
 app.register_blueprint(artifact_api, url_prefix=API_CONFIG['artifact_narration']['endpoint'])
+app.register_blueprint(pipeline_api, url_prefix=API_CONFIG['recognize_and_narrate']['endpoint'])
+
+# 探针和指标采集请求不输出访问日志
+QUIET_PATHS = {'/healthz', '/readyz', '/metrics'}
+
+@app.before_request
+def start_request():
+    """记录请求开始时间，沿用上游传入的 X-Request-ID 或生成新的请求ID"""
+    g.request_started_at = time.perf_counter()
+    set_request_id(request.headers.get('X-Request-ID') or new_request_id())
+
+@app.after_request
+def finish_request(response):
+    """统计请求数和耗时，返回请求ID并输出访问日志"""
+    elapsed = time.perf_counter() - g.get('request_started_at', time.perf_counter())
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    HTTP_REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+    response.headers['X-Request-ID'] = get_request_id()
+    if request.path not in QUIET_PATHS:
+        log(f"{request.method} {request.path} {response.status_code} {elapsed * 1000:.1f}ms")
+    return response
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_entity_too_large(e):
+    """请求体超过 MAX_CONTENT_LENGTH 时返回JSON格式的错误"""
+    return upload_too_large_response(UPLOAD_CONFIG['max_content_length'])
 
 @app.route('/')
 def index():
     """项目首页 - 提供JSON API测试页面"""
     return render_template('index.html')
 
+@app.route('/healthz')
+def healthz():
+    """存活检查：进程能处理请求即返回200；模型加载失败（需要重启进程）时返回503"""
+    status = engine_loader.status()
+    if status['state'] == 'failed':
+        return jsonify({'status': 'failed', 'error': status['error']}), 503
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """就绪检查：识别模型加载并预热完成后返回200，之前返回503，负载均衡据此决定是否转发流量"""
+    status = engine_loader.status()
+    if engine_loader.ready:
+        return jsonify(status)
+    return jsonify(status), 503, {'Retry-After': '5'}
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus 指标（文本格式），统计范围为当前 worker 进程"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api')
 def api_info():
     """API信息页面，返回JSON格式的接口文档"""
@@ -27,7 +84,8 @@ def api_info():
         'message': '古代文物对话器后端服务',
         'apis': {
             'image_recognition': API_CONFIG['image_recognition'],
-            'artifact_narration': API_CONFIG['artifact_narration']
+            'artifact_narration': API_CONFIG['artifact_narration'],
+            'recognize_and_narrate': API_CONFIG['recognize_and_narrate']
         }
     })
 
@@ -0,0 +1,189 @@
+"""
+端到端 HTTP 基准测试：用 gunicorn（gunicorn.conf.py）启动完整服务，讲解接口指向本地讲解模拟服务，
+在不同并发数下测量各接口的吞吐量和延迟，以及服务进程的内存占用
+"""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .common import ROOT_DIR, child_pids, process_memory, summarize_latencies
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url, process, timeout):
+    """轮询 /readyz 直到返回200；服务进程提前退出或超时时抛出异常"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务进程已退出，退出码 {process.returncode}")
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"等待服务就绪超时：{url}")
+
+
+class ServerUnderTest:
+    """启动讲解模拟服务和 gunicorn 服务，退出时全部关闭"""
+
+    def __init__(self, narration_args=(), env=None, ready_timeout=300):
+        self.narration_args = list(narration_args)
+        self.env = dict(env or {})
+        self.ready_timeout = ready_timeout
+        self.processes = []
+        self.base_url = None
+        self.startup_seconds = None
+
+    def __enter__(self):
+        narration_port, web_port = free_port(), free_port()
+        self.processes.append(subprocess.Popen(
+            [sys.executable, '-m', 'api.fake_narration_server', '--port', str(narration_port), *self.narration_args],
+            cwd=ROOT_DIR, stdout=subprocess.DEVNULL
+        ))
+
+        env = dict(os.environ)
+        env.update({
+            'NARRATION_API_KEY': 'sk-benchmark',
+            'NARRATION_BASE_URL': f'http://127.0.0.1:{narration_port}',
+            # 关闭缓存，每个请求都完整执行识别和讲解
+            'RESULT_CACHE_ENABLED': '0',
+            'NARRATION_CACHE_ENABLED': '0',
+        })
+        env.update(self.env)
+
+        started_at = time.monotonic()
+        self.server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{web_port}', 'app:app'],
+            cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.processes.append(self.server)
+        self.base_url = f'http://127.0.0.1:{web_port}'
+        try:
+            wait_until_ready(self.base_url + '/readyz', self.server, self.ready_timeout)
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        self.startup_seconds = round(time.monotonic() - started_at, 3)
+        return self
+
+    def memory(self):
+        """服务全部进程（master + worker）的内存合计"""
+        total = {}
+        for pid in [self.server.pid] + child_pids(self.server.pid):
+            for key, value in process_memory(pid).items():
+                total[key] = round(total.get(key, 0) + value, 1)
+        return total
+
+    def __exit__(self, exc_type, exc, tb):
+        for process in reversed(self.processes):
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+        for process in self.processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def _recognition_request(session, base_url, image):
+    filename, image_bytes = image
+    response = session.post(base_url + '/api/image-recognition/',
+                            files={'image': (filename, image_bytes)}, timeout=120)
+    return response.status_code == 200
+
+
+def _narration_request(session, base_url, image):
+    response = session.post(base_url + '/api/artifact-narration/',
+                            json={'name': '兵马俑', 'dynasty': '秦'}, timeout=120)
+    return response.status_code == 200
+
+
+def _narration_stream_request(session, base_url, image):
+    response = session.post(base_url + '/api/artifact-narration/stream',
+                            json={'name': '兵马俑', 'dynasty': '秦'}, stream=True, timeout=120)
+    with response:
+        body = b''.join(response.iter_content(chunk_size=None))
+    return response.status_code == 200 and b'event: done' in body
+
+
+def _pipeline_request(session, base_url, image):
+    filename, image_bytes = image
+    response = session.post(base_url + '/api/recognize-and-narrate/',
+                            files={'image': (filename, image_bytes)}, stream=True, timeout=120)
+    with response:
+        body = b''.join(response.iter_content(chunk_size=None))
+    # 只有识别成功并完整推送了讲解文案才算成功
+    return response.status_code == 200 and b'event: done' in body
+
+
+SCENARIOS = {
+    'recognition': _recognition_request,
+    'narration': _narration_request,
+    'narration_stream': _narration_stream_request,
+    'recognize_and_narrate': _pipeline_request,
+}
+
+
+def run_load(base_url, scenario, images, concurrency, requests_per_worker):
+    """以 concurrency 个并发客户端各发送 requests_per_worker 个请求，返回吞吐量和延迟统计"""
+    send = SCENARIOS[scenario]
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def client(worker_index):
+        with requests.Session() as session:
+            for i in range(requests_per_worker):
+                image = images[(worker_index + i) % len(images)]
+                started_at = time.perf_counter()
+                try:
+                    ok = send(session, base_url, image)
+                except requests.RequestException:
+                    ok = False
+                elapsed = time.perf_counter() - started_at
+                with lock:
+                    (latencies if ok else errors).append(elapsed)
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    wall = time.perf_counter() - started_at
+
+    summary = summarize_latencies(latencies)
+    summary['errors'] = len(errors)
+    summary['requests_per_second'] = round(len(latencies) / wall, 2)
+    return summary
+
+
+# 讲解模拟服务的默认参数：首字延迟200毫秒，约0.8秒生成完一段讲解，不模拟错误
+DEFAULT_NARRATION_ARGS = ('--first-token-ms', '200', '--tokens-per-second', '300', '--seed', '0')
+
+
+def bench_http(images, concurrency_levels=(1, 4, 16), requests_per_worker=10,
+               scenarios=tuple(SCENARIOS), narration_args=DEFAULT_NARRATION_ARGS, env=None):
+    """启动服务并依次运行各场景，返回启动耗时、内存占用和各场景结果"""
+    with ServerUnderTest(narration_args=narration_args, env=env) as server:
+        # 每个场景先发送少量请求预热连接和 worker
+        results = {'startup_seconds': server.startup_seconds, 'memory_idle': server.memory(), 'scenarios': {}}
+        for scenario in scenarios:
+            run_load(server.base_url, scenario, images, concurrency=2, requests_per_worker=1)
+            results['scenarios'][scenario] = {
+                str(concurrency): run_load(server.base_url, scenario, images, concurrency, requests_per_worker)
+                for concurrency in concurrency_levels
+            }
+        results['memory_loaded'] = server.memory()
+    return results
@@ -0,0 +1,87 @@
+"""
+识别基准测试：单张图片延迟、不同批次大小的吞吐量、启动耗时和内存占用
+直接调用 ArtifactRecognizer（不经过结果缓存），测量的是模型链路本身
+"""
+
+import json
+import subprocess
+import sys
+import time
+
+from .common import ROOT_DIR, process_memory, summarize_latencies
+
+
+def bench_single(recognizer, images, repeats=5):
+    """单张图片识别延迟：每张测试图片先预热一次，再重复 repeats 次"""
+    for _, image_bytes in images:
+        recognizer.recognize(image_bytes)
+
+    latencies = []
+    for _ in range(repeats):
+        for _, image_bytes in images:
+            started_at = time.perf_counter()
+            recognizer.recognize(image_bytes)
+            latencies.append(time.perf_counter() - started_at)
+    return summarize_latencies(latencies)
+
+
+def bench_batch(recognizer, images, batch_sizes=(1, 4, 8, 16, 32), repeats=3):
+    """批量识别吞吐量：按批次大小循环取测试图片组成批次，返回每个批次大小的图片/秒和批次延迟"""
+    results = {}
+    for batch_size in batch_sizes:
+        batch = [images[i % len(images)][1] for i in range(batch_size)]
+        recognizer.recognize_batch(batch, batch_size=batch_size)
+
+        latencies = []
+        for _ in range(repeats):
+            started_at = time.perf_counter()
+            recognizer.recognize_batch(batch, batch_size=batch_size)
+            latencies.append(time.perf_counter() - started_at)
+
+        summary = summarize_latencies(latencies)
+        summary['images_per_second'] = round(batch_size * len(latencies) / sum(latencies), 2)
+        results[str(batch_size)] = summary
+    return results
+
+
+def startup_probe():
+    """在全新进程中测量：导入耗时、模型加载和预热耗时，以及加载后的内存占用"""
+    started_at = time.perf_counter()
+    sys.path.insert(0, ROOT_DIR)
+    from api.engine import create_local_engine
+    imported_at = time.perf_counter()
+
+    engine = create_local_engine()
+    loaded_at = time.perf_counter()
+    engine.warm_up()
+    warmed_at = time.perf_counter()
+
+    return {
+        'import_seconds': round(imported_at - started_at, 3),
+        'load_seconds': round(loaded_at - imported_at, 3),
+        'warm_up_seconds': round(warmed_at - loaded_at, 3),
+        'total_seconds': round(warmed_at - started_at, 3),
+        'memory': process_memory(),
+    }
+
+
+def bench_startup(runs=2):
+    """
+    启动耗时和内存：每次都启动一个新进程
+    load_seconds 包含以内存映射方式读取编译好的文物目录（data/catalog.bin）；目录文件不存在或已过期时，
+    第一次运行会先编译目录（编码全部标签），之后的运行反映常规重启耗时
+    """
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_recognition', '--startup-probe'],
+            cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+if __name__ == '__main__':
+    if '--startup-probe' in sys.argv:
+        # 结果JSON必须是输出的最后一行（之前是模型加载日志）
+        print(json.dumps(startup_probe()))
@@ -0,0 +1,106 @@
+"""
+基准测试公共工具：测试图片、耗时统计、内存统计和运行环境信息
+"""
+
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+TEST_IMAGES_DIR = os.path.join(ROOT_DIR, '图像识别接口', 'test_images')
+
+# 记录到结果中的配置项（环境变量），便于对比不同配置的结果
+RECORDED_ENV = (
+    'CLIP_MODEL_NAME', 'INFERENCE_BACKEND', 'PREPROCESS_DRAFT', 'PREPROCESS_WORKERS',
+    'RECOGNIZER_BATCHING', 'RECOGNIZER_MAX_BATCH_SIZE', 'RECOGNIZER_MAX_WAIT_MS',
+    'VECTOR_INDEX_BACKEND', 'TORCH_NUM_THREADS', 'TORCH_INTEROP_THREADS', 'TORCH_INFERENCE_MODE',
+    'TORCH_JIT', 'WEB_CONCURRENCY', 'GUNICORN_THREADS', 'GUNICORN_PRELOAD', 'WORKER_CPU_AFFINITY',
+)
+
+
+def load_test_images(images_dir=TEST_IMAGES_DIR):
+    """按文件名排序读取测试图片，返回 (文件名, 字节流) 列表（只取 PIL 能识别的 JPEG/PNG/GIF）"""
+    images = []
+    for filename in sorted(os.listdir(images_dir)):
+        if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
+            with open(os.path.join(images_dir, filename), 'rb') as f:
+                images.append((filename, f.read()))
+    return images
+
+
+def percentile(sorted_values, q):
+    """线性插值的分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize_latencies(latencies):
+    """把一组耗时（秒）汇总为毫秒单位的统计值"""
+    values = sorted(latencies)
+    if not values:
+        return {'count': 0}
+    to_ms = lambda value: round(value * 1000, 3)
+    return {
+        'count': len(values),
+        'mean_ms': to_ms(statistics.fmean(values)),
+        'p50_ms': to_ms(percentile(values, 0.50)),
+        'p95_ms': to_ms(percentile(values, 0.95)),
+        'p99_ms': to_ms(percentile(values, 0.99)),
+        'max_ms': to_ms(values[-1]),
+    }
+
+
+def process_memory(pid='self'):
+    """
+    读取进程内存（MB）：rss 为常驻内存；pss 按共享页面的进程数分摊，
+    gunicorn 预加载模式下多个 worker 共享的模型内存只会被计算一次
+    """
+    memory = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in ('Rss', 'Pss'):
+                    memory[key.lower() + '_mb'] = round(int(rest.split()[0]) / 1024, 1)
+    except OSError:
+        import resource
+        # 不支持 /proc 的系统只能取得当前进程的峰值常驻内存
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        memory['peak_rss_mb'] = round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    return memory
+
+
+def child_pids(pid):
+    """返回进程的全部子进程ID（Linux）"""
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def environment_info():
+    """记录运行环境：代码版本、Python / torch 版本、CPU核数和相关配置"""
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=ROOT_DIR, capture_output=True, text=True,
+                                  timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ''
+
+    import torch
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'env': {name: os.environ[name] for name in RECORDED_ENV if name in os.environ},
+    }
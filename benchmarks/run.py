@@ -0,0 +1,122 @@
+"""
+基准测试入口：运行全部（或指定的）测试项，结果写入 JSON，便于在不同提交之间对比
+
+用法：
+    python -m benchmarks.run                          # 全部测试项，结果写入 benchmarks/results/<commit>.json
+    python -m benchmarks.run --suite recognition --quick
+    python -m benchmarks.run --compare before.json after.json
+"""
+
+import argparse
+import json
+import os
+import shlex
+import sys
+import time
+
+from .common import ROOT_DIR, environment_info, load_test_images
+
+SUITES = ('recognition', 'startup', 'http')
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+
+
+def run_recognition(images, args):
+    from .bench_recognition import bench_batch, bench_single
+
+    sys.path.insert(0, ROOT_DIR)
+    from api.artifact_recognizer import ArtifactRecognizer
+
+    # 直接测量模型链路：本地识别器，不经过结果缓存、批处理调度和推理服务
+    recognizer = ArtifactRecognizer()
+    batch_sizes = (1, 4, 8) if args.quick else (1, 4, 8, 16, 32)
+    return {
+        'single': bench_single(recognizer, images, repeats=1 if args.quick else 5),
+        'batch': bench_batch(recognizer, images, batch_sizes=batch_sizes, repeats=1 if args.quick else 3),
+    }
+
+
+def run_startup(images, args):
+    from .bench_recognition import bench_startup
+    return bench_startup(runs=1 if args.quick else 2)
+
+
+def run_http(images, args):
+    from .bench_http import DEFAULT_NARRATION_ARGS, bench_http
+    narration_args = args.narration_server_args
+    options = {'narration_args': shlex.split(narration_args) if narration_args else DEFAULT_NARRATION_ARGS}
+    if args.quick:
+        options.update(concurrency_levels=(1, 4), requests_per_worker=3)
+    return bench_http(images, **options)
+
+
+RUNNERS = {'recognition': run_recognition, 'startup': run_startup, 'http': run_http}
+
+
+def flatten(results, prefix=''):
+    """把嵌套结果展开为 {'a.b.c': 数值}，用于对比"""
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, list):
+            flat.update(flatten({str(i): item for i, item in enumerate(value)}, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(before_path, after_path):
+    """逐项对比两次结果，输出变化百分比"""
+    with open(before_path, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(after_path, encoding='utf-8') as f:
+        after = json.load(f)
+
+    print(f"对比：{before['environment']['commit']} -> {after['environment']['commit']}")
+    before_flat, after_flat = flatten(before['results']), flatten(after['results'])
+    for name in sorted(before_flat.keys() & after_flat.keys()):
+        old, new = before_flat[name], after_flat[name]
+        change = f'{(new - old) / old * 100:+.1f}%' if old else '-'
+        print(f'{name:<60} {old:>12} {new:>12} {change:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='识别与讲解性能基准测试')
+    parser.add_argument('--suite', choices=SUITES, action='append', help='只运行指定的测试项（可重复），默认全部')
+    parser.add_argument('--quick', action='store_true', help='减少重复次数，快速检查')
+    parser.add_argument('--output', help='结果文件路径，默认 benchmarks/results/<commit>.json')
+    parser.add_argument('--narration-server-args',
+                        help='传给讲解模拟服务的参数，例如 "--first-token-ms 500 --error-rate 0.05"')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='对比两个结果文件')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    images = load_test_images()
+    environment = environment_info()
+    report = {
+        'environment': environment,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'quick': args.quick,
+        'images': [name for name, _ in images],
+        'results': {},
+    }
+    if args.narration_server_args:
+        report['narration_server_args'] = args.narration_server_args
+    for suite in args.suite or SUITES:
+        print(f"运行基准测试：{suite}", flush=True)
+        report['results'][suite] = RUNNERS[suite](images, args)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{environment['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report['results'], ensure_ascii=False, indent=2))
+    print(f"结果已写入 {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,9 @@
 
 import os
 
+# 项目根目录
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # 前端路径配置
 FRONTEND_CONFIG = {
     'static_folder': 'static',
@@ -9,21 +12,230 @@ FRONTEND_CONFIG = {
     'allowed_extensions': {'png', 'jpg', 'jpeg', 'gif'}
 }
 
-# API接口配置
+# 上传限制
+#   max_content_length   - 整个请求体的上限（Flask MAX_CONTENT_LENGTH），超过时在解析表单之前直接返回413
+#   max_image_size       - 单张图片接口的请求体上限，以及批量接口中每张图片（含压缩包内的图片）的上限；
+#                          声明了 Content-Length 时在读取请求体之前判断，未声明时读取超过上限立即中止
+#   max_form_memory_size - 表单中非文件字段的总大小上限（Flask MAX_FORM_MEMORY_SIZE），这部分会读入内存
+# 上传文件超过约500KB时由 Werkzeug 暂存到临时文件，识别时直接从暂存文件解码，不会整体读入内存
+UPLOAD_CONFIG = {
+    'max_content_length': int(os.environ.get('MAX_UPLOAD_MB', 64)) * 1024 * 1024,
+    'max_image_size': int(os.environ.get('MAX_IMAGE_MB', 16)) * 1024 * 1024,
+    'max_form_memory_size': int(os.environ.get('MAX_FORM_MEMORY_KB', 512)) * 1024
+}
+
+# API接口配置（会通过 /api 接口原样返回给前端，不要在这里放密钥等敏感信息）
 API_CONFIG = {
     'image_recognition': {
         'endpoint': '/api/image-recognition',
         'methods': ['POST'],
-        'description': '图像识别接口 - 输入图片,返回识别结果JSON'
+        'description': '图像识别接口 - 输入图片,返回识别结果JSON',
+        'batch_endpoint': '/api/image-recognition/batch',
+        'batch_description': '批量图像识别接口 - 输入多张图片或zip压缩包,按顺序返回每张图片的识别结果JSON'
     },
     'artifact_narration': {
         'endpoint': '/api/artifact-narration',
         'methods': ['POST'],
         'description': '文物讲解生成接口 - 输入文物信息,返回AI生成的讲解文案',
-        'api_key': os.environ.get('DASH_SCOPE_API_KEY')
+        'stream_endpoint': '/api/artifact-narration/stream',
+        'stream_description': '流式文物讲解接口 - 输入文物信息,以Server-Sent Events逐段返回AI生成的讲解文案'
+    },
+    'recognize_and_narrate': {
+        'endpoint': '/api/recognize-and-narrate',
+        'methods': ['POST'],
+        'description': '识别+讲解一体化接口 - 输入图片,以Server-Sent Events先返回识别结果,再逐段返回讲解文案'
+    }
+}
+
+# 图像识别器配置
+RECOGNIZER_CONFIG = {
+    'model_name': os.environ.get('CLIP_MODEL_NAME', 'ViT-B/32'),
+    # 标签文本编码时使用的提示词模板，{} 会被替换为 "文物名称-朝代"
+    'prompt_template': os.environ.get('CLIP_PROMPT_TEMPLATE', '{}'),
+    # 文物目录：由 scripts/compile_catalog.py 把文物数据（source）编译成一个文件（path），
+    # 包含候选标签、名称、朝代、简介和标签向量，启动时以内存映射方式读取
+    # auto_compile 开启时，目录文件不存在或与数据文件、模型、提示词模板不一致，启动时自动重新编译
+    'catalog': {
+        'path': os.environ.get('CATALOG_PATH', os.path.join(BASE_DIR, 'data', 'catalog.bin')),
+        'source': os.environ.get('CATALOG_SOURCE', os.path.join(BASE_DIR, 'data', 'artifact_data.csv')),
+        'auto_compile': os.environ.get('CATALOG_AUTO_COMPILE', '1') == '1'
+    },
+    # 图片编码推理后端（int8 和 onnx 只支持 CPU）：
+    #   torch      - PyTorch 原始精度（CPU 上为 fp32）
+    #   torch_int8 - PyTorch 动态量化，全连接层权重为 int8
+    #   onnx       - ONNX Runtime，模型文件需先用 scripts/export_onnx.py 导出（需安装 onnxruntime）
+    'inference_backend': {
+        'backend': os.environ.get('INFERENCE_BACKEND', 'torch'),
+        'onnx_path': os.environ.get('ONNX_MODEL_PATH', os.path.join(BASE_DIR, 'data', 'models', 'clip_image_encoder.onnx')),
+        'onnx_threads': int(os.environ.get('ONNX_NUM_THREADS', 0))
+    },
+    # 图片预处理：JPEG 按模型输入尺寸缩小解码（draft），批量识别时用线程池并行解码和预处理
+    'preprocessing': {
+        'draft': os.environ.get('PREPROCESS_DRAFT', '1') == '1',
+        'workers': int(os.environ.get('PREPROCESS_WORKERS', min(4, os.cpu_count() or 1))),
+        # 允许的最大图片像素数（只读文件头判断，超限图片不会被解码），0 表示不限制
+        'max_image_pixels': int(os.environ.get('MAX_IMAGE_PIXELS', 64000000))
+    },
+    # 动态批处理：把并发的识别请求合并为一个批次进行模型推理
+    'batching': {
+        'enabled': os.environ.get('RECOGNIZER_BATCHING', '1') == '1',
+        'max_batch_size': int(os.environ.get('RECOGNIZER_MAX_BATCH_SIZE', 16)),
+        'max_wait_ms': float(os.environ.get('RECOGNIZER_MAX_WAIT_MS', 10))
+    },
+    # 标签向量检索方式：
+    #   auto  - 标签数不超过 ann_threshold 时用 torch 稠密矩阵乘法，超过时用 IVF 近似检索
+    #   torch - 始终使用 torch 稠密矩阵乘法（原有方式）
+    #   flat  - numpy 精确检索
+    #   ivf   - numpy 倒排文件近似检索，nlist 为簇数（0 表示自动取 sqrt(标签数)），
+    #           nprobe 为每次查询扫描的簇数，调大可提高召回率但会增加延迟；
+    #           norm_samples 为每个簇用于估计 softmax 分母的代表向量数，使置信度与稠密检索可比（conf_threshold 含义不变）
+    'vector_index': {
+        'backend': os.environ.get('VECTOR_INDEX_BACKEND', 'auto'),
+        'ann_threshold': int(os.environ.get('VECTOR_INDEX_ANN_THRESHOLD', 20000)),
+        'nlist': int(os.environ.get('VECTOR_INDEX_NLIST', 0)),
+        'nprobe': int(os.environ.get('VECTOR_INDEX_NPROBE', 16)),
+        'norm_samples': int(os.environ.get('VECTOR_INDEX_NORM_SAMPLES', 32))
+    },
+    # 识别结果缓存：按上传图片内容的哈希缓存识别成功的结果（LRU + 有效期）
+    # perceptual_hash 开启后同一张图片重新压缩、缩放后再上传也能命中（默认关闭：
+    # 同一展台、相同角度拍摄的不同文物感知哈希也可能相近，会拿到另一件文物的结果），
+    # perceptual_max_distance 为64位感知哈希允许相差的最大位数，默认0（必须完全一致）
+    # 使用独立推理服务时缓存位于推理进程中，由所有 Web worker 共享
+    'result_cache': {
+        'enabled': os.environ.get('RESULT_CACHE_ENABLED', '1') == '1',
+        'max_size': int(os.environ.get('RESULT_CACHE_MAX_SIZE', 1024)),
+        'ttl_seconds': int(os.environ.get('RESULT_CACHE_TTL', 3600)),
+        'perceptual_hash': os.environ.get('RESULT_CACHE_PERCEPTUAL_HASH', '0') == '1',
+        'perceptual_max_distance': int(os.environ.get('RESULT_CACHE_PERCEPTUAL_DISTANCE', 0))
+    },
+    # 独立推理服务：开启后 Web 进程不加载模型，通过本地 Unix socket 调用推理进程
+    # 启动推理进程：INFERENCE_SERVER_AUTHKEY=<随机密钥> python -m api.inference_server
+    #   address  socket 文件路径，所在目录必须只有当前用户可以访问（权限 0700），
+    #            默认为 $XDG_RUNTIME_DIR（未设置时为 /tmp）下的 artifact-inference-<uid>/inference.sock
+    #   authkey  连接认证密钥，推理进程和 Web 进程必须设置相同的 INFERENCE_SERVER_AUTHKEY，未设置时拒绝启动
+    #   timeout  等待推理结果的最长时间（秒），超时返回错误，避免推理进程卡住时拖住全部 Web 线程
+    'inference_server': {
+        'enabled': os.environ.get('INFERENCE_SERVER', '0') == '1',
+        'address': os.environ.get('INFERENCE_SERVER_ADDRESS', os.path.join(
+            os.environ.get('XDG_RUNTIME_DIR') or '/tmp',
+            f"artifact-inference-{os.getuid() if hasattr(os, 'getuid') else 0}",
+            'inference.sock'
+        )),
+        'authkey': os.environ.get('INFERENCE_SERVER_AUTHKEY', '').encode('utf-8'),
+        'timeout': float(os.environ.get('INFERENCE_SERVER_TIMEOUT', 60)),
+        # 每个 Web 进程保留的空闲连接数
+        'pool_size': int(os.environ.get('INFERENCE_SERVER_POOL_SIZE', 8)),
+        # 推理进程绑定的CPU核心，例如 "0-7"，为空表示不绑定
+        'cpu_affinity': os.environ.get('INFERENCE_CPU_AFFINITY', '')
+    },
+    # 批量识别接口：单次请求最多包含的图片数
+    'batch_endpoint': {
+        'max_images': int(os.environ.get('RECOGNIZER_BATCH_MAX_IMAGES', 64))
     }
 }
 
+# FastAPI 识别服务（图像识别接口/service.py）配置
+RECOGNITION_SERVICE_CONFIG = {
+    # 识别引擎：
+    #   shared - 与 Flask 服务共用 api/ 下的识别引擎和文物目录（data/catalog.bin），支持动态批处理、结果缓存和独立推理服务
+    #   legacy - 使用本服务原有的识别器（图像识别接口/artifact_recognizer.py）和数据（图像识别接口/data/）
+    'engine': os.environ.get('RECOGNITION_SERVICE_ENGINE', 'shared'),
+    # 执行识别的线程数，不小于动态批处理的批大小时才能凑满批次
+    'executor_workers': int(os.environ.get('RECOGNITION_SERVICE_WORKERS', 16)),
+    # 最多同时处理（含排队）的请求数，超过时返回503
+    'max_queue_depth': int(os.environ.get('RECOGNITION_SERVICE_MAX_QUEUE', 64))
+}
+
+# 文物讲解配置
+NARRATION_CONFIG = {
+    'model': os.environ.get('NARRATION_MODEL', 'qwen-turbo'),
+    # 讲解生成后端：dashscope（DashScope 文本生成接口）/ openai（OpenAI 兼容的 Chat Completions 接口）
+    # 压测时可把 base_url 指向本地模拟服务：python -m api.fake_narration_server
+    'backend': os.environ.get('NARRATION_BACKEND', 'dashscope'),
+    # 讲解生成后端的API密钥，NARRATION_API_KEY 未设置时沿用 DASH_SCOPE_API_KEY
+    'api_key': os.environ.get('NARRATION_API_KEY') or os.environ.get('DASH_SCOPE_API_KEY'),
+    # 讲解生成客户端：应用启动时创建一次，复用 keep-alive 连接池
+    #   base_url        服务地址（为空时使用所选后端的官方地址）
+    #   connect_timeout 建立连接超时（秒），read_timeout 等待响应数据超时（秒）
+    #   pool_size       连接池大小，max_concurrency 同时进行的最大上游调用数
+    #   acquire_timeout 并发已满时最多等待多少秒，超时直接返回"系统繁忙"
+    'client': {
+        'base_url': os.environ.get('NARRATION_BASE_URL', os.environ.get('DASHSCOPE_BASE_URL', '')),
+        'connect_timeout': float(os.environ.get('NARRATION_CONNECT_TIMEOUT', 5)),
+        'read_timeout': float(os.environ.get('NARRATION_READ_TIMEOUT', 60)),
+        'pool_size': int(os.environ.get('NARRATION_POOL_SIZE', 16)),
+        'max_concurrency': int(os.environ.get('NARRATION_MAX_CONCURRENCY', 8)),
+        'acquire_timeout': float(os.environ.get('NARRATION_ACQUIRE_TIMEOUT', 10))
+    },
+    # 识别+讲解一体化接口中，为排名靠后的候选文物在后台预先生成讲解（写入讲解缓存）
+    # 每次预取都是一次额外的（计费的）上游调用，默认关闭
+    #   top_k 为最多预取的候选数，workers 为同时进行（含排队）的预取数上限，已满时直接跳过
+    #   min_idle_slots 为发起预取时讲解客户端至少要剩余的空闲调用名额，避免预取挤占前台请求
+    'prefetch': {
+        'enabled': os.environ.get('NARRATION_PREFETCH', '0') == '1',
+        'top_k': int(os.environ.get('NARRATION_PREFETCH_TOP_K', 2)),
+        'workers': int(os.environ.get('NARRATION_PREFETCH_WORKERS', 4)),
+        'min_idle_slots': int(os.environ.get('NARRATION_PREFETCH_MIN_IDLE', 2))
+    },
+    # 讲解生成的容错策略
+    #   deadline          每次讲解（含全部重试）的总耗时上限（秒），单次请求的读取超时也不超过剩余时间
+    #   max_attempts      最多尝试次数（只重试网络错误、超时、429/5xx），退避时间在 0 到 base_delay*2^n 之间随机（不超过 max_delay）
+    #   breaker_failures  上游连续故障（网络错误、超时、429/5xx）多少次后熔断，熔断期间直接返回兜底讲解；
+    #                     breaker_recovery 秒后放行一个试探请求。4xx 和本地并发已满不计入
+    #   hedging           非流式讲解超过 hedge_delay_ms（为0时取近期耗时的p95）仍未返回时，再发一个相同请求，取先返回的结果
+    #                     hedge_workers 为对冲线程数，线程已满时直接调用、不发对冲请求
+    'resilience': {
+        'deadline': float(os.environ.get('NARRATION_DEADLINE', 30)),
+        'max_attempts': int(os.environ.get('NARRATION_MAX_ATTEMPTS', 3)),
+        'retry_base_delay': float(os.environ.get('NARRATION_RETRY_BASE_DELAY', 0.2)),
+        'retry_max_delay': float(os.environ.get('NARRATION_RETRY_MAX_DELAY', 2)),
+        'breaker_failures': int(os.environ.get('NARRATION_BREAKER_FAILURES', 5)),
+        'breaker_recovery': float(os.environ.get('NARRATION_BREAKER_RECOVERY', 30)),
+        'hedging': os.environ.get('NARRATION_HEDGING', '0') == '1',
+        'hedge_delay_ms': float(os.environ.get('NARRATION_HEDGE_DELAY_MS', 0)),
+        'hedge_workers': int(os.environ.get('NARRATION_HEDGE_WORKERS', 8))
+    },
+    # 兜底讲解：上游失败或熔断时，返回该文物之前生成过的讲解（任意模型/提示词版本），
+    # 没有时用文物数据（catalog_path）中的简介拼成一段讲解
+    'fallback': {
+        'enabled': os.environ.get('NARRATION_FALLBACK', '1') == '1',
+        'catalog_path': os.environ.get('NARRATION_FALLBACK_CATALOG', os.path.join(BASE_DIR, 'data', 'artifact_data.csv'))
+    },
+    # 讲解缓存：按 文物名称、朝代、模型、提示词版本 缓存生成结果，相同文物的并发请求只调用一次大模型
+    # sqlite_path 不为空时额外持久化到 SQLite，进程重启和多个 worker 之间共享
+    'cache': {
+        'enabled': os.environ.get('NARRATION_CACHE_ENABLED', '1') == '1',
+        'max_size': int(os.environ.get('NARRATION_CACHE_MAX_SIZE', 512)),
+        'ttl_seconds': int(os.environ.get('NARRATION_CACHE_TTL', 86400)),
+        'sqlite_path': os.environ.get('NARRATION_CACHE_DB', os.path.join(BASE_DIR, 'data', 'cache', 'narrations.sqlite3'))
+    }
+}
+
+# 生产部署（gunicorn）配置，详见 gunicorn.conf.py
+SERVING_CONFIG = {
+    'workers': int(os.environ.get('WEB_CONCURRENCY', 2)),
+    'threads': int(os.environ.get('GUNICORN_THREADS', 4)),
+    # 预加载模式：master 进程加载一次模型，fork 后各 worker 只读共享
+    'preload': os.environ.get('GUNICORN_PRELOAD', '1') == '1',
+    'timeout': int(os.environ.get('GUNICORN_TIMEOUT', 120)),
+    # 每个 worker 的推理线程数，默认把CPU核数平均分给各 worker
+    'torch_threads': int(os.environ.get(
+        'TORCH_NUM_THREADS',
+        max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get('WEB_CONCURRENCY', 2))))
+    )),
+    # 每个 worker 的 inter-op 线程数（并行执行相互独立的算子），单张图片推理时1即可
+    'interop_threads': int(os.environ.get('TORCH_INTEROP_THREADS', 1)),
+    # 推理时使用 torch.inference_mode()（关闭时使用 torch.no_grad()）
+    'inference_mode': os.environ.get('TORCH_INFERENCE_MODE', '1') == '1',
+    # 图片编码器（torch 后端）的图优化：none / trace（torch.jit.trace）/ compile（torch.compile，首次推理时编译）
+    'jit': os.environ.get('TORCH_JIT', 'none'),
+    # 把每个 worker 绑定到互不重叠的 torch_threads 个CPU核心，避免 worker 之间争抢核心
+    'cpu_affinity': os.environ.get('WORKER_CPU_AFFINITY', '0') == '1',
+    # 识别模型加载方式：background - 后台线程加载，应用立即可以响应请求（加载完成前识别接口返回503）
+    #                    eager      - 导入时同步加载；gunicorn 预加载模式下总是使用 eager，在 master 中加载一次
+    'model_loading': os.environ.get('MODEL_LOADING', 'background')
+}
+
 # 服务器配置
 SERVER_CONFIG = {
     'host': '0.0.0.0',
@@ -0,0 +1,52 @@
+# gunicorn 配置文件
+#
+# 启动方式: gunicorn -c gunicorn.conf.py app:app
+#
+# 预加载模式（默认开启，GUNICORN_PRELOAD=1）:
+#   master 进程导入 app 时加载一次 CLIP 模型和标签向量，然后 fork 出各个 worker。
+#   模型权重在 fork 后只读共享（写时复制），N 个 worker 只占用约一份模型内存。
+#   master 加载阶段只用单线程，每个 worker 在 fork 之后再按 TORCH_NUM_THREADS 设置自己的线程数。
+#
+# 常用环境变量:
+#   WEB_CONCURRENCY      worker 进程数（默认2）
+#   GUNICORN_THREADS     每个 worker 的请求线程数（默认4，多线程请求可以被动态批处理合并）
+#   GUNICORN_PRELOAD     是否在 master 中预加载模型（1/0）
+#   TORCH_NUM_THREADS    每个 worker 的推理线程数（默认 CPU核数 / worker数）
+#   TORCH_INTEROP_THREADS 每个 worker 的 inter-op 线程数（默认1）
+#   WORKER_CPU_AFFINITY  是否把每个 worker 绑定到互不重叠的 TORCH_NUM_THREADS 个CPU核心（1/0，默认0）
+#   GUNICORN_TIMEOUT     worker 超时时间（秒）
+#   MODEL_LOADING        非预加载模式下的模型加载方式，默认 background：worker 启动后在后台加载，
+#                        加载完成前识别接口返回503、/readyz 返回503；预加载模式下总是在 master 中同步加载
+
+from config import SERVING_CONFIG
+
+workers = SERVING_CONFIG['workers']
+threads = SERVING_CONFIG['threads']
+preload_app = SERVING_CONFIG['preload']
+timeout = SERVING_CONFIG['timeout']
+
+if preload_app:
+    from api.serving import prepare_master
+    prepare_master()
+    # 后台加载线程不会随 fork 复制到 worker，预加载模式下必须在 master 中同步加载完成
+    SERVING_CONFIG['model_loading'] = 'eager'
+
+
+def pre_fork(server, worker):
+    """fork worker 之前：冻结 master 中已加载的对象，减少写时复制；为 worker 分配CPU分组"""
+    if preload_app:
+        from api.serving import freeze_shared_memory
+        freeze_shared_memory()
+
+    if SERVING_CONFIG['cpu_affinity']:
+        from api.serving import assign_cpu_slot
+        used_slots = {getattr(w, 'cpu_slot', None) for w in server.WORKERS.values()}
+        worker.cpu_slot = assign_cpu_slot(used_slots, workers)
+
+
+def post_fork(server, worker):
+    """fork worker 之后：设置本 worker 的推理线程数和CPU绑定"""
+    from api.serving import configure_worker
+    cpus = configure_worker(getattr(worker, 'cpu_slot', None))
+    server.log.info(f"worker {worker.pid} 已启动，推理线程数: {SERVING_CONFIG['torch_threads']}"
+                    + (f"，绑定CPU核心: {sorted(cpus)}" if cpus else ""))
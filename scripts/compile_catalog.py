@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+编译文物目录（替代原来的 generate_labels.py 和 test_data.py）
+把 data/artifact_data.csv 清洗后编译成一个文件 data/catalog.bin：候选标签、名称、朝代、简介、标签向量和内容哈希，
+服务启动时直接以内存映射方式读取，不再解析CSV、读取 candidate_labels.txt 或编码标签文本
+
+- 清洗：去掉首尾空白，过滤名称或朝代为空的行，按 (名称, 朝代) 去重，标签（名称-朝代）相同时只保留第一行；标签顺序与数据文件一致，每次编译结果相同
+- 增量编译：复用上一次编译结果中相同标签的向量，只编码新增或修改了名称/朝代的行，只改简介时不需要加载模型
+
+用法：
+    python scripts/compile_catalog.py                    # 增量编译
+    python scripts/compile_catalog.py --full             # 重新编码全部标签
+    python scripts/compile_catalog.py --cleaned-output data/cleaned_artifact_data.csv   # 同时保存清洗后的数据
+    python scripts/compile_catalog.py --check            # 只检查目录是否与数据文件、模型和提示词模板一致，不一致时退出码为1
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# 添加项目根目录到Python路径
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT_DIR)
+
+from config import RECOGNIZER_CONFIG
+from api.catalog import CatalogError, file_hash, load_catalog
+
+
+def main():
+    catalog_config = RECOGNIZER_CONFIG['catalog']
+    parser = argparse.ArgumentParser(description='编译文物目录')
+    parser.add_argument('--source', default=catalog_config['source'], help='文物数据CSV（name, dynasty, intro）')
+    parser.add_argument('--output', default=catalog_config['path'], help='编译后的目录文件')
+    parser.add_argument('--model', default=RECOGNIZER_CONFIG['model_name'], help='CLIP 模型名称')
+    parser.add_argument('--prompt-template', default=RECOGNIZER_CONFIG['prompt_template'], help='标签提示词模板')
+    parser.add_argument('--full', action='store_true', help='不复用上一次编译的标签向量，重新编码全部标签')
+    parser.add_argument('--cleaned-output', help='把清洗后的文物数据另存为CSV')
+    parser.add_argument('--check', action='store_true', help='只检查目录是否需要重新编译')
+    args = parser.parse_args()
+
+    if args.check:
+        try:
+            catalog = load_catalog(args.output)
+        except (FileNotFoundError, CatalogError) as e:
+            sys.exit(f"文物目录需要重新编译：{str(e)}")
+        if not catalog.is_current(args.model, args.prompt_template, file_hash(args.source)):
+            sys.exit("文物目录需要重新编译：与数据文件、模型或提示词模板不一致")
+        print(f"文物目录是最新的：{args.output}，共{len(catalog)}个标签（{catalog.content_hash}）")
+        return
+
+    from api.catalog_compiler import compile_catalog
+
+    started_at = time.time()
+    catalog = compile_catalog(args.source, args.output, args.model, args.prompt_template,
+                              incremental=not args.full, cleaned_output=args.cleaned_output)
+    print(f"文物目录编译完成：{args.output}，共{len(catalog)}个标签，向量维度 {catalog.embeddings.shape[1]}，"
+          f"内容哈希 {catalog.content_hash}，耗时 {time.time() - started_at:.1f} 秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导出并验证 CLIP 图片编码器的推理后端
+1. 把 CLIP 图片编码器导出为 ONNX 模型（路径见 RECOGNIZER_CONFIG['inference_backend']['onnx_path']）
+2. 在测试图片上对比 torch fp32 / torch int8 / onnx 三种后端：
+   Top1 是否一致、TopK 重合率、图片向量余弦相似度，以及单张图片编码耗时
+
+用法：
+    python scripts/export_onnx.py [--images 图像识别接口/test_images] [--top-k 3] [--skip-export]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+# 添加项目根目录到Python路径
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT_DIR)
+
+from config import RECOGNIZER_CONFIG
+from api.artifact_recognizer import ArtifactRecognizer
+from api.inference_backends import TorchImageEncoder, QuantizedImageEncoder, OnnxImageEncoder, export_onnx
+
+
+def load_test_images(recognizer, images_dir):
+    """读取测试图片，返回 (文件名, 预处理后的张量) 列表"""
+    images = []
+    for filename in sorted(os.listdir(images_dir)):
+        if not filename.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
+            continue
+        tensor = recognizer.process_image(os.path.join(images_dir, filename))
+        if tensor is not None:
+            images.append((filename, tensor))
+    return images
+
+
+def evaluate(recognizer, encoder, images, top_k):
+    """用指定后端编码全部测试图片，返回 (每张图片的向量, TopK标签下标, 平均耗时毫秒)"""
+    recognizer.image_encoder = encoder
+    # 预热一次，排除首次推理的初始化开销
+    recognizer._encode_images(images[0][1])
+
+    features, topk, elapsed = [], [], 0.0
+    for _, tensor in images:
+        start = time.perf_counter()
+        feature = recognizer._encode_images(tensor)
+        elapsed += time.perf_counter() - start
+        _, indices = recognizer._search(feature, top_k)
+        features.append(feature[0].float())
+        topk.append(indices[0].tolist())
+    return features, topk, elapsed / len(images) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='导出 ONNX 模型并验证各推理后端的识别结果')
+    parser.add_argument('--images', default=os.path.join(ROOT_DIR, '图像识别接口', 'test_images'), help='测试图片目录')
+    parser.add_argument('--top-k', type=int, default=3, help='对比的TopK')
+    parser.add_argument('--skip-export', action='store_true', help='跳过导出，直接验证已有的ONNX模型')
+    args = parser.parse_args()
+
+    backend_config = RECOGNIZER_CONFIG['inference_backend']
+    onnx_path = backend_config['onnx_path']
+
+    recognizer = ArtifactRecognizer()
+    if recognizer.device != 'cpu':
+        print("✗ 导出和验证需要在CPU上进行")
+        return False
+
+    if not args.skip_export:
+        print(f"正在导出ONNX模型：{onnx_path}")
+        export_onnx(recognizer.model, onnx_path, input_size=getattr(recognizer.model.visual, 'input_resolution', 224))
+        print(f"✓ 导出完成，文件大小 {os.path.getsize(onnx_path) / 1024 / 1024:.1f}MB")
+
+    images = load_test_images(recognizer, args.images)
+    if not images:
+        print(f"✗ 未找到测试图片：{args.images}")
+        return False
+    print(f"找到 {len(images)} 张测试图片")
+
+    encoders = [TorchImageEncoder(recognizer.model), QuantizedImageEncoder(recognizer.model)]
+    try:
+        encoders.append(OnnxImageEncoder(onnx_path, num_threads=backend_config['onnx_threads']))
+    except (ImportError, OSError) as e:
+        print(f"跳过 onnx 后端：{str(e)}")
+
+    baseline_features, baseline_topk, baseline_ms = evaluate(recognizer, encoders[0], images, args.top_k)
+    print(f"\n{'后端':<12}{'耗时(ms)':>10}{'加速':>8}{'Top1一致':>10}{'TopK重合':>10}{'最小余弦':>10}")
+    print(f"{'torch':<12}{baseline_ms:>10.1f}{1.0:>8.2f}{'-':>10}{'-':>10}{'-':>10}")
+
+    passed = True
+    for encoder in encoders[1:]:
+        features, topk, ms = evaluate(recognizer, encoder, images, args.top_k)
+        top1 = sum(a[0] == b[0] for a, b in zip(topk, baseline_topk)) / len(images)
+        overlap = sum(len(set(a) & set(b)) / len(b) for a, b in zip(topk, baseline_topk)) / len(images)
+        cosine = min(torch.nn.functional.cosine_similarity(a, b, dim=0).item()
+                     for a, b in zip(features, baseline_features))
+        print(f"{encoder.name:<12}{ms:>10.1f}{baseline_ms / ms:>8.2f}{top1:>10.2%}{overlap:>10.2%}{cosine:>10.4f}")
+
+        # 列出 Top1 与 fp32 不一致的图片
+        for (filename, _), a, b in zip(images, topk, baseline_topk):
+            if a[0] != b[0]:
+                print(f"  ! {filename}: {recognizer.candidate_labels[a[0]]} <- fp32: {recognizer.candidate_labels[b[0]]}")
+        passed = passed and top1 == 1.0
+
+    recognizer.image_encoder = encoders[0]
+    print("\n✓ 所有后端Top1与fp32一致" if passed else "\n⚠ 部分后端Top1与fp32不一致，请检查上面列出的图片")
+    return passed
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
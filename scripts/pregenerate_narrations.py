@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线预生成全部文物的讲解
+遍历编译后的文物目录（scripts/compile_catalog.py）中的全部 (名称, 朝代)，
+用与线上相同的提示词和模型生成讲解，写入讲解缓存的 SQLite 存储（NARRATION_CONFIG['cache']['sqlite_path']）。
+线上请求直接命中预生成的讲解，只有未命中时才实时调用大模型。
+
+- 缓存键包含模型名称和提示词版本（PROMPT_VERSION），修改提示词或更换模型后重新运行即可生成新版本
+- 可以随时中断：每生成一条就立即写入，再次运行时跳过已经生成的条目
+- 用 --concurrency 限制同时进行的请求数，--rate 限制每秒发起的请求数，避免触发上游限流
+- 上游连续故障触发熔断时暂停，等熔断器放行试探请求后继续，不会让剩余条目全部快速失败
+
+用法：
+    python scripts/pregenerate_narrations.py [--concurrency 4] [--rate 2] [--limit 10] [--dry-run] [--force]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# 添加项目根目录到Python路径
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(ROOT_DIR)
+
+from config import NARRATION_CONFIG, RECOGNIZER_CONFIG
+from api.artifact_ai_generator import NarrationError, PROMPT_VERSION, create_narration_generator
+from api.catalog import CatalogError, load_catalog
+from api.narration_cache import NarrationStore, narration_cache_key
+from api.resilience import CircuitOpenError
+
+
+class RateLimiter:
+    """按固定间隔放行请求（每秒最多 rate 个），多个线程共用"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            scheduled_at = max(now, self._next_at)
+            self._next_at = scheduled_at + self.interval
+        time.sleep(scheduled_at - now)
+
+
+def load_artifacts(path):
+    """文物目录中的全部 (名称, 朝代)，与识别结果返回的名称和朝代一致"""
+    try:
+        catalog = load_catalog(path)
+    except (FileNotFoundError, CatalogError) as e:
+        sys.exit(f"文物目录读取失败：{str(e)}，请先运行 python scripts/compile_catalog.py")
+    return [(record['name'], record['dynasty']) for record in catalog.records()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线预生成全部文物的讲解')
+    parser.add_argument('--catalog', default=RECOGNIZER_CONFIG['catalog']['path'], help='编译后的文物目录文件')
+    parser.add_argument('--model', default=NARRATION_CONFIG['model'], help='大模型名称，默认与线上一致')
+    parser.add_argument('--concurrency', type=int, default=4, help='同时进行的请求数')
+    parser.add_argument('--rate', type=float, default=2, help='每秒最多发起的请求数，0 表示不限制')
+    parser.add_argument('--limit', type=int, default=0, help='最多生成多少条（用于试运行），0 表示全部')
+    parser.add_argument('--force', action='store_true', help='重新生成已经存在的讲解')
+    parser.add_argument('--dry-run', action='store_true', help='只统计需要生成的条数')
+    args = parser.parse_args()
+
+    sqlite_path = NARRATION_CONFIG['cache']['sqlite_path']
+    if not sqlite_path:
+        sys.exit("讲解持久化存储未配置（NARRATION_CACHE_DB 为空）")
+    store = NarrationStore(sqlite_path)
+
+    artifacts = load_artifacts(args.catalog)
+    try:
+        pending = [
+            (name, dynasty) for name, dynasty in artifacts
+            if args.force or store.get(narration_cache_key(name, dynasty, args.model, PROMPT_VERSION)) is None
+        ]
+    except sqlite3.Error as e:
+        sys.exit(f"讲解存储读取失败：{str(e)}（{sqlite_path}）")
+    if args.limit:
+        pending = pending[:args.limit]
+    print(f"文物共 {len(artifacts)} 件，已生成 {len(artifacts) - len(pending)} 件，"
+          f"本次需要生成 {len(pending)} 件（模型 {args.model}，提示词版本 {PROMPT_VERSION}）")
+    if args.dry_run or not pending:
+        return
+
+    api_key = NARRATION_CONFIG['api_key']
+    if not api_key:
+        sys.exit("API密钥未配置（NARRATION_API_KEY 或 DASH_SCOPE_API_KEY）")
+    generator = create_narration_generator(api_key, model=args.model)
+    breaker = generator.client.breaker
+    limiter = RateLimiter(args.rate)
+    # 中断时通知正在等待熔断恢复的线程立即退出
+    stopped = threading.Event()
+    pause_lock = threading.Lock()
+    paused_until = [0.0]
+
+    def wait_for_breaker():
+        """熔断期间暂停到熔断器放行试探请求（半开状态下未拿到试探名额时稍等再试）；已中断时返回 False"""
+        delay = max(breaker.retry_after(), 1.0)
+        with pause_lock:
+            if time.monotonic() >= paused_until[0]:
+                paused_until[0] = time.monotonic() + delay
+                print(f"讲解服务连续失败已熔断，暂停 {delay:.0f} 秒后继续")
+        return not stopped.wait(delay)
+
+    def generate(artifact):
+        name, dynasty = artifact
+        while True:
+            limiter.wait()
+            try:
+                narration = generator.request_narration(name, dynasty)
+                break
+            except CircuitOpenError:
+                if not wait_for_breaker():
+                    raise
+        store.set(narration_cache_key(name, dynasty, args.model, PROMPT_VERSION), narration,
+                  name=name, dynasty=dynasty, model=args.model, prompt_version=PROMPT_VERSION)
+
+    started_at = time.time()
+    succeeded = failed = 0
+    executor = ThreadPoolExecutor(max_workers=max(1, args.concurrency))
+    try:
+        futures = {executor.submit(generate, artifact): artifact for artifact in pending}
+        for future in as_completed(futures):
+            name, dynasty = futures[future]
+            try:
+                future.result()
+                succeeded += 1
+            except NarrationError as e:
+                failed += 1
+                print(f"  ❌ {name}（{dynasty}）：{str(e)}")
+            except sqlite3.Error as e:
+                # 讲解已经生成但写入失败（例如数据库被锁、磁盘已满），记为失败，重新运行即可重试
+                failed += 1
+                print(f"  ❌ {name}（{dynasty}）：讲解存储写入失败 {str(e)}")
+            done = succeeded + failed
+            if done % 10 == 0 or done == len(pending):
+                print(f"进度 {done}/{len(pending)}，成功 {succeeded}，失败 {failed}，"
+                      f"耗时 {time.time() - started_at:.1f} 秒")
+    except KeyboardInterrupt:
+        print("已中断，已生成的讲解已保存，重新运行即可继续")
+        stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        sys.exit(130)
+    finally:
+        executor.shutdown(wait=True)
+        generator.client.close()
+
+    print(f"完成：成功 {succeeded} 件，失败 {failed} 件（失败的条目重新运行即可重试）")
+
+
+if __name__ == '__main__':
+    main()
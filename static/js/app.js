@@ -29,76 +29,64 @@ document.getElementById('submit-image').addEventListener('click', async () => {
     formData.append('image', file);
     
     // API 端点配置 (来自 Flask 后端)
-    const RECOGNITION_ENDPOINT = BASE_URL + '/api/image-recognition';
-    const NARRATION_ENDPOINT = BASE_URL + '/api/artifact-narration';
+    const RECOGNIZE_AND_NARRATE_ENDPOINT = BASE_URL + '/api/recognize-and-narrate';
 
     try {
-        // --- 步骤 1: 调用图像识别接口 ---
-        
-        const recognitionResponse = await fetch(RECOGNITION_ENDPOINT, {
+        // 一次请求完成识别和讲解：服务端先推送识别结果，随后在同一个连接上逐段推送讲解文案
+        const response = await fetch(RECOGNIZE_AND_NARRATE_ENDPOINT, {
             method: 'POST',
             body: formData 
         });
 
-        // 检查HTTP状态码
-        if (!recognitionResponse.ok) {
-            throw new Error(`图像识别服务错误: ${recognitionResponse.status}`);
+        // 检查 HTTP 状态码（参数错误等情况仍返回 JSON）
+        if (!response.ok) {
+            let errorMessage = `图像识别服务错误: ${response.status}`;
+            try {
+                const errorResult = await response.json();
+                errorMessage = errorResult.error || errorMessage;
+            } catch (e) {
+                // 忽略非 JSON 响应
+            }
+            throw new Error(errorMessage);
         }
 
-        const recognitionResult = await recognitionResponse.json();
+        let narrationText = '';
 
-        if (!recognitionResult.success) {
-            throw new Error(recognitionResult.message || '图片识别失败。');
-        }
+        await readEventStream(response, {
+            // --- 步骤 1: 识别结果 ---
+            recognition: (recognitionResult) => {
+                if (!recognitionResult.success) {
+                    throw new Error(recognitionResult.error || '图片识别失败。');
+                }
 
-        const artifactData = recognitionResult.data;
-        
-        // 格式化并显示 JSON 数据
-        artifactInfoDetails.innerHTML = formatArtifactData(artifactData);
-        
-        statusMessage.textContent = '✅ 图片识别成功，正在生成文物讲解...';
-        statusMessage.className = 'mt-4 font-medium text-green-600';
+                // 格式化并显示 JSON 数据
+                artifactInfoDetails.innerHTML = formatArtifactData(recognitionResult.data);
 
+                statusMessage.textContent = '✅ 图片识别成功，正在生成文物讲解...';
+                statusMessage.className = 'mt-4 font-medium text-green-600';
 
-        // --- 步骤 2: 调用文物讲解生成接口 ---
-        
-        // 构造符合 artifact_api.py 要求的请求 JSON
-        const narrationRequestBody = {
-            // artifact_api.py 期望的字段名: name 和 dynasty
-            name: artifactData.artifact_name, 
-            dynasty: artifactData.era
-        };
-        
-        const narrationResponse = await fetch(NARRATION_ENDPOINT, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
+                // 识别结果先展示出来，讲解文案随后逐段追加
+                narrationOutput.textContent = '';
+                resultsSection.style.display = 'block';
+            },
+            // --- 步骤 2: 讲解文案，边生成边显示 ---
+            delta: (payload) => {
+                narrationOutput.textContent += payload.text;
+            },
+            done: (payload) => {
+                narrationText = payload.narration;
             },
-            body: JSON.stringify(narrationRequestBody) // 传入修正后的 body
+            error: (payload) => {
+                throw new Error(payload.error || '讲解生成失败。');
+            }
         });
 
-        // 检查 HTTP 状态码
-        if (!narrationResponse.ok) {
-             throw new Error(`讲解生成服务错误: ${narrationResponse.status}`);
-        }
-
-        // 讲解接口返回的是 JSON, 需要解析
-        const narrationResult = await narrationResponse.json(); 
-
-        if (!narrationResult.success) {
-            // 如果后端返回了错误信息，使用它
-            const errorMessage = narrationResult.error || narrationResult.message || '讲解生成失败。';
-            throw new Error(errorMessage);
+        // 使用服务端清理后的完整文案
+        if (narrationText) {
+            narrationOutput.innerText = narrationText;
         }
         
-        // 从返回的 JSON 中提取讲解文案
-        const narrationText = narrationResult.data.narration; 
-
-        // 直接将内容显示到输出区域
-        narrationOutput.innerText = narrationText;
-        
         statusMessage.textContent = '🎉 文物讲解生成成功！';
-        resultsSection.style.display = 'block';
 
     } catch (error) {
         statusMessage.textContent = '❌ 操作失败: ' + error.message;
@@ -109,6 +97,53 @@ document.getElementById('submit-image').addEventListener('click', async () => {
     }
 });
 
+/**
+ * 辅助函数：读取 Server-Sent Events 响应，按事件名调用对应的处理函数
+ * EventSource 只支持 GET 请求，这里用 fetch + ReadableStream 手动解析事件流
+ * @param {Response} response - fetch 返回的响应
+ * @param {object} handlers - 事件名到处理函数的映射，处理函数接收解析后的 JSON
+ */
+async function readEventStream(response, handlers) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+    let finished = false;
+
+    try {
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                finished = true;
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            // 事件之间以空行分隔
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let data = '';
+                for (const line of rawEvent.split('\n')) {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                }
+                const handler = handlers[eventName];
+                if (handler) {
+                    handler(data ? JSON.parse(data) : {});
+                }
+            }
+        }
+    } finally {
+        // 处理函数抛出异常（例如收到 error 事件）或解析失败时，取消读取，让浏览器关闭连接、服务端停止生成
+        if (!finished) {
+            reader.cancel().catch(() => {});
+        }
+    }
+}
+
 /**
  * 辅助函数：将文物 JSON 数据转化为用户友好的 HTML 列表
  * @param {object} data - 图像识别返回的 JSON 对象
@@ -119,6 +154,8 @@ function formatArtifactData(data) {
     // 定义一个映射，将 JSON key 转换为中文描述
     const keyMap = {
         'artifact_name': '文物名称',
+        'name': '文物名称',
+        'intro': '简介',
         'artifact_type': '类型',
         'confidence': '置信度',
         'description': '描述',
@@ -27,8 +27,8 @@ def test_artifact_recognizer():
             print("✗ 候选标签加载失败")
             return False
             
-        if hasattr(recognizer, 'artifact_df') and not recognizer.artifact_df.empty:
-            print(f"✓ 文物数据加载成功，共{len(recognizer.artifact_df)}条记录")
+        if hasattr(recognizer, 'label_index') and recognizer.label_index:
+            print(f"✓ 文物数据加载成功，共{len(recognizer.label_index)}条记录")
         else:
             print("✗ 文物数据加载失败")
             return False
@@ -42,9 +42,11 @@ def test_artifact_recognizer():
 def test_image_api():
     """测试image_api是否能正常导入"""
     try:
-        from api.image_api import image_api, recognizer
+        from api.image_api import image_api, engine_loader
         print("✓ image_api导入成功")
-        print("✓ 图像识别器已初始化")
+        # 等待后台加载完成（包括预热）
+        recognition_engine = engine_loader.load()
+        print(f"✓ 识别引擎已初始化: {type(recognition_engine).__name__}")
         return True
     except Exception as e:
         print(f"✗ image_api测试失败: {e}")
@@ -53,8 +55,7 @@ def test_image_api():
 def test_data_files():
     """测试数据文件是否存在"""
     data_files = [
-        'data/artifact_data.csv',
-        'data/candidate_labels.txt'
+        'data/artifact_data.csv'
     ]
     
     all_files_exist = True
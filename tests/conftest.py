@@ -0,0 +1,77 @@
+"""
+测试公共配置
+- 文物目录、讲解缓存等写入临时目录，不读写 data/ 下的文件
+- 用 FakeClipModel 代替 CLIP：调用方式与 clip.model.CLIP 一致，不需要下载模型权重，结果确定
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+import torch
+from torch import nn
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT_DIR)
+
+# config.py 在导入时读取环境变量，必须在导入任何项目模块之前设置
+TMP_DIR = tempfile.mkdtemp(prefix='artifact-tests-')
+os.environ['CATALOG_PATH'] = os.path.join(TMP_DIR, 'catalog.bin')
+os.environ['NARRATION_CACHE_DB'] = os.path.join(TMP_DIR, 'narrations.sqlite3')
+os.environ['INFERENCE_SERVER'] = '0'
+os.environ.pop('NARRATION_API_KEY', None)
+os.environ.pop('DASH_SCOPE_API_KEY', None)
+
+import clip  # noqa: E402
+from clip.clip import _transform  # noqa: E402
+
+FAKE_EMBEDDING_DIM = 32
+
+
+class FakeClipModel(nn.Module):
+    """测试用的 CLIP 替身：提供 visual.output_dim / encode_image / encode_text / dtype"""
+
+    def __init__(self, dim=FAKE_EMBEDDING_DIM, seed=0):
+        super().__init__()
+        torch.manual_seed(seed)
+        self.visual = nn.Sequential(nn.AdaptiveAvgPool2d(4), nn.Flatten(), nn.Linear(48, dim))
+        self.visual.output_dim = dim
+        self.visual.input_resolution = 224
+        self.token_embedding = nn.EmbeddingBag(49408, dim)
+
+    @property
+    def dtype(self):
+        return torch.float32
+
+    def encode_image(self, image):
+        return self.visual(image)
+
+    def encode_text(self, tokens):
+        return self.token_embedding(tokens)
+
+
+def fake_clip_load(name, device='cpu', **kwargs):
+    return FakeClipModel().to(device).eval(), _transform(224)
+
+
+# 应用模块导入时会在后台加载识别模型，这里在整个测试会话中替换掉 clip.load
+clip.load = fake_clip_load
+
+
+@pytest.fixture
+def fake_clip_model():
+    return FakeClipModel()
+
+
+@pytest.fixture
+def jpeg_bytes():
+    """生成指定颜色的 JPEG 图片字节流"""
+    import io
+    from PIL import Image
+
+    def make(color=(128, 128, 128), size=(64, 64)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'JPEG')
+        return buffer.getvalue()
+    return make
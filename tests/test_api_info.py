@@ -0,0 +1,14 @@
+"""/api 接口：返回接口文档，不包含密钥"""
+
+import config
+
+
+def test_api_info_does_not_expose_credentials(monkeypatch):
+    from app import app
+
+    monkeypatch.setitem(config.NARRATION_CONFIG, 'api_key', 'sk-should-not-leak')
+    response = app.test_client().get('/api')
+    assert response.status_code == 200
+    assert 'artifact_narration' in response.get_json()['apis']
+    assert b'sk-should-not-leak' not in response.data
+    assert b'api_key' not in response.data
@@ -0,0 +1,121 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from api.batch_scheduler import BatchScheduler
+from api.request_log import get_request_id, set_request_id
+
+
+class RecordingRecognizer:
+    """记录每个批次大小的识别器替身：图片的第一个字节即为它的"特征值\""""
+
+    def __init__(self, fail_batches=0):
+        self.batch_sizes = []
+        self.fail_batches = fail_batches
+
+    def process_image(self, image_input):
+        if image_input == b'bad':
+            return None
+        return torch.tensor([[float(image_input[0])]])
+
+    def _encode_images(self, image_tensor):
+        self.batch_sizes.append(image_tensor.shape[0])
+        if self.fail_batches:
+            self.fail_batches -= 1
+            raise RuntimeError('encode failed')
+        return image_tensor
+
+    def _search(self, image_features, top_k):
+        values = image_features.repeat(1, top_k)
+        indices = torch.arange(top_k).repeat(image_features.shape[0], 1)
+        return values, indices
+
+    def _build_results(self, values, indices, conf_threshold):
+        return {'success': True, 'result': [value.item() for value in values]}
+
+
+def recognize_concurrently(scheduler, inputs, top_ks=None):
+    top_ks = top_ks or [1] * len(inputs)
+    barrier = threading.Barrier(len(inputs))
+
+    def submit(args):
+        image_input, top_k = args
+        barrier.wait()
+        return scheduler.recognize(image_input, top_k=top_k)
+
+    with ThreadPoolExecutor(max_workers=len(inputs)) as executor:
+        return list(executor.map(submit, zip(inputs, top_ks)))
+
+
+def test_concurrent_requests_are_merged_into_one_batch():
+    recognizer = RecordingRecognizer()
+    scheduler = BatchScheduler(recognizer, max_batch_size=4, max_wait_ms=500)
+
+    results = recognize_concurrently(scheduler, [bytes([i]) for i in range(4)])
+
+    assert recognizer.batch_sizes == [4]
+    assert [result['result'] for result in results] == [[0.0], [1.0], [2.0], [3.0]]
+
+
+def test_batch_size_is_capped():
+    recognizer = RecordingRecognizer()
+    scheduler = BatchScheduler(recognizer, max_batch_size=2, max_wait_ms=200)
+
+    results = recognize_concurrently(scheduler, [bytes([i]) for i in range(5)])
+
+    assert max(recognizer.batch_sizes) <= 2
+    assert sum(recognizer.batch_sizes) == 5
+    assert sorted(result['result'][0] for result in results) == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+
+def test_each_request_keeps_its_own_top_k():
+    scheduler = BatchScheduler(RecordingRecognizer(), max_batch_size=2, max_wait_ms=500)
+
+    results = recognize_concurrently(scheduler, [b'\x01', b'\x02'], top_ks=[1, 3])
+
+    assert results[0]['result'] == [1.0]
+    assert results[1]['result'] == [2.0, 2.0, 2.0]
+
+
+def test_preprocessing_failure_is_not_queued():
+    recognizer = RecordingRecognizer()
+    scheduler = BatchScheduler(recognizer)
+
+    result = scheduler.recognize(b'bad')
+
+    assert result == {'success': False, 'error': '图片预处理失败'}
+    assert recognizer.batch_sizes == []
+
+
+def test_batch_failure_is_reported_to_every_request_and_worker_keeps_running():
+    recognizer = RecordingRecognizer(fail_batches=1)
+    scheduler = BatchScheduler(recognizer, max_batch_size=2, max_wait_ms=500)
+
+    failed = recognize_concurrently(scheduler, [b'\x01', b'\x02'])
+    assert all(not result['success'] and 'encode failed' in result['error'] for result in failed)
+
+    assert scheduler.recognize(b'\x03', top_k=1)['result'] == [3.0]
+
+
+def test_worker_runs_in_each_request_context(capsys):
+    """批处理线程在各请求自己的上下文中生成结果和输出日志，日志带上对应的请求ID"""
+    recognizer = RecordingRecognizer(fail_batches=1)
+    build_results = recognizer._build_results
+    recognizer._build_results = lambda *args: dict(build_results(*args), request_id=get_request_id())
+    scheduler = BatchScheduler(recognizer, max_batch_size=2, max_wait_ms=500)
+    barrier = threading.Barrier(2)
+
+    def submit(request_id):
+        set_request_id(request_id)
+        barrier.wait()
+        return scheduler.recognize(b'\x01')
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert not any(result['success'] for result in executor.map(submit, ['req-a', 'req-b']))
+    lines = capsys.readouterr().out.splitlines()
+    assert sorted(line.split(' ')[0] for line in lines if '批量识别失败' in line) == ['[req-a]', '[req-b]']
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(submit, ['req-c', 'req-d']))
+    assert [result['request_id'] for result in results] == ['req-c', 'req-d']
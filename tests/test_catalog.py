@@ -0,0 +1,134 @@
+"""文物目录编译：清洗、增量复用标签向量、结果确定、向量维度检查、标签冲突"""
+
+import csv
+
+import numpy as np
+import pytest
+
+from api import catalog_compiler
+from api.catalog import load_catalog, model_embedding_dim
+from api.catalog_compiler import compile_catalog
+
+from conftest import FakeClipModel
+
+MODEL_NAME = 'ViT-B/32'
+TEMPLATE = '{}'
+ROWS = [
+    ('兵马俑', '秦朝', '秦始皇陵陪葬坑出土'),
+    ('  司母戊鼎 ', '商朝', ''),
+    ('长信宫灯', '西汉', '出土于满城汉墓'),
+    ('兵马俑', '秦朝', '重复的行'),
+    ('', '唐代', '名称为空'),
+]
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'dynasty', 'intro'])
+        writer.writerows(rows)
+    return str(path)
+
+
+@pytest.fixture
+def encoded(monkeypatch):
+    """记录每次编译实际编码的标签"""
+    calls = []
+    original = catalog_compiler.encode_labels
+
+    def spy(model, labels, prompt_template, device, batch_size=256):
+        calls.append(list(labels))
+        return original(model, labels, prompt_template, device, batch_size)
+
+    monkeypatch.setattr(catalog_compiler, 'encode_labels', spy)
+    return calls
+
+
+def compile_with(model, source, output):
+    return compile_catalog(source, output, MODEL_NAME, TEMPLATE, model=model, device='cpu')
+
+
+def test_compile_cleans_and_normalises(tmp_path, fake_clip_model, encoded):
+    source = write_csv(tmp_path / 'data.csv', ROWS)
+    catalog = compile_with(fake_clip_model, source, str(tmp_path / 'catalog.bin'))
+
+    assert catalog.labels == ['兵马俑-秦朝', '司母戊鼎-商朝', '长信宫灯-西汉']
+    assert [record['intro'] for record in catalog.records()][:2] == ['秦始皇陵陪葬坑出土', '暂无介绍']
+    assert catalog.dim == model_embedding_dim(fake_clip_model) == 32
+    assert np.allclose(np.linalg.norm(catalog.embeddings, axis=1), 1, atol=1e-5)
+    assert catalog.is_current(MODEL_NAME, TEMPLATE, dim=32)
+    assert not catalog.is_current(MODEL_NAME, TEMPLATE, dim=512)
+
+
+def test_incremental_compile_reuses_embeddings(tmp_path, fake_clip_model, encoded):
+    output = str(tmp_path / 'catalog.bin')
+    first = compile_with(fake_clip_model, write_csv(tmp_path / 'v1.csv', ROWS), output)
+    first_embeddings = np.array(first.embeddings)
+
+    # 只改简介：不需要编码；新增一行：只编码新增的标签
+    rows = [('兵马俑', '秦朝', '新的简介')] + ROWS[1:] + [('金缕玉衣', '西汉', '')]
+    second = compile_with(fake_clip_model, write_csv(tmp_path / 'v2.csv', rows), output)
+    assert encoded == [['兵马俑-秦朝', '司母戊鼎-商朝', '长信宫灯-西汉'], ['金缕玉衣-西汉']]
+    assert np.array_equal(np.array(second.embeddings[:3]), first_embeddings)
+    assert second.records()[0]['intro'] == '新的简介'
+
+
+def test_compile_is_deterministic(tmp_path, fake_clip_model):
+    source = write_csv(tmp_path / 'data.csv', ROWS)
+    first = compile_with(fake_clip_model, source, str(tmp_path / 'a.bin'))
+    second = compile_catalog(source, str(tmp_path / 'b.bin'), MODEL_NAME, TEMPLATE,
+                             model=fake_clip_model, device='cpu', incremental=False)
+    assert first.content_hash == second.content_hash
+
+
+def test_dim_mismatch_forces_full_reencode(tmp_path, encoded):
+    source = write_csv(tmp_path / 'data.csv', ROWS)
+    output = str(tmp_path / 'catalog.bin')
+    compile_with(FakeClipModel(dim=64), source, output)
+
+    # 同名模型换成了不同维度的权重：不能复用旧向量
+    catalog = compile_with(FakeClipModel(dim=32), source, output)
+    assert catalog.dim == 32
+    assert len(encoded) == 2 and len(encoded[1]) == 3
+
+
+def test_recognizer_recompiles_on_dim_mismatch(tmp_path, monkeypatch, fake_clip_model):
+    import config
+    from api.artifact_recognizer import ArtifactRecognizer
+
+    source = write_csv(tmp_path / 'data.csv', ROWS)
+    output = str(tmp_path / 'catalog.bin')
+    compile_with(FakeClipModel(dim=64), source, output)
+    monkeypatch.setitem(config.RECOGNIZER_CONFIG['catalog'], 'path', output)
+    monkeypatch.setitem(config.RECOGNIZER_CONFIG['catalog'], 'source', source)
+
+    recognizer = ArtifactRecognizer()
+    assert recognizer.catalog.dim == 32
+    assert load_catalog(output).dim == 32
+
+
+def test_label_collisions_are_deduplicated(tmp_path, fake_clip_model, capsys):
+    rows = [('a-b', 'c', '第一件'), ('a', 'b-c', '第二件'), ('d', 'e', '')]
+    source = write_csv(tmp_path / 'data.csv', rows)
+    catalog = compile_with(fake_clip_model, source, str(tmp_path / 'catalog.bin'))
+
+    assert catalog.labels == ['a-b-c', 'd-e']
+    assert catalog.records()[0] == {'name': 'a-b', 'dynasty': 'c', 'intro': '第一件'}
+    assert '标签 a-b-c 对应多件文物' in capsys.readouterr().out
+
+    # 再次增量编译时复用全部向量
+    assert len(compile_with(fake_clip_model, source, str(tmp_path / 'catalog.bin'))) == 2
+
+
+def test_previous_catalog_with_duplicate_labels(tmp_path, fake_clip_model, encoded):
+    from api.catalog import write_catalog
+
+    output = str(tmp_path / 'catalog.bin')
+    entries = [{'label': label, 'name': label, 'dynasty': '', 'intro': ''} for label in ['x-y', 'x-y', 'd-e']]
+    embeddings = np.eye(3, 32, dtype=np.float32)
+    write_catalog(output, entries, embeddings, model_name=MODEL_NAME, prompt_template=TEMPLATE, source_hash='')
+
+    catalog = compile_with(fake_clip_model, write_csv(tmp_path / 'data.csv', [('x', 'y', ''), ('d', 'e', '')]),
+                           output)
+    assert encoded == []
+    assert np.array_equal(np.array(catalog.embeddings), embeddings[[0, 2]])
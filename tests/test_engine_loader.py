@@ -0,0 +1,190 @@
+"""识别引擎后台加载：状态变化（pending → loading → ready / failed），以及加载期间健康检查和识别接口的503响应"""
+
+import importlib.util
+import io
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from api import image_api
+from api.engine import EngineLoader
+
+SERVICE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '图像识别接口', 'service.py')
+
+
+class WarmEngine:
+    """记录预热次数的识别引擎"""
+
+    def __init__(self):
+        self.warm_ups = 0
+
+    def warm_up(self):
+        self.warm_ups += 1
+
+    def recognize(self, image_input, top_k=3, conf_threshold=0.2):
+        return {'success': True, 'result': [{'name': '兵马俑', 'dynasty': '秦朝', 'intro': '', 'confidence': 0.9}]}
+
+
+class BlockingFactory:
+    """创建引擎时阻塞，直到测试放行；fail 为 True 时放行后抛出异常"""
+
+    def __init__(self, fail=False):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.fail = fail
+        self.engine = WarmEngine()
+
+    def __call__(self):
+        self.started.set()
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError('权重文件下载失败')
+        return self.engine
+
+
+def wait_for_state(loader, *states, timeout=5):
+    deadline = time.monotonic() + timeout
+    while loader.state not in states:
+        assert time.monotonic() < deadline, f"加载状态一直是 {loader.state}"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def factory():
+    factory = BlockingFactory()
+    yield factory
+    factory.release.set()
+
+
+def test_background_load_transitions_to_ready(factory):
+    loader = EngineLoader(factory)
+    assert loader.status() == {'state': 'pending', 'error': None, 'load_seconds': None}
+    assert loader.get() is None and not loader.ready
+
+    loader.start('background')
+    assert factory.started.wait(5)
+    assert loader.state == 'loading'
+    assert loader.get() is None and not loader.ready
+
+    factory.release.set()
+    wait_for_state(loader, 'ready')
+    assert loader.get() is factory.engine and loader.ready
+    assert factory.engine.warm_ups == 1
+    assert loader.status()['load_seconds'] is not None
+
+    # 重复加载直接返回已加载的引擎，不再预热
+    assert loader.load() is factory.engine
+    assert factory.engine.warm_ups == 1
+
+
+def test_background_load_failure_is_recorded(capsys):
+    factory = BlockingFactory(fail=True)
+    loader = EngineLoader(factory)
+    loader.start('background')
+    factory.release.set()
+    wait_for_state(loader, 'failed')
+    assert loader.get() is None and not loader.ready
+    assert loader.status()['error'] == '权重文件下载失败'
+    assert '识别引擎加载失败' in capsys.readouterr().out
+
+
+def test_eager_load_raises_on_failure():
+    factory = BlockingFactory(fail=True)
+    factory.release.set()
+    loader = EngineLoader(factory)
+    with pytest.raises(RuntimeError):
+        loader.start('eager')
+    assert loader.state == 'failed'
+
+
+@pytest.fixture
+def loading(monkeypatch, factory):
+    """换上正在后台加载的引擎加载器（app.py 按名称导入了 engine_loader，两处都要替换）"""
+    import app
+
+    loader = EngineLoader(factory)
+    monkeypatch.setattr(image_api, 'engine_loader', loader)
+    monkeypatch.setattr(app, 'engine_loader', loader)
+    loader.start('background')
+    assert factory.started.wait(5)
+    return loader
+
+
+def test_flask_endpoints_while_loading(loading, factory, jpeg_bytes):
+    from app import app
+
+    client = app.test_client()
+    assert client.get('/healthz').status_code == 200
+
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert response.get_json()['state'] == 'loading'
+
+    response = client.post('/api/image-recognition/',
+                           data={'image': (io.BytesIO(jpeg_bytes()), 'a.jpg')})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert '正在加载' in response.get_json()['error']
+
+    factory.release.set()
+    wait_for_state(loading, 'ready')
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert 'Retry-After' not in response.headers
+
+
+def test_flask_endpoints_after_failure(monkeypatch, jpeg_bytes):
+    import app as app_module
+
+    factory = BlockingFactory(fail=True)
+    factory.release.set()
+    loader = EngineLoader(factory)
+    loader.start('background')
+    wait_for_state(loader, 'failed')
+    monkeypatch.setattr(image_api, 'engine_loader', loader)
+    monkeypatch.setattr(app_module, 'engine_loader', loader)
+
+    client = app_module.app.test_client()
+    response = client.get('/healthz')
+    assert response.status_code == 503
+    assert response.get_json() == {'status': 'failed', 'error': '权重文件下载失败'}
+    assert client.get('/readyz').status_code == 503
+
+    response = client.post('/api/image-recognition/',
+                           data={'image': (io.BytesIO(jpeg_bytes()), 'a.jpg')})
+    assert response.status_code == 503
+    assert '权重文件下载失败' in response.get_json()['error']
+
+
+def test_fastapi_endpoints_while_loading(monkeypatch, factory, jpeg_bytes):
+    from starlette.testclient import TestClient
+
+    spec = importlib.util.spec_from_file_location('recognition_service', SERVICE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, 'recognition_service', module)
+    spec.loader.exec_module(module)
+    loader = EngineLoader(factory)
+    monkeypatch.setattr(module, 'engine_loader', loader)
+    loader.start('background')
+    assert factory.started.wait(5)
+
+    client = TestClient(module.app)
+    assert client.get('/healthz').status_code == 200
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+    response = client.post('/recognize', files={'file': ('a.jpg', jpeg_bytes(), 'image/jpeg')})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert response.json()['success'] is False
+
+    factory.release.set()
+    wait_for_state(loader, 'ready')
+    assert client.get('/readyz').status_code == 200
+    response = client.post('/recognize', files={'file': ('a.jpg', jpeg_bytes(), 'image/jpeg')})
+    assert response.status_code == 200
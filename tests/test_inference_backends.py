@@ -0,0 +1,60 @@
+"""图片编码推理后端：不可用时回退到 torch 并打印原因，int8 量化与原始精度的识别结果一致"""
+
+import torch
+
+from api.inference_backends import (
+    OnnxImageEncoder, QuantizedImageEncoder, TorchImageEncoder, create_image_encoder
+)
+
+
+def backend_config(backend, onnx_path='/nonexistent/clip_image_encoder.onnx'):
+    return {'backend': backend, 'onnx_path': onnx_path, 'onnx_threads': 0}
+
+
+def test_torch_backend(fake_clip_model):
+    encoder = create_image_encoder(fake_clip_model, 'cpu', backend_config('torch'))
+    assert isinstance(encoder, TorchImageEncoder)
+    assert encoder.name == 'torch'
+
+
+def test_unavailable_onnx_falls_back_to_torch(fake_clip_model, capsys):
+    # 未安装 onnxruntime（ImportError）或模型文件不存在（FileNotFoundError）时都回退
+    encoder = create_image_encoder(fake_clip_model, 'cpu', backend_config('onnx'))
+    assert isinstance(encoder, TorchImageEncoder)
+    assert not isinstance(encoder, OnnxImageEncoder)
+    assert '推理后端 onnx 初始化失败，使用 torch 后端' in capsys.readouterr().out
+
+
+def test_failing_int8_falls_back_to_torch(fake_clip_model, capsys, monkeypatch):
+    def unsupported(*args, **kwargs):
+        raise RuntimeError('quantized engine unavailable')
+
+    monkeypatch.setattr(torch.ao.quantization, 'quantize_dynamic', unsupported)
+    encoder = create_image_encoder(fake_clip_model, 'cpu', backend_config('torch_int8'))
+    assert isinstance(encoder, TorchImageEncoder)
+    output = capsys.readouterr().out
+    assert '推理后端 torch_int8 初始化失败，使用 torch 后端' in output
+    assert 'quantized engine unavailable' in output
+
+
+def test_cpu_only_backend_on_gpu_falls_back(fake_clip_model, capsys):
+    encoder = create_image_encoder(fake_clip_model, 'cuda', backend_config('torch_int8'))
+    assert isinstance(encoder, TorchImageEncoder)
+    assert '只支持CPU' in capsys.readouterr().out
+
+
+def test_int8_top1_matches_fp32(fake_clip_model):
+    torch.manual_seed(1)
+    images = torch.randn(16, 3, 224, 224)
+    labels = torch.nn.functional.normalize(torch.randn(50, fake_clip_model.visual.output_dim), dim=-1)
+
+    def top1(encoder):
+        features = torch.nn.functional.normalize(encoder.encode(images).float(), dim=-1)
+        return (features @ labels.T).argmax(dim=-1)
+
+    fp32 = TorchImageEncoder(fake_clip_model)
+    int8 = create_image_encoder(fake_clip_model, 'cpu', backend_config('torch_int8'))
+    assert isinstance(int8, QuantizedImageEncoder)
+    assert torch.equal(top1(int8), top1(fp32))
+    # 量化只作用于副本，原模型保持原始精度
+    assert isinstance(fake_clip_model.visual[2], torch.nn.Linear)
@@ -0,0 +1,135 @@
+import os
+import socket
+import stat
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Listener
+
+import pytest
+
+from api.inference_client import InferenceClient
+from api.inference_server import InferenceServer, prepare_socket_path
+
+AUTHKEY = b'test-secret'
+
+
+class EchoEngine:
+    def recognize(self, image_input, top_k=3, conf_threshold=0.2):
+        return {"success": True, "result": [{"name": image_input.decode(), "top_k": top_k}]}
+
+    def recognize_batch(self, image_inputs, top_k=3, conf_threshold=0.2):
+        return [self.recognize(image_input, top_k) for image_input in image_inputs]
+
+
+@pytest.fixture
+def socket_dir():
+    # mkdtemp 创建的目录权限为 0700；路径较短，不会超过 Unix socket 路径长度限制
+    # 后台线程中的推理服务在进程退出时才清理 socket 文件，这里不删除目录
+    return tempfile.mkdtemp(prefix='inf-')
+
+
+def wait_for_socket(address, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(address):
+        assert time.monotonic() < deadline, "推理服务没有启动"
+        time.sleep(0.01)
+
+
+def test_server_and_client_require_authkey(socket_dir):
+    address = os.path.join(socket_dir, 'inference.sock')
+    with pytest.raises(ValueError):
+        InferenceServer(EchoEngine(), address, b'')
+    with pytest.raises(ValueError):
+        InferenceClient(address, b'')
+
+
+def test_round_trip_over_private_socket(socket_dir):
+    address = os.path.join(socket_dir, 'run', 'inference.sock')
+    server = InferenceServer(EchoEngine(), address, AUTHKEY)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    wait_for_socket(address)
+
+    assert stat.S_IMODE(os.stat(os.path.dirname(address)).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+
+    client = InferenceClient(address, AUTHKEY, timeout=5)
+    assert client.recognize(b'bronze', top_k=2)['result'] == [{"name": "bronze", "top_k": 2}]
+    assert [item['success'] for item in client.recognize_batch([b'a', b'b'])] == [True, True]
+
+    # 推理进程未开启结果缓存
+    assert client.cache_stats() is None
+
+    # 已有推理服务在监听时，第二个服务不能删掉它的 socket
+    with pytest.raises(RuntimeError):
+        prepare_socket_path(address)
+
+
+def test_cache_stats_endpoint_without_remote_cache(socket_dir, monkeypatch):
+    from api import image_api
+    from api.engine import EngineLoader
+    from app import app
+
+    address = os.path.join(socket_dir, 'inference.sock')
+    server = InferenceServer(EchoEngine(), address, AUTHKEY)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    wait_for_socket(address)
+
+    client = InferenceClient(address, AUTHKEY, timeout=5)
+    loader = EngineLoader(lambda: client)
+    loader.load()
+    monkeypatch.setattr(image_api, 'engine_loader', loader)
+    response = app.test_client().get('/api/image-recognition/cache-stats')
+    assert response.status_code == 404
+    assert response.get_json()['success'] is False
+
+
+def test_refuses_to_unlink_other_files(socket_dir):
+    address = os.path.join(socket_dir, 'inference.sock')
+    with open(address, 'w') as f:
+        f.write('not a socket')
+    with pytest.raises(RuntimeError):
+        prepare_socket_path(address)
+    assert os.path.exists(address)
+
+
+def test_refuses_shared_directory(socket_dir):
+    os.chmod(socket_dir, 0o755)
+    with pytest.raises(RuntimeError):
+        prepare_socket_path(os.path.join(socket_dir, 'inference.sock'))
+
+
+def test_removes_stale_socket(socket_dir):
+    address = os.path.join(socket_dir, 'inference.sock')
+    # 绑定后不监听直接关闭，模拟进程异常退出后残留的 socket 文件
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(address)
+    sock.close()
+    assert os.path.exists(address)
+
+    prepare_socket_path(address)
+    assert not os.path.exists(address)
+
+
+def test_client_times_out_when_server_hangs(socket_dir):
+    address = os.path.join(socket_dir, 'inference.sock')
+    listener = Listener(address, family='AF_UNIX', authkey=AUTHKEY)
+    hung = threading.Event()
+
+    def accept_and_hang():
+        conn = listener.accept()
+        conn.recv()
+        hung.wait(10)
+        conn.close()
+
+    threading.Thread(target=accept_and_hang, daemon=True).start()
+    client = InferenceClient(address, AUTHKEY, timeout=0.2)
+    started_at = time.monotonic()
+    result = client.recognize(b'bronze')
+    elapsed = time.monotonic() - started_at
+    hung.set()
+    listener.close()
+
+    assert not result['success']
+    assert '超时' in result['error']
+    assert elapsed < 2
@@ -0,0 +1,66 @@
+"""Prometheus 指标的文本格式输出，以及 /metrics 接口和请求ID响应头"""
+
+import re
+
+from api.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_counter_exposition():
+    counter = Counter('demo_requests_total', '请求数', labelnames=('status',))
+    counter.inc(status='200')
+    counter.inc(2, status='200')
+    counter.inc(status='a"b\\c')
+    assert counter.render().split('\n') == [
+        '# HELP demo_requests_total 请求数',
+        '# TYPE demo_requests_total counter',
+        'demo_requests_total{status="200"} 3',
+        'demo_requests_total{status="a\\"b\\\\c"} 1',
+    ]
+
+
+def test_histogram_exposition():
+    histogram = Histogram('demo_seconds', '耗时', labelnames=('stage',), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2.5):
+        histogram.observe(value, stage='encode')
+    assert histogram.render().split('\n')[2:] == [
+        'demo_seconds_bucket{stage="encode",le="0.1"} 2',
+        'demo_seconds_bucket{stage="encode",le="1"} 3',
+        'demo_seconds_bucket{stage="encode",le="+Inf"} 4',
+        'demo_seconds_sum{stage="encode"} 3.15',
+        'demo_seconds_count{stage="encode"} 4',
+    ]
+    assert histogram.render().split('\n')[1] == '# TYPE demo_seconds histogram'
+
+
+def test_gauge_function_read_at_render_time():
+    gauge = Gauge('demo_queue_depth', '队列长度', labelnames=('queue',))
+    depth = [3]
+    gauge.set_function(lambda: depth[0], queue='batch')
+    gauge.set(1, queue='manual')
+    registry = Registry()
+    registry.register(gauge)
+    assert 'demo_queue_depth{queue="batch"} 3' in registry.render()
+    depth[0] = 5
+    text = registry.render()
+    assert 'demo_queue_depth{queue="batch"} 5' in text
+    assert 'demo_queue_depth{queue="manual"} 1' in text
+    assert text.endswith('\n')
+
+
+def test_metrics_endpoint_and_request_id():
+    from app import app
+
+    client = app.test_client()
+    response = client.get('/healthz', headers={'X-Request-ID': 'upstream-id'})
+    assert response.headers['X-Request-ID'] == 'upstream-id'
+    generated = client.get('/healthz').headers['X-Request-ID']
+    assert re.fullmatch(r'[0-9a-f]{16}', generated)
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE artifact_http_requests_total counter' in text
+    assert re.search(r'artifact_http_requests_total\{endpoint="/healthz",method="GET",status="200"\} \d+', text)
+    assert re.search(r'artifact_http_request_seconds_bucket\{endpoint="/healthz",le="\+Inf"\} \d+', text)
+    assert 'artifact_http_request_seconds_count{endpoint="/healthz"}' in text
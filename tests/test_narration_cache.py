@@ -0,0 +1,267 @@
+"""讲解缓存：single-flight 合并、失败不缓存、SQLite 持久化以及 fork 后的连接隔离"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from api.narration_cache import NarrationCache, NarrationStore, narration_cache_key
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / 'cache' / 'narrations.sqlite3')
+
+
+def test_concurrent_requests_generate_once():
+    cache = NarrationCache()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def generate():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return '我是秦朝的兵马俑。'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_generate('k', generate)))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_generate('k', generate)))
+                 for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    # 等待跟随的请求都挂在同一个 Future 上
+    deadline = time.monotonic() + 5
+    while cache.stats()['coalesced'] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == ['我是秦朝的兵马俑。'] * 5
+    stats = cache.stats()
+    assert (stats['misses'], stats['coalesced']) == (1, 4)
+    assert cache.get_or_generate('k', generate) == '我是秦朝的兵马俑。'
+    assert cache.stats()['hits'] == 1
+
+
+def test_failure_propagates_and_is_not_cached():
+    cache = NarrationCache()
+
+    def failing():
+        raise RuntimeError('上游失败')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_generate('k', failing)
+    assert cache.get('k') is None
+    assert cache.get_or_generate('k', lambda: '讲解') == '讲解'
+
+
+def test_store_is_lazy_and_persistent(store_path):
+    store = NarrationStore(store_path)
+    assert not os.path.exists(store_path)
+
+    key = narration_cache_key('兵马俑', '秦朝', 'qwen-turbo', 'v1')
+    NarrationCache(store=store).get_or_generate(
+        key, lambda: '我是兵马俑。', name='兵马俑', dynasty='秦朝', model='qwen-turbo', prompt_version='v1')
+
+    # 新的缓存实例（相当于进程重启）从 SQLite 读回讲解
+    reopened = NarrationCache(store=NarrationStore(store_path))
+    assert reopened.get(key) == '我是兵马俑。'
+    assert reopened.store.latest('兵马俑', '秦朝') == '我是兵马俑。'
+
+
+def test_each_thread_has_its_own_connection(store_path):
+    store = NarrationStore(store_path)
+    connections = []
+    thread = threading.Thread(target=lambda: connections.append(store._connect()))
+    thread.start()
+    thread.join()
+    assert store._connect() is not connections[0]
+
+
+def test_new_connection_after_fork(store_path, monkeypatch):
+    store = NarrationStore(store_path)
+    store.set('k', '讲解')
+    parent_conn = store._connect()
+
+    # 模拟 fork 出的 worker：进程号变化后不再使用父进程的连接，也不关闭它
+    monkeypatch.setattr(os, 'getpid', lambda: -1)
+    child_conn = store._connect()
+    assert child_conn is not parent_conn
+    assert [local.conn for local in store._local._inherited] == [parent_conn]
+    assert store.get('k') == '讲解'
+    assert store._connect() is child_conn
+    parent_conn.execute('SELECT 1')
+
+
+class LockedStore:
+    """每次读写都失败的持久化存储（数据库被锁）"""
+
+    def get(self, cache_key):
+        raise sqlite3.OperationalError('database is locked')
+
+    def latest(self, name, dynasty):
+        raise sqlite3.OperationalError('database is locked')
+
+    def set(self, cache_key, narration, **metadata):
+        raise sqlite3.OperationalError('database is locked')
+
+
+def test_store_errors_are_cache_misses(capsys):
+    cache = NarrationCache(store=LockedStore())
+    assert cache.get('k') is None
+    assert cache.get_or_generate('k', lambda: '讲解') == '讲解'
+    assert cache.get('k') == '讲解'
+    assert '讲解缓存读取失败' in capsys.readouterr().out
+
+
+def test_fallback_survives_store_errors(monkeypatch):
+    from api import artifact_api
+
+    monkeypatch.setattr(artifact_api, 'narration_cache', NarrationCache(store=LockedStore()))
+    monkeypatch.setitem(artifact_api.fallback_config, 'enabled', True)
+    monkeypatch.setattr(artifact_api, 'fallback_intros', {('兵马俑', '秦朝'): '秦始皇陵陪葬坑出土。'})
+    assert artifact_api.fallback_narration('兵马俑', '秦朝') == '我是秦朝的兵马俑。秦始皇陵陪葬坑出土。'
+
+
+class ControlledStream:
+    """按测试的节奏逐段产出文字的上游流"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = 0
+        self.closed = False
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        return self._generate()
+
+    def _generate(self):
+        try:
+            self.started.set()
+            for i, text in enumerate(self.chunks):
+                if i == 1:
+                    self.release.wait(5)
+                yield text
+        finally:
+            self.closed = True
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_concurrent_streams_share_one_upstream_call():
+    cache = NarrationCache()
+    upstream = ControlledStream([' 我是', '兵马俑', '。 '])
+    leader = cache.stream_or_generate('k', upstream, str.strip)
+    assert next(leader) == ('delta', ' 我是')
+
+    results = {}
+    streaming = threading.Thread(target=lambda: results.update(stream=list(
+        cache.stream_or_generate('k', upstream, str.strip))))
+    waiting = threading.Thread(target=lambda: results.update(plain=cache.get_or_generate('k', lambda: '另一段')))
+    streaming.start()
+    waiting.start()
+    wait_for(lambda: cache.stats()['coalesced'] == 2)
+    upstream.release.set()
+
+    assert list(leader) == [('delta', '兵马俑'), ('delta', '。 '), ('done', '我是兵马俑。')]
+    streaming.join(5)
+    waiting.join(5)
+    assert upstream.calls == 1
+    # 跟随的流式请求从头收到全部文字
+    assert results['stream'] == [('delta', ' 我是'), ('delta', '兵马俑'), ('delta', '。 '), ('done', '我是兵马俑。')]
+    assert results['plain'] == '我是兵马俑。'
+    assert list(cache.stream_or_generate('k', upstream, str.strip)) == [('delta', '我是兵马俑。'),
+                                                                      ('done', '我是兵马俑。')]
+
+
+def test_stream_follows_plain_leader():
+    cache = NarrationCache()
+    started, release = threading.Event(), threading.Event()
+
+    def generate():
+        started.set()
+        release.wait(5)
+        return '我是兵马俑。'
+
+    leader = threading.Thread(target=lambda: cache.get_or_generate('k', generate))
+    leader.start()
+    assert started.wait(5)
+    follower = cache.stream_or_generate('k', ControlledStream(['不会被调用']), str.strip)
+    release.set()
+    assert list(follower) == [('delta', '我是兵马俑。'), ('done', '我是兵马俑。')]
+    leader.join(5)
+
+
+def test_leader_disconnect_keeps_generating_for_followers():
+    cache = NarrationCache()
+    upstream = ControlledStream(['我是', '兵马俑。'])
+    leader = cache.stream_or_generate('k', upstream, str.strip)
+    next(leader)
+
+    results = []
+    follower = threading.Thread(target=lambda: results.extend(cache.stream_or_generate('k', upstream, str.strip)))
+    follower.start()
+    wait_for(lambda: cache.stats()['coalesced'] == 1)
+    upstream.release.set()
+    # 领头请求的客户端断开：继续读完上游，结果交给跟随的请求并写入缓存
+    leader.close()
+    follower.join(5)
+    assert results[-1] == ('done', '我是兵马俑。')
+    assert cache.get('k') == '我是兵马俑。'
+
+
+def test_leader_disconnect_without_followers_stops_upstream():
+    cache = NarrationCache()
+    upstream = ControlledStream(['我是', '兵马俑。'])
+    leader = cache.stream_or_generate('k', upstream, str.strip)
+    next(leader)
+    leader.close()
+    assert upstream.closed
+    assert cache.get('k') is None
+    assert cache._inflight == {}
+
+
+def test_stream_failure_reaches_followers():
+    cache = NarrationCache()
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('上游失败')
+        yield
+
+    errors = []
+
+    def follow():
+        try:
+            list(cache.stream_or_generate('k', failing, str.strip))
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=follow)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=follow)
+    follower.start()
+    wait_for(lambda: cache.stats()['coalesced'] == 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert len(errors) == 2
+    assert cache.get('k') is None
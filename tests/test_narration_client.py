@@ -0,0 +1,82 @@
+"""讲解上游客户端：密钥随请求发送、流式增量输出、错误状态码以及连接复用"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api.narration_client import DashScopeClient, NarrationError
+
+
+class GenerationHandler(BaseHTTPRequestHandler):
+    """按 DashScope 文本生成接口格式返回固定文本的上游替身"""
+
+    protocol_version = 'HTTP/1.1'
+    status = 200
+    pieces = ['我是', '兵马俑。']
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append((self.client_address, self.headers['Authorization'], body))
+        if self.status != 200:
+            return self._send(self.status, 'application/json', b'{"code": "Throttling"}')
+        if body['parameters'].get('incremental_output'):
+            events = ''.join(f"data:{json.dumps({'output': {'text': piece}}, ensure_ascii=False)}\n\n"
+                             for piece in self.pieces)
+            return self._send(200, 'text/event-stream', events.encode('utf-8'))
+        text = json.dumps({'output': {'text': ''.join(self.pieces)}}, ensure_ascii=False)
+        self._send(200, 'application/json', text.encode('utf-8'))
+
+    def _send(self, status, content_type, data):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def upstream():
+    """启动上游替身，返回 (服务地址, 请求记录)"""
+    servers = []
+
+    def start(status=200):
+        handler = type('Handler', (GenerationHandler,), {'status': status})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        server.requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}", server.requests
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_generate_and_stream(upstream):
+    base_url, requests = upstream()
+    client = DashScopeClient('sk-test', base_url=base_url)
+    assert client.generate('qwen-turbo', '介绍兵马俑', max_tokens=500) == '我是兵马俑。'
+    assert list(client.stream('qwen-turbo', '介绍兵马俑')) == ['我是', '兵马俑。']
+
+    assert [authorization for _, authorization, _ in requests] == ['Bearer sk-test'] * 2
+    assert requests[0][2]['parameters']['max_tokens'] == 500
+    # 两次调用复用同一个 keep-alive 连接
+    assert requests[0][0] == requests[1][0]
+    client.close()
+
+
+def test_error_status_raises(upstream):
+    base_url, _ = upstream(status=429)
+    client = DashScopeClient('sk-test', base_url=base_url)
+    with pytest.raises(NarrationError, match='429'):
+        client.generate('qwen-turbo', '介绍兵马俑')
+    with pytest.raises(NarrationError, match='429'):
+        list(client.stream('qwen-turbo', '介绍兵马俑'))
+    client.close()
@@ -0,0 +1,114 @@
+"""流式讲解接口（SSE）：事件格式、兜底讲解，以及相同文物的并发请求只调用一次上游（使用本地讲解模拟服务）"""
+
+import json
+import random
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from api import artifact_api
+from api.artifact_ai_generator import ArtifactAIGenerator
+from api.fake_narration_server import FakeNarrationHandler
+from api.narration_cache import NarrationCache
+from api.narration_client import DashScopeClient
+
+ARTIFACT = {'name': '兵马俑', 'dynasty': '秦朝'}
+
+
+@pytest.fixture
+def narration_backend(monkeypatch):
+    """启动讲解模拟服务并换上指向它的讲解生成器，返回上游请求记录"""
+    servers = []
+
+    def start(cache=True, **options):
+        requests = []
+
+        class Handler(FakeNarrationHandler):
+            first_token_delay = 0.0
+            tokens_per_second = 0
+            length = 20
+            rng = random.Random(0)
+
+            def do_POST(self):
+                requests.append(self.path)
+                super().do_POST()
+
+        for key, value in options.items():
+            setattr(Handler, key, value)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+        client = DashScopeClient('sk-test', base_url=f"http://127.0.0.1:{server.server_address[1]}", read_timeout=5)
+        monkeypatch.setattr(artifact_api, 'narration_generator', ArtifactAIGenerator(client=client))
+        monkeypatch.setattr(artifact_api, 'narration_cache', NarrationCache() if cache else None)
+        return requests
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
+
+
+def read_events(response):
+    """解析 SSE 响应体，返回 (事件名, 数据) 列表"""
+    events = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+@pytest.mark.parametrize('cache', [True, False])
+def test_stream_events(client, narration_backend, cache):
+    narration_backend(cache=cache)
+    response = client.post('/api/artifact-narration/stream', json=ARTIFACT)
+    assert response.mimetype == 'text/event-stream'
+    events = read_events(response)
+    assert [name for name, _ in events[:-1]] == ['delta'] * (len(events) - 1)
+    assert events[-1][0] == 'done'
+    narration = events[-1][1]['narration']
+    assert narration.startswith('我是兵马俑')
+    assert ''.join(data['text'] for _, data in events[:-1]).strip() == narration
+
+
+def test_stream_falls_back_before_first_chunk(client, narration_backend, monkeypatch):
+    narration_backend(error_rate=1.0, error_status=400)
+    monkeypatch.setitem(artifact_api.fallback_config, 'enabled', True)
+    monkeypatch.setattr(artifact_api, 'fallback_intros', {('兵马俑', '秦朝'): '秦始皇陵陪葬坑出土'})
+    events = read_events(client.post('/api/artifact-narration/stream', json=ARTIFACT))
+    assert events == [('delta', {'text': '我是秦朝的兵马俑。秦始皇陵陪葬坑出土。'}),
+                      ('done', dict(ARTIFACT, narration='我是秦朝的兵马俑。秦始皇陵陪葬坑出土。'))]
+
+    monkeypatch.setattr(artifact_api, 'fallback_intros', {})
+    events = read_events(client.post('/api/artifact-narration/stream', json=ARTIFACT))
+    assert [name for name, _ in events] == ['error']
+
+
+def test_concurrent_streams_call_upstream_once(client, narration_backend):
+    requests = narration_backend(first_token_delay=0.3)
+    narrations = []
+
+    def stream():
+        events = read_events(client.post('/api/artifact-narration/stream', json=ARTIFACT))
+        narrations.append(events[-1][1]['narration'])
+
+    threads = [threading.Thread(target=stream) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert len(requests) == 1
+    assert len(narrations) == 4 and len(set(narrations)) == 1
+    # 之后的请求直接命中缓存
+    read_events(client.post('/api/artifact-narration/stream', json=ARTIFACT))
+    assert len(requests) == 1
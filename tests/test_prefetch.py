@@ -0,0 +1,121 @@
+"""识别+讲解一体化接口的候选讲解预取：默认关闭、在主讲解开始之后发起、名额不足或预取数已满时跳过"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from api import artifact_api, pipeline_api
+from api.narration_client import DashScopeClient
+from api.resilience import CircuitBreaker, ResilientNarrationClient
+
+CANDIDATES = [{'name': f'文物{i}', 'dynasty': '唐代'} for i in range(1, 4)]
+RECOGNITION = {
+    'success': True,
+    'data': {'name': '文物0', 'era': '唐代'},
+    'all_results': [{'name': '文物0', 'dynasty': '唐代'}] + CANDIDATES
+}
+
+
+class StubClient:
+    def __init__(self, idle=8):
+        self.idle = idle
+
+    def idle_slots(self):
+        return self.idle
+
+
+class StubGenerator:
+    def __init__(self, client):
+        self.client = client
+
+
+@pytest.fixture
+def prefetch(monkeypatch):
+    """开启预取，并记录讲解事件和预取调用的先后顺序"""
+    calls = []
+    release = threading.Event()
+
+    def get_narration(name, dynasty):
+        calls.append(('prefetch', name))
+        release.wait(5)
+        return '讲解'
+
+    def narration_events(name, dynasty):
+        calls.append(('main', name))
+        yield 'delta'
+        yield 'done'
+
+    client = StubClient()
+    monkeypatch.setitem(pipeline_api.prefetch_config, 'enabled', True)
+    monkeypatch.setitem(pipeline_api.prefetch_config, 'top_k', 2)
+    monkeypatch.setitem(pipeline_api.prefetch_config, 'min_idle_slots', 2)
+    monkeypatch.setattr(artifact_api, 'narration_generator', StubGenerator(client))
+    monkeypatch.setattr(artifact_api, 'narration_cache', object())
+    monkeypatch.setattr(artifact_api, 'get_narration', get_narration)
+    monkeypatch.setattr(artifact_api, 'narration_events', narration_events)
+    executor = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(pipeline_api, 'prefetch_executor', executor)
+    monkeypatch.setattr(pipeline_api, 'prefetch_slots', threading.BoundedSemaphore(4))
+    yield calls, client
+    release.set()
+    executor.shutdown(wait=True)
+
+
+def run_pipeline():
+    return list(pipeline_api.pipeline_events(RECOGNITION))[1:]
+
+
+def test_prefetch_disabled_by_default():
+    assert pipeline_api.NARRATION_CONFIG['prefetch']['enabled'] is False
+
+
+def test_prefetch_starts_after_main_narration(prefetch):
+    calls, _ = prefetch
+    assert run_pipeline() == ['delta', 'done']
+    assert calls[0] == ('main', '文物0')
+    assert sorted(calls[1:]) == [('prefetch', '文物1'), ('prefetch', '文物2')]
+
+
+def test_prefetch_skipped_without_idle_slots(prefetch):
+    calls, client = prefetch
+    client.idle = 1
+    run_pipeline()
+    assert calls == [('main', '文物0')]
+
+
+def test_prefetch_skipped_when_slots_full(prefetch, monkeypatch):
+    calls, _ = prefetch
+    monkeypatch.setattr(pipeline_api, 'prefetch_slots', threading.BoundedSemaphore(1))
+    run_pipeline()
+    run_pipeline()
+    # 第一次预取还没结束，之后的预取都被跳过
+    assert [call for call in calls if call[0] == 'prefetch'] == [('prefetch', '文物1')]
+
+
+def test_idle_slots_track_calls_and_breaker():
+    client = DashScopeClient('sk-test', max_concurrency=3)
+    client._acquire()
+    assert client.idle_slots() == 2
+    client._release()
+    assert client.idle_slots() == 3
+
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60)
+    resilient = ResilientNarrationClient(client, breaker=breaker)
+    assert resilient.idle_slots() == 3
+    breaker.record_failure()
+    assert resilient.idle_slots() == 0
+    resilient.close()
+
+
+def test_recognition_event_comes_first(prefetch):
+    events = list(pipeline_api.pipeline_events(RECOGNITION))
+    assert events[0].startswith('event: recognition\n')
+    assert events[1:] == ['delta', 'done']
+
+
+def test_failed_recognition_sends_no_narration(prefetch):
+    calls, _ = prefetch
+    events = list(pipeline_api.pipeline_events({'success': False, 'error': '图片预处理失败'}))
+    assert len(events) == 1
+    assert calls == []
@@ -0,0 +1,70 @@
+"""图片解码和预处理：JPEG 缩小尺寸解码（draft）、像素数上限、线程池批量预处理"""
+
+import io
+
+import pytest
+from PIL import Image
+from clip.clip import _transform
+
+from api.preprocess import ImagePreprocessor, decode_image, sniff_image_format
+from api.request_log import set_request_id
+
+
+def encode(size, image_format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (120, 80, 40)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def test_large_jpeg_decoded_at_reduced_scale():
+    data = encode((4000, 3000))
+    img = decode_image(data, target_size=224)
+    # 按 1/8 缩小解码，短边仍不小于模型输入边长
+    assert img.size == (500, 375)
+    assert min(img.size) >= 224
+    assert img.mode == 'RGB'
+
+    assert decode_image(data).size == (4000, 3000)
+    # draft 不会缩小到目标尺寸以下
+    assert min(decode_image(encode((600, 400)), target_size=224).size) >= 224
+
+
+def test_draft_ignored_for_png():
+    assert decode_image(encode((1000, 800), 'PNG'), target_size=224).size == (1000, 800)
+
+
+def test_over_limit_image_rejected():
+    data = encode((4000, 3000))
+    with pytest.raises(ValueError, match='图片尺寸过大'):
+        decode_image(data, target_size=224, max_pixels=4000 * 3000 - 1)
+    assert decode_image(data, target_size=224, max_pixels=4000 * 3000) is not None
+
+    preprocessor = ImagePreprocessor(_transform(224), max_pixels=1000, workers=0)
+    assert preprocessor.process(data) is None
+
+
+def test_process_many_keeps_input_order():
+    preprocessor = ImagePreprocessor(_transform(224), workers=2)
+    results = preprocessor.process_many([encode((300, 300)), b'not an image', io.BytesIO(encode((640, 480)))])
+    assert [None if tensor is None else tuple(tensor.shape) for tensor in results] == \
+        [(1, 3, 224, 224), None, (1, 3, 224, 224)]
+
+
+def test_process_many_logs_with_caller_request_id(capsys):
+    """线程池中的预处理失败日志带上调用方的请求ID"""
+    preprocessor = ImagePreprocessor(_transform(224), workers=2)
+    set_request_id('req-preprocess')
+    try:
+        assert preprocessor.process_many([b'broken', b'broken']) == [None, None]
+    finally:
+        set_request_id('-')
+    lines = [line for line in capsys.readouterr().out.splitlines() if '图片预处理失败' in line]
+    assert len(lines) == 2
+    assert all(line.startswith('[req-preprocess] ') for line in lines)
+
+
+def test_sniff_image_format():
+    assert sniff_image_format(encode((8, 8))[:16]) == 'jpeg'
+    assert sniff_image_format(encode((8, 8), 'PNG')[:16]) == 'png'
+    assert sniff_image_format(b'GIF89a') == 'gif'
+    assert sniff_image_format(b'plain text') is None
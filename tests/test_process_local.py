@@ -0,0 +1,27 @@
+"""按进程延迟创建的对象：同一进程只创建一次，fork 后在子进程中重新创建并保留父进程的对象"""
+
+import os
+import threading
+
+from api.process_local import ProcessLocal
+
+
+def test_created_once_per_process(monkeypatch):
+    created = []
+    local = ProcessLocal(lambda: created.append(object()) or created[-1])
+    assert created == []
+
+    threads = [threading.Thread(target=local.get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    parent_value = local.get()
+    assert created == [parent_value]
+
+    # 模拟 fork 出的 worker
+    monkeypatch.setattr(os, 'getpid', lambda: -1)
+    child_value = local.get()
+    assert child_value is not parent_value
+    assert local.get() is child_value
+    assert local._inherited == [parent_value]
@@ -0,0 +1,133 @@
+"""FastAPI 识别服务的背压：排队已满时在读取请求体之前返回503，名额随识别任务结束释放"""
+
+import asyncio
+import importlib.util
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+SERVICE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '图像识别接口', 'service.py')
+
+
+class BlockingEngine:
+    """识别时阻塞，直到测试放行"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def recognize(self, image_input, top_k=3, conf_threshold=0.2):
+        self.started.set()
+        self.release.wait(5)
+        return {'success': True, 'result': [{'name': '兵马俑', 'dynasty': '秦朝', 'intro': '', 'confidence': 0.9}]}
+
+
+class ReadyLoader:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def get(self):
+        return self.engine
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """加载 FastAPI 识别服务（模块名与目录名无关），换上阻塞的识别引擎"""
+    spec = importlib.util.spec_from_file_location('recognition_service', SERVICE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, 'recognition_service', module)
+    spec.loader.exec_module(module)
+    engine = BlockingEngine()
+    monkeypatch.setattr(module, 'engine_loader', ReadyLoader(engine))
+    yield module, engine
+    engine.release.set()
+
+
+def test_full_queue_rejects_without_reading_body(service):
+    module, _ = service
+    queue = module.RecognitionQueue(max_depth=1)
+    assert queue.try_acquire()
+    middleware = module.RecognitionQueueMiddleware(module.app, queue=queue, paths=['/recognize'])
+
+    received, sent = [], []
+
+    async def receive():
+        received.append(1)
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/recognize', 'headers': [], 'query_string': b''}
+    asyncio.run(middleware(scope, receive, send))
+    assert received == []
+    assert sent[0]['status'] == 503
+    assert (b'retry-after', b'1') in sent[0]['headers']
+    assert queue.depth == 1
+
+
+def test_queue_full_returns_503(service, jpeg_bytes):
+    from starlette.testclient import TestClient
+
+    module, engine = service
+    engine.release.set()
+    client = TestClient(module.app)
+    module.recognition_queue.max_depth = 0
+    response = client.post('/recognize', files={'file': ('a.jpg', jpeg_bytes(), 'image/jpeg')})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert response.json()['success'] is False
+
+    module.recognition_queue.max_depth = 1
+    response = client.post('/recognize', files={'file': ('a.jpg', jpeg_bytes(), 'image/jpeg')})
+    assert response.status_code == 200
+    assert module.recognition_queue.depth == 0
+
+    # 校验失败、没有提交识别任务的请求同样归还名额
+    response = client.post('/recognize', files={'file': ('a.jpg', b'not an image', 'image/jpeg')})
+    assert response.status_code == 400
+    assert module.recognition_queue.depth == 0
+
+
+def test_slot_held_until_recognition_finishes(service, jpeg_bytes):
+    """客户端断开（请求被取消）后识别仍在线程池中进行，名额直到识别结束才释放"""
+    module, engine = service
+
+    async def cancel_in_flight_request():
+        transport = httpx.ASGITransport(app=module.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://service') as client:
+            task = asyncio.create_task(
+                client.post('/recognize', files={'file': ('a.jpg', jpeg_bytes(), 'image/jpeg')}))
+            while not engine.started.is_set():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(cancel_in_flight_request())
+    assert module.recognition_queue.depth == 1
+
+    engine.release.set()
+    deadline = time.monotonic() + 5
+    while module.recognition_queue.depth and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert module.recognition_queue.depth == 0
+
+
+def test_queue_slot_released_by_future(service):
+    module, _ = service
+    queue = module.RecognitionQueue(max_depth=2)
+    assert queue.try_acquire()
+    slot = module.QueueSlot(queue)
+    release = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        slot.hand_over(executor.submit(release.wait, 5))
+        slot.release_unless_handed_over()
+        assert queue.depth == 1
+        release.set()
+    assert queue.depth == 0
@@ -0,0 +1,161 @@
+"""讲解生成的容错：重试策略、熔断器只统计上游故障、对冲线程数上限（使用本地讲解模拟服务）"""
+
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from api.fake_narration_server import FakeNarrationHandler
+from api.narration_client import DashScopeClient, NarrationError
+from api.resilience import CircuitBreaker, CircuitOpenError, ResilientNarrationClient, RetryPolicy
+
+
+@pytest.fixture
+def narration_server():
+    """按参数启动讲解模拟服务，返回 (base_url, 请求计数)"""
+    servers = []
+
+    def start(**options):
+        requests = []
+
+        class Handler(FakeNarrationHandler):
+            first_token_delay = 0.0
+            tokens_per_second = 0
+            length = 20
+            rng = random.Random(0)
+
+            def do_POST(self):
+                requests.append(self.path)
+                super().do_POST()
+
+        for key, value in options.items():
+            setattr(Handler, key, value)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}", requests
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def resilient(base_url, breaker=None, max_attempts=1, **options):
+    client = DashScopeClient('sk-test', base_url=base_url, read_timeout=5,
+                             max_concurrency=options.pop('max_concurrency', 8),
+                             acquire_timeout=options.pop('acquire_timeout', 10))
+    return ResilientNarrationClient(
+        client, deadline=10, breaker=breaker,
+        retry=RetryPolicy(max_attempts=max_attempts, base_delay=0.001, max_delay=0.002), **options)
+
+
+def test_backoff_is_bounded():
+    policy = RetryPolicy(max_attempts=5, base_delay=0.1, max_delay=0.3)
+    for attempt in range(5):
+        for _ in range(50):
+            assert 0 <= policy.backoff(attempt) <= min(0.3, 0.1 * 2 ** attempt)
+    assert RetryPolicy(max_attempts=0).max_attempts == 1
+
+
+def test_retries_only_retryable_errors(narration_server):
+    base_url, requests = narration_server(error_rate=1.0, error_status=503)
+    client = resilient(base_url, max_attempts=3)
+    with pytest.raises(NarrationError):
+        client.generate('qwen-turbo', '文物：兵马俑\n朝代：秦朝')
+    assert len(requests) == 3
+
+    base_url, requests = narration_server(error_rate=1.0, error_status=400)
+    client = resilient(base_url, max_attempts=3)
+    with pytest.raises(NarrationError) as excinfo:
+        client.generate('qwen-turbo', '文物：兵马俑\n朝代：秦朝')
+    assert not excinfo.value.retryable
+    assert len(requests) == 1
+
+
+def test_breaker_opens_on_upstream_failures(narration_server):
+    base_url, requests = narration_server(error_rate=1.0, error_status=500)
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=60)
+    client = resilient(base_url, breaker=breaker)
+    for _ in range(3):
+        with pytest.raises(NarrationError):
+            client.generate('qwen-turbo', 'prompt')
+    assert breaker.state == CircuitBreaker.OPEN
+    assert 59 < breaker.retry_after() <= 60
+
+    with pytest.raises(CircuitOpenError):
+        client.generate('qwen-turbo', 'prompt')
+    with pytest.raises(CircuitOpenError):
+        list(client.stream('qwen-turbo', 'prompt'))
+    assert len(requests) == 3
+
+
+def test_breaker_ignores_client_errors(narration_server):
+    base_url, requests = narration_server(error_rate=1.0, error_status=401)
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+    client = resilient(base_url, breaker=breaker)
+    for _ in range(5):
+        with pytest.raises(NarrationError):
+            client.generate('qwen-turbo', 'prompt')
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.retry_after() == 0
+    assert len(requests) == 5
+
+
+def test_breaker_ignores_local_concurrency_limit(narration_server):
+    base_url, requests = narration_server()
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+    client = resilient(base_url, breaker=breaker, max_concurrency=1, acquire_timeout=0.01)
+    client.client._acquire()
+    try:
+        for _ in range(3):
+            with pytest.raises(NarrationError, match='并发已满'):
+                client.generate('qwen-turbo', 'prompt')
+    finally:
+        client.client._release()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert requests == []
+    assert client.generate('qwen-turbo', '文物：兵马俑\n朝代：秦朝').startswith('我是兵马俑')
+
+
+def test_half_open_trial_closes_breaker(narration_server):
+    base_url, _ = narration_server()
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.05)
+    breaker.record_failure()
+    client = resilient(base_url, breaker=breaker)
+    with pytest.raises(CircuitOpenError):
+        client.generate('qwen-turbo', 'prompt')
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert ''.join(client.stream('qwen-turbo', '文物：兵马俑\n朝代：秦朝')).startswith('我是兵马俑')
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_hedge_sent_for_slow_calls(narration_server):
+    base_url, requests = narration_server(first_token_delay=0.3)
+    client = resilient(base_url, hedging=True, hedge_delay=0.05)
+    assert client.generate('qwen-turbo', 'prompt')
+    assert len(requests) == 2
+    client.close()
+
+
+def test_hedge_workers_bounded(narration_server):
+    base_url, requests = narration_server(first_token_delay=0.2)
+    client = resilient(base_url, hedging=True, hedge_delay=0.05, hedge_workers=2)
+    assert client._executor._max_workers == 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.generate('qwen-turbo', 'prompt')))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(results) == 6
+    # 对冲线程已满的调用直接请求上游、不发对冲请求：总请求数不超过 调用数 + 线程数
+    assert 6 <= len(requests) <= 8
+    assert client._hedge_slots.acquire(blocking=False)
+    client.close()
@@ -0,0 +1,122 @@
+"""识别结果缓存：缓存键、感知哈希（默认关闭/完全一致/分段索引）以及淘汰时的索引同步"""
+
+import io
+import random
+
+from PIL import Image
+
+from api.result_cache import CachedRecognizer, PerceptualIndex, ResultCache, perceptual_hash
+
+
+class CountingRecognizer:
+    """记录调用次数的识别引擎，failing=True 时返回识别失败的结果"""
+
+    def __init__(self, failing=False):
+        self.calls = 0
+        self.failing = failing
+
+    def recognize(self, image_input, top_k=3, conf_threshold=0.2):
+        self.calls += 1
+        if self.failing:
+            return {'success': False, 'error': '推理服务暂时不可用', 'result': []}
+        return {'success': True, 'result': [{'label': f'call-{self.calls}', 'top_k': top_k}]}
+
+    def recognize_batch(self, image_inputs, top_k=3, conf_threshold=0.2):
+        return [self.recognize(image_input, top_k, conf_threshold) for image_input in image_inputs]
+
+
+def gradient_jpeg(size=(96, 96), quality=90):
+    """水平渐变图：重新压缩、缩放后感知哈希不变，但字节内容不同"""
+    img = Image.new('RGB', (96, 96))
+    img.putdata([(x * 2, y, 255 - x * 2) for y in range(96) for x in range(96)])
+    buffer = io.BytesIO()
+    img.resize(size).save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def test_key_includes_top_k_and_threshold(jpeg_bytes):
+    engine = CountingRecognizer()
+    cached = CachedRecognizer(engine, ResultCache())
+    image = jpeg_bytes()
+
+    first = cached.recognize(image, top_k=3)
+    assert cached.recognize(image, top_k=3) == first
+    assert engine.calls == 1
+    cached.recognize(image, top_k=1)
+    cached.recognize(image, top_k=3, conf_threshold=0.5)
+    assert engine.calls == 3
+    assert cached.cache_stats()['hits'] == 1
+
+
+def test_hit_returns_copy(jpeg_bytes):
+    cached = CachedRecognizer(CountingRecognizer(), ResultCache())
+    image = jpeg_bytes()
+    cached.recognize(image)['result'].clear()
+    assert cached.recognize(image)['result']
+
+
+def test_failed_results_not_cached(jpeg_bytes):
+    engine = CountingRecognizer(failing=True)
+    cached = CachedRecognizer(engine, ResultCache())
+    image = jpeg_bytes()
+    cached.recognize(image)
+    cached.recognize(image)
+    assert engine.calls == 2
+    assert len(cached.cache) == 0
+
+
+def test_perceptual_hash_off_by_default():
+    engine = CountingRecognizer()
+    cached = CachedRecognizer(engine, ResultCache())
+    cached.recognize(gradient_jpeg(quality=90))
+    cached.recognize(gradient_jpeg(quality=60))
+    assert engine.calls == 2
+    assert cached.perceptual_index is None
+
+
+def test_perceptual_exact_match_for_reencoded_image():
+    original, reencoded = gradient_jpeg(quality=90), gradient_jpeg(size=(80, 80), quality=60)
+    assert original != reencoded
+    assert perceptual_hash(original) == perceptual_hash(reencoded)
+
+    engine = CountingRecognizer()
+    cached = CachedRecognizer(engine, ResultCache(), use_perceptual_hash=True)
+    cached.recognize(original)
+    cached.recognize(reencoded)
+    assert engine.calls == 1
+    assert cached.cache_stats()['perceptual_hits'] == 1
+    # 命中后补记了内容哈希，再次上传同样的字节直接按内容哈希命中
+    cached.recognize(reencoded)
+    assert cached.cache_stats()['perceptual_hits'] == 1
+
+
+def test_perceptual_index_matches_linear_scan():
+    rng = random.Random(0)
+    index = PerceptualIndex(max_distance=4)
+    stored = [rng.getrandbits(64) for _ in range(2000)]
+    for value in stored:
+        index.add('group', value)
+
+    for _ in range(200):
+        base = rng.choice(stored)
+        query = base
+        for bit in rng.sample(range(64), rng.randint(0, 6)):
+            query ^= 1 << bit
+        expected = sorted(v for v in stored if bin(v ^ query).count('1') <= 4)
+        assert sorted(index.nearest('group', query)) == expected
+    assert index.nearest('other-group', stored[0]) == []
+
+
+def test_perceptual_index_follows_eviction():
+    cache = ResultCache(max_size=2)
+    cached = CachedRecognizer(CountingRecognizer(), cache, use_perceptual_hash=True, perceptual_max_distance=4)
+    near = 0x0123456789abcdef
+    cached._set(('dhash', f"{near:016x}", 3, 0.2), {'success': True, 'result': []})
+    assert cached._find_similar(('dhash', f"{near ^ 0b101:016x}", 3, 0.2)) is not None
+    assert cached._find_similar(('dhash', f"{near ^ 0b101:016x}", 1, 0.2)) is None
+
+    # 写入两个新条目把它挤出 LRU 后，索引中也不再有它
+    cached._set(('sha256', 'a', 3, 0.2), {'success': True})
+    cached._set(('sha256', 'b', 3, 0.2), {'success': True})
+    assert cached.perceptual_index.nearest((3, 0.2), near) == []
+    assert cached._find_similar(('dhash', f"{near ^ 0b101:016x}", 3, 0.2)) is None
@@ -0,0 +1,217 @@
+"""上传校验：请求体大小上限（含分块上传）、文件头检查、批量接口的逐张校验和损坏的压缩包"""
+
+import importlib.util
+import io
+import os
+import sys
+import tempfile
+import zipfile
+
+import pytest
+
+import config
+from api import image_api
+
+SERVICE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '图像识别接口', 'service.py')
+MAX_IMAGE_SIZE = 4096
+
+
+class FakeEngine:
+    """记录收到的图片数量的识别引擎"""
+
+    def __init__(self):
+        self.batches = []
+
+    def recognize(self, image_input, top_k=3, conf_threshold=0.2):
+        return self.recognize_batch([image_input], top_k, conf_threshold)[0]
+
+    def recognize_batch(self, image_inputs, top_k=3, conf_threshold=0.2):
+        self.batches.append(len(image_inputs))
+        self.inputs = list(image_inputs)
+        return [{'success': True, 'result': [
+            {'name': '兵马俑', 'dynasty': '秦朝', 'intro': '', 'confidence': 0.9}
+        ]} for _ in image_inputs]
+
+
+class FakeLoader:
+    def __init__(self, engine):
+        self.engine = engine
+        self.ready = True
+
+    def get(self):
+        return self.engine
+
+    def status(self):
+        return {'state': 'ready', 'error': None}
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(image_api, 'engine_loader', FakeLoader(engine))
+    monkeypatch.setitem(config.UPLOAD_CONFIG, 'max_image_size', MAX_IMAGE_SIZE)
+    return engine
+
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
+
+
+def multipart(fields):
+    """手工构造 multipart 请求体，用于不带 Content-Length 的分块上传"""
+    boundary = 'test-boundary'
+    body = b''
+    for name, filename, data in fields:
+        body += (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n').encode() + data + b'\r\n'
+    body += f'--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def make_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for filename, data in members:
+            archive.writestr(filename, data)
+    return buffer.getvalue()
+
+
+def test_single_image_accepted(client, engine, jpeg_bytes):
+    response = client.post('/api/image-recognition/', data={'image': (io.BytesIO(jpeg_bytes()), 'a.jpg')})
+    assert response.status_code == 200
+    assert response.get_json()['data']['name'] == '兵马俑'
+
+
+def test_single_non_image_rejected(client, engine):
+    response = client.post('/api/image-recognition/', data={'image': (io.BytesIO(b'not an image' * 10), 'a.jpg')})
+    assert response.status_code == 400
+    assert engine.batches == []
+
+
+def test_single_too_large_rejected_before_parsing(client, engine, jpeg_bytes):
+    data = jpeg_bytes() + b'\0' * MAX_IMAGE_SIZE
+    response = client.post('/api/image-recognition/', data={'image': (io.BytesIO(data), 'a.jpg')})
+    assert response.status_code == 413
+
+
+def test_chunked_upload_limited_to_image_size(client, engine, jpeg_bytes):
+    body, content_type = multipart([('image', 'a.jpg', jpeg_bytes() + b'\0' * MAX_IMAGE_SIZE)])
+    response = client.post('/api/image-recognition/', input_stream=io.BytesIO(body),
+                           content_type=content_type, environ_overrides={'wsgi.input_terminated': True})
+    assert response.status_code == 413
+    assert engine.batches == []
+
+    body, content_type = multipart([('image', 'a.jpg', jpeg_bytes())])
+    response = client.post('/api/image-recognition/', input_stream=io.BytesIO(body),
+                           content_type=content_type, environ_overrides={'wsgi.input_terminated': True})
+    assert response.status_code == 200
+
+
+def test_batch_validates_each_file(client, engine, jpeg_bytes):
+    response = client.post('/api/image-recognition/batch', data={'images': [
+        (io.BytesIO(jpeg_bytes()), 'ok.jpg'),
+        (io.BytesIO(b'plain text, not an image'), 'fake.png'),
+        (io.BytesIO(jpeg_bytes() + b'\0' * MAX_IMAGE_SIZE), 'big.jpg'),
+        (io.BytesIO(jpeg_bytes((200, 10, 10))), 'ok2.jpg'),
+    ]})
+    assert response.status_code == 200
+    items = response.get_json()['data']
+    assert [item['filename'] for item in items] == ['ok.jpg', 'fake.png', 'big.jpg', 'ok2.jpg']
+    assert [item['success'] for item in items] == [True, False, False, True]
+    assert items[1]['code'] == items[2]['code'] == 400
+    # 只有通过校验的图片进入批量推理
+    assert engine.batches == [2]
+
+
+def test_batch_keeps_one_entry_per_upload(client, engine, jpeg_bytes):
+    response = client.post('/api/image-recognition/batch', data={'images': [
+        (io.BytesIO(b'notes'), 'notes.txt'),
+        (io.BytesIO(jpeg_bytes()), 'ok.jpg'),
+        (io.BytesIO(b''), ''),
+    ]})
+    assert response.status_code == 200
+    items = response.get_json()['data']
+    assert [item['filename'] for item in items] == ['notes.txt', 'ok.jpg', '']
+    assert [item['success'] for item in items] == [False, True, False]
+    assert engine.batches == [1]
+
+
+def test_batch_archive_members_validated(client, engine, jpeg_bytes):
+    archive = make_zip([('a.jpg', jpeg_bytes()), ('b.jpg', b'not an image'),
+                        ('c.jpg', b'\0' * (MAX_IMAGE_SIZE + 1)), ('readme.txt', b'text'), ('d/', b'')])
+    response = client.post('/api/image-recognition/batch', data={'archive': (io.BytesIO(archive), 'a.zip')})
+    assert response.status_code == 200
+    items = response.get_json()['data']
+    assert [item['filename'] for item in items] == ['a.jpg', 'b.jpg', 'c.jpg', 'readme.txt']
+    assert [item['success'] for item in items] == [True, False, False, False]
+    assert engine.batches == [1]
+
+
+def test_batch_archive_members_extracted_to_spooled_files(client, engine, jpeg_bytes, monkeypatch):
+    """压缩包内的图片逐个解压到暂存文件，较大的图片写入磁盘，请求结束后关闭"""
+    monkeypatch.setattr(image_api, 'ARCHIVE_SPOOL_SIZE', 1024)
+    small, large = jpeg_bytes(size=(8, 8)), jpeg_bytes(size=(200, 200))
+    assert len(small) < 1024 < len(large) <= MAX_IMAGE_SIZE
+    archive = make_zip([('small.jpg', small), ('large.jpg', large)])
+    response = client.post('/api/image-recognition/batch', data={'archive': (io.BytesIO(archive), 'a.zip')})
+    assert [item['success'] for item in response.get_json()['data']] == [True, True]
+
+    assert [isinstance(f, tempfile.SpooledTemporaryFile) for f in engine.inputs] == [True, True]
+    assert [f._rolled for f in engine.inputs] == [False, True]
+    assert all(f.closed for f in engine.inputs)
+
+
+def test_batch_corrupt_archive_rejected(client, engine, jpeg_bytes):
+    response = client.post('/api/image-recognition/batch', data={'archive': (io.BytesIO(b'not a zip'), 'a.zip')})
+    assert response.status_code == 400
+
+    # 压缩数据被篡改：解压时 CRC 校验失败或无法解压
+    archive = bytearray(make_zip([('a.jpg', jpeg_bytes())]))
+    offset = 30 + len('a.jpg') + 20
+    archive[offset] ^= 0xFF
+    response = client.post('/api/image-recognition/batch', data={'archive': (io.BytesIO(bytes(archive)), 'a.zip')})
+    assert response.status_code == 400
+    assert engine.batches == []
+
+
+@pytest.fixture
+def service(monkeypatch, engine):
+    """加载 FastAPI 识别服务（模块名与目录名无关），换上假的识别引擎"""
+    from starlette.testclient import TestClient
+
+    spec = importlib.util.spec_from_file_location('recognition_service', SERVICE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, 'recognition_service', module)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, 'engine_loader', FakeLoader(engine))
+    for middleware in module.app.user_middleware:
+        if middleware.cls is module.UploadLimitMiddleware:
+            middleware.kwargs['max_body_size'] = MAX_IMAGE_SIZE
+    return TestClient(module.app)
+
+
+def test_service_rejects_non_image(service, jpeg_bytes):
+    response = service.post('/recognize', files={'file': ('a.jpg', b'not an image', 'image/jpeg')})
+    assert response.status_code == 400
+    assert response.json()['success'] is False
+
+    response = service.post('/recognize', files={'file': ('a.jpg', jpeg_bytes(), 'image/jpeg')})
+    assert response.status_code == 200
+    assert response.json()['success'] is True
+
+
+def test_service_limits_body_size(service, jpeg_bytes):
+    data = jpeg_bytes() + b'\0' * MAX_IMAGE_SIZE
+    response = service.post('/recognize', files={'file': ('a.jpg', data, 'image/jpeg')})
+    assert response.status_code == 413
+    assert response.json()['success'] is False
+
+    # 不带 Content-Length 的分块上传：读取超过上限时中止
+    body, content_type = multipart([('file', 'a.jpg', data)])
+    response = service.post('/recognize', content=iter([body[:1024], body[1024:]]),
+                            headers={'Content-Type': content_type})
+    assert 'content-length' not in {key.lower() for key in response.request.headers}
+    assert response.status_code == 413
+    assert response.json()['success'] is False
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+import torch
+
+from api.vector_index import FlatIndex, IVFIndex, create_vector_index
+
+
+def normalize(x):
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture(scope='module')
+def labels_and_queries():
+    """
+    与 CLIP 标签向量分布相近的合成数据：所有标签共享一个公共方向，并按主题聚集，
+    查询为某个标签加上噪声
+    """
+    rng = np.random.default_rng(0)
+    count, dim = 8000, 64
+    common = rng.standard_normal(dim)
+    topics = rng.standard_normal((40, dim))
+    embeddings = normalize(3 * common + 2 * topics[rng.integers(40, size=count)]
+                           + 1.5 * rng.standard_normal((count, dim)))
+    queries = normalize(embeddings[rng.integers(count, size=200)] + 0.2 * rng.standard_normal((200, dim)))
+    return embeddings, queries
+
+
+def test_flat_index_matches_torch_softmax(labels_and_queries):
+    embeddings, queries = labels_and_queries
+    values, indices = FlatIndex(embeddings).search(queries[:5], 3)
+
+    expected = (100.0 * torch.from_numpy(queries[:5]) @ torch.from_numpy(embeddings).T).softmax(dim=-1).topk(3)
+    np.testing.assert_allclose(values, expected.values.numpy(), rtol=1e-4)
+    np.testing.assert_array_equal(indices, expected.indices.numpy())
+
+
+def test_ivf_recall(labels_and_queries):
+    embeddings, queries = labels_and_queries
+    _, flat_indices = FlatIndex(embeddings).search(queries, 3)
+    _, ivf_indices = IVFIndex(embeddings, nprobe=16).search(queries, 3)
+    assert (flat_indices[:, 0] == ivf_indices[:, 0]).mean() >= 0.9
+
+
+def test_ivf_confidence_is_calibrated_like_flat(labels_and_queries):
+    """置信度按全部标签归一化，与精确检索可比，同一个 conf_threshold 在两种检索方式下含义相同"""
+    embeddings, queries = labels_and_queries
+    flat_values, flat_indices = FlatIndex(embeddings).search(queries, 3)
+
+    def top1_bias(norm_samples):
+        values, indices = IVFIndex(embeddings, nprobe=4, norm_samples=norm_samples).search(queries, 3)
+        same_top1 = flat_indices[:, 0] == indices[:, 0]
+        flat_mean = flat_values[same_top1, 0].mean()
+        return (values[same_top1, 0].mean() - flat_mean) / flat_mean
+
+    # 只在扫描到的候选上归一化会高估置信度
+    assert top1_bias(norm_samples=0) > 0.03
+    assert abs(top1_bias(norm_samples=32)) < 0.01
+
+
+def test_ivf_probing_every_cluster_is_exact(labels_and_queries):
+    embeddings, queries = labels_and_queries
+    index = IVFIndex(embeddings, nlist=16, nprobe=16)
+    flat_values, flat_indices = FlatIndex(embeddings).search(queries[:20], 5)
+    ivf_values, ivf_indices = index.search(queries[:20], 5)
+
+    np.testing.assert_array_equal(ivf_indices, flat_indices)
+    np.testing.assert_allclose(ivf_values, flat_values, rtol=1e-4)
+
+
+def test_ivf_build_is_deterministic(labels_and_queries):
+    embeddings, queries = labels_and_queries
+    first = IVFIndex(embeddings).search(queries[:10], 3)
+    second = IVFIndex(embeddings).search(queries[:10], 3)
+    np.testing.assert_array_equal(first[1], second[1])
+    np.testing.assert_array_equal(first[0], second[0])
+
+
+def test_ivf_unfilled_slots_are_empty(labels_and_queries):
+    """扫描到的候选少于 k 个时，空位不能变成下标0、概率0的假结果"""
+    from api.artifact_recognizer import ArtifactRecognizer
+
+    embeddings, queries = labels_and_queries
+    index = IVFIndex(embeddings[:40], nlist=4, nprobe=1)
+    values, indices = index.search(queries[:1], 40)
+    scanned = (indices[0] >= 0).sum()
+    assert 0 < scanned < 40
+    assert (indices[0, scanned:] == -1).all() and np.isnan(values[0, scanned:]).all()
+
+    recognizer = ArtifactRecognizer.__new__(ArtifactRecognizer)
+    recognizer.label_index = [{'name': f'文物{i}', 'dynasty': '', 'intro': ''} for i in range(40)]
+    result = recognizer._build_results(torch.from_numpy(values[0]), torch.from_numpy(indices[0]), conf_threshold=0)
+    assert len(result['result']) == scanned
+
+
+def test_create_vector_index_auto_switches_on_threshold(labels_and_queries):
+    embeddings, _ = labels_and_queries
+    config = {'backend': 'auto', 'ann_threshold': len(embeddings), 'nlist': 0, 'nprobe': 8, 'norm_samples': 32}
+    assert create_vector_index(embeddings, config) is None
+
+    config['ann_threshold'] = len(embeddings) - 1
+    assert isinstance(create_vector_index(embeddings, config), IVFIndex)
+
+    with pytest.raises(ValueError):
+        create_vector_index(embeddings, dict(config, backend='unknown'))
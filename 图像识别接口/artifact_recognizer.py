@@ -2,8 +2,12 @@ import torch
 import clip
 from PIL import Image
 import io
+import os
 import pandas as pd
 
+# 数据目录：按本文件所在目录定位，不依赖启动时的工作目录
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
 class ArtifactRecognizer:
     def __init__(self):
         # 加载CLIP模型（自动适配GPU/CPU）
@@ -13,14 +17,14 @@ class ArtifactRecognizer:
 
         # 加载候选标签和文物数据
         self.candidate_labels = self._load_labels()
-        self.artifact_df = pd.read_csv("./data/artifact_data.csv", encoding="utf-8")
+        self.artifact_df = pd.read_csv(os.path.join(DATA_DIR, "artifact_data.csv"), encoding="utf-8")
 
         # 编码标签文本（提前计算，提升识别速度）
         self.encoded_labels = self._encode_labels()
 
     def _load_labels(self):
         """加载候选标签列表"""
-        with open("./data/candidate_labels.txt", "r", encoding="utf-8") as f:
+        with open(os.path.join(DATA_DIR, "candidate_labels.txt"), "r", encoding="utf-8") as f:
             labels = [line.strip() for line in f if line.strip()]
         return labels
 
@@ -32,12 +36,15 @@ class ArtifactRecognizer:
         return text_features / text_features.norm(dim=-1, keepdim=True)  # 归一化
 
     def process_image(self, image_input):
-        """图片预处理：支持文件路径或字节流输入"""
+        """图片预处理：支持文件路径、字节流或文件对象输入"""
         try:
             if isinstance(image_input, bytes):
                 img = Image.open(io.BytesIO(image_input)).convert("RGB")
             elif isinstance(image_input, str):
                 img = Image.open(image_input).convert("RGB")
+            elif hasattr(image_input, "read"):
+                image_input.seek(0)
+                img = Image.open(image_input).convert("RGB")
             else:
                 return None
 
@@ -103,6 +110,14 @@ class ArtifactRecognizer:
         except Exception as e:
             return {"success": False, "error": f"识别异常：{str(e)}", "result": []}
 
+    def warm_up(self):
+        """预热：用一张纯色图片完整执行一次识别，失败时抛出异常"""
+        buffer = io.BytesIO()
+        Image.new("RGB", (224, 224), (128, 128, 128)).save(buffer, "JPEG")
+        if self.process_image(buffer.getvalue()) is None:
+            raise RuntimeError("预热失败：图片预处理失败")
+        self.recognize(buffer.getvalue(), top_k=1)
+
 # 测试代码（可选）
 if __name__ == "__main__":
     recognizer = ArtifactRecognizer()
@@ -1,10 +1,155 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
-from artifact_recognizer import ArtifactRecognizer
-import pandas as pd  # 必须添加，否则无法识别pd
+import asyncio
+import os
+import sys
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 默认复用项目根目录下的识别引擎（本地模型 + 动态批处理，或独立推理服务的客户端）
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(SERVICE_DIR, '..'))
+from config import RECOGNITION_SERVICE_CONFIG, UPLOAD_CONFIG, SERVING_CONFIG
+from api.engine import EngineLoader, create_recognition_engine
+from api.metrics import REGISTRY, QUEUE_DEPTH
+from api.preprocess import sniff_image_format
+
 app = FastAPI(title="文物识别服务", version="1.0")
 
+
+class UploadLimitMiddleware:
+    """
+    请求体大小限制（ASGI 中间件），在表单解析、上传文件暂存到临时文件之前生效
+    声明的 Content-Length 超过上限时不读取请求体直接返回413；
+    未声明（分块传输）时边读边计数，超过上限立即中止读取并返回413
+    """
+
+    def __init__(self, app, max_body_size):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_body_size:
+            response = upload_error_response(413, self.too_large_message())
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    # 在路由内部抛出，由下面的异常处理函数转换为JSON响应
+                    raise HTTPException(status_code=413, detail=self.too_large_message())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def too_large_message(self):
+        return f"上传文件过大，最大允许 {self.max_body_size // (1024 * 1024)}MB"
+
+
+class RecognitionQueue:
+    """
+    识别请求的排队上限（背压）
+    名额在读取请求体之前占用（RecognitionQueueMiddleware），已满时直接返回503，不再接收和暂存上传文件；
+    识别任务提交到线程池后，名额随任务结束释放（QueueSlot.hand_over）：客户端中途断开时
+    线程池中的识别仍在进行，名额不会提前归还，同时进行的识别数不会超过上限
+    """
+
+    def __init__(self, max_depth):
+        self.max_depth = max_depth
+        self.depth = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """占用一个名额，已满时返回 False"""
+        with self._lock:
+            if self.depth >= self.max_depth:
+                return False
+            self.depth += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.depth -= 1
+
+
+class QueueSlot:
+    """单个请求占用的名额：提交识别任务后交给任务释放，没有提交（校验失败、读取请求体时断开等）时由中间件在请求结束时释放"""
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.handed_over = False
+
+    def hand_over(self, future):
+        """名额在识别任务结束时（future 的回调中）释放"""
+        self.handed_over = True
+        future.add_done_callback(lambda _: self.queue.release())
+
+    def release_unless_handed_over(self):
+        if not self.handed_over:
+            self.queue.release()
+
+
+class RecognitionQueueMiddleware:
+    """
+    识别接口的背压（ASGI 中间件），在读取请求体之前生效
+    排队已满时不读取请求体直接返回503；否则占用一个名额，通过 request.state.queue_slot 交给识别接口
+    """
+
+    def __init__(self, app, queue, paths):
+        self.app = app
+        self.queue = queue
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        if not self.queue.try_acquire():
+            response = JSONResponse(
+                status_code=503,
+                content={"success": False, "error": "服务繁忙，请稍后重试", "result": []},
+                headers={"Retry-After": "1"}
+            )
+            return await response(scope, receive, send)
+
+        slot = QueueSlot(self.queue)
+        scope.setdefault("state", {})["queue_slot"] = slot
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            slot.release_unless_handed_over()
+
+
+def upload_error_response(status_code, error):
+    """与识别接口相同结构的错误响应"""
+    return JSONResponse(status_code=status_code, content={"success": False, "error": error, "result": []})
+
+
+@app.exception_handler(HTTPException)
+async def http_exception_handler(request, exc):
+    """HTTP 错误（如请求体超过上限）返回与识别接口相同结构的JSON"""
+    return upload_error_response(exc.status_code, str(exc.detail))
+
+
+app.add_middleware(UploadLimitMiddleware, max_body_size=UPLOAD_CONFIG['max_image_size'])
+
+# 最多同时处理（含排队）的识别请求数，超过时在读取请求体之前返回503
+recognition_queue = RecognitionQueue(RECOGNITION_SERVICE_CONFIG['max_queue_depth'])
+QUEUE_DEPTH.set_function(lambda: recognition_queue.depth, queue='recognition_service')
+app.add_middleware(RecognitionQueueMiddleware, queue=recognition_queue, paths=["/recognize"])
+
 # 解决跨域问题
 app.add_middleware(
     CORSMiddleware,
@@ -14,20 +159,93 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 初始化识别器
-recognizer = ArtifactRecognizer()
+
+def create_service_engine():
+    """
+    按配置创建识别引擎
+    shared - 与 Flask 服务共用 api/ 下的识别引擎和文物目录
+    legacy - 本目录下原有的识别器和数据（图像识别接口/data/）
+    """
+    engine = RECOGNITION_SERVICE_CONFIG['engine']
+    if engine == 'legacy':
+        if SERVICE_DIR not in sys.path:
+            sys.path.insert(0, SERVICE_DIR)
+        from artifact_recognizer import ArtifactRecognizer
+        return ArtifactRecognizer()
+    if engine == 'shared':
+        return create_recognition_engine()
+    raise ValueError(f"未知的识别引擎：{engine}，可选：shared / legacy")
+
+
+# 加载识别引擎（默认在后台线程中加载，加载完成前识别接口返回503）
+engine_loader = EngineLoader(create_service_engine)
+engine_loader.start(SERVING_CONFIG['model_loading'])
+
+# 解码、预处理和推理都是阻塞操作，放到有界线程池中执行，避免阻塞事件循环；
+# 线程池中的并发请求会被动态批处理调度器合并为一个批次
+executor = ThreadPoolExecutor(
+    max_workers=RECOGNITION_SERVICE_CONFIG['executor_workers'],
+    thread_name_prefix="recognize"
+)
+
+
+@app.get("/healthz")
+async def healthz():
+    """存活检查：模型加载失败（需要重启进程）时返回503"""
+    status = engine_loader.status()
+    if status["state"] == "failed":
+        return JSONResponse(status_code=503, content={"status": "failed", "error": status["error"]})
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """就绪检查：识别模型加载并预热完成后返回200"""
+    if engine_loader.ready:
+        return JSONResponse(content=engine_loader.status())
+    return JSONResponse(status_code=503, content=engine_loader.status(), headers={"Retry-After": "5"})
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 指标（文本格式）"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.post("/recognize")
-async def recognize_artifact(file: UploadFile = File(...)):
+async def recognize_artifact(request: Request, file: UploadFile = File(...)):
+    recognition_engine = engine_loader.get()
+    if recognition_engine is None:
+        status = engine_loader.status()
+        error = f"识别模型加载失败：{status['error']}" if status["state"] == "failed" else "识别模型正在加载，请稍后重试"
+        return JSONResponse(
+            status_code=503,
+            content={"success": False, "error": error, "result": []},
+            headers={"Retry-After": "5"}
+        )
+
+    # 上传文件超过大小限制时直接拒绝（请求体已由 UploadLimitMiddleware 限制，这里只检查文件本身）
+    if file.size is not None and file.size > UPLOAD_CONFIG['max_image_size']:
+        return upload_error_response(413, "上传文件过大")
+
+    # 检查文件头，内容不是图片时直接拒绝
+    header = file.file.read(16)
+    file.file.seek(0)
+    if sniff_image_format(header) is None:
+        return upload_error_response(400, "文件内容不是有效的图片")
+
     try:
-        image_bytes = await file.read()
-        result = recognizer.recognize(image_bytes)
+        # 直接从上传文件的暂存文件解码，不整体读入内存；
+        # 排队名额（背压，见 RecognitionQueueMiddleware）在识别任务结束时释放
+        future = executor.submit(recognition_engine.recognize, file.file)
+        request.state.queue_slot.hand_over(future)
+        result = await asyncio.wrap_future(future)
 
         # 清理结果中的nan值
         if "result" in result and isinstance(result["result"], list):
             for item in result["result"]:
-                item["confidence"] = item.get("confidence", 0.0) if not pd.isna(item.get("confidence")) else 0.0
+                confidence = item.get("confidence")
+                item["confidence"] = confidence if isinstance(confidence, float) and not math.isnan(confidence) else 0.0
 
         return result
     except Exception as e: